@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Aggregation of numeric metrics reported in results of batch items of an inspection.
+
+Metrics are named by their path in the result, such as "usage.ru_utime",
+"stdout.@result.elapsed" or "perf.ipc" for hardware performance counters, the
+time the script ran is reported as "wall_time". Each run is aggregated on its
+own if the script was run repeatedly in one batch item.
+"""
+
+import statistics
+from collections import defaultdict
+from datetime import datetime
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# Format of start_datetime and end_datetime in results as produced by amun.inspect.
+_RESULT_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# Percentiles reported for each metric.
+_PERCENTILES = (5, 25, 75, 90, 95, 99)
+
+
+def _iter_numeric_fields(obj: Any, path: str) -> Iterator[Tuple[str, float]]:
+    """Iterate over numeric values of a possibly nested dictionary, keys of nested values are joined by a dot."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _iter_numeric_fields(value, f"{path}.{key}")
+    # Booleans are integers in Python, they are flags and not metrics though.
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield path, float(obj)
+
+
+def _get_wall_time(result: Dict[str, Any]) -> Optional[float]:
+    """Get time the inspected script ran, in seconds, None if not reported in the result."""
+    if isinstance(result.get("wall_time"), (int, float)):
+        return float(result["wall_time"])
+
+    # Results produced before the time of the run was reported, the time includes the whole inspection run.
+    try:
+        start = datetime.strptime(result["start_datetime"], _RESULT_DATETIME_FORMAT)
+        end = datetime.strptime(result["end_datetime"], _RESULT_DATETIME_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return (end - start).total_seconds()
+
+
+def _extract_run_metrics(run: Dict[str, Any]) -> Dict[str, float]:
+    """Extract numeric metrics out of one of the runs reported in the repetitions of a result."""
+    metrics = dict(_iter_numeric_fields(run.get("usage") or {}, "usage"))
+    metrics.update(_iter_numeric_fields(run.get("stdout") or {}, "stdout"))
+    metrics.update(_iter_numeric_fields(run.get("perf") or {}, "perf"))
+    metrics.update(_iter_numeric_fields(run.get("wall_time"), "wall_time"))
+    return metrics
+
+
+def extract_metrics(result: Dict[str, Any]) -> List[Dict[str, float]]:
+    """Extract numeric metrics out of a result of one batch item, once for each run of the script reported."""
+    runs = (result.get("repetitions") or {}).get("runs")
+    if runs:
+        return [_extract_run_metrics(run) for run in runs]
+
+    metrics = dict(_iter_numeric_fields(result.get("usage") or {}, "usage"))
+    metrics.update(_iter_numeric_fields(result.get("stdout") or {}, "stdout"))
+    metrics.update(_iter_numeric_fields((result.get("perf") or {}).get("counters") or {}, "perf"))
+
+    wall_time = _get_wall_time(result)
+    if wall_time is not None:
+        metrics["wall_time"] = wall_time
+
+    return [metrics]
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    """Compute summary statistics of values of one metric."""
+    if len(values) > 1:
+        cut_points = statistics.quantiles(values, n=100, method="inclusive")
+        percentiles = {str(percentile): cut_points[percentile - 1] for percentile in _PERCENTILES}
+        stdev: Optional[float] = statistics.stdev(values)
+    else:
+        percentiles = {str(percentile): values[0] for percentile in _PERCENTILES}
+        stdev = None
+
+    return {
+        "count": len(values),
+        "min": min(values),
+        "max": max(values),
+        "mean": statistics.fmean(values),
+        "median": statistics.median(values),
+        "stdev": stdev,
+        "percentiles": percentiles,
+    }
+
+
+class MetricsAggregator:
+    """Collect metrics of batch items column-wise and summarize each metric over all the items."""
+
+    def __init__(self) -> None:
+        """Initialize an empty aggregator."""
+        self._columns: Dict[str, List[float]] = defaultdict(list)
+        self.items = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Add metrics reported in a result of one batch item."""
+        for metrics in extract_metrics(result):
+            for name, value in metrics.items():
+                self._columns[name].append(value)
+
+        self.items += 1
+
+    def summarize(self) -> Dict[str, Dict[str, Any]]:
+        """Compute summary statistics of all the metrics collected, metrics are sorted by name."""
+        return {name: summarize(self._columns[name]) for name in sorted(self._columns)}
@@ -17,33 +17,112 @@
 
 """Implementation of API v1."""
 
-import copy
+import functools
 import itertools
+import json
 import logging
 import os
+import queue
 import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Generator
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
 from typing import Optional
 from typing import Tuple
+from typing import TypeVar
+from typing import Union
+from typing import cast
 
+from flask import Response
+from flask import request
+from flask import stream_with_context
 from thoth.common import OpenShift
 from thoth.common import datetime2datetime_str
 from thoth.common.exceptions import NotFoundExceptionError
 from thoth.storages import InspectionStore
 from thoth.storages.exceptions import NotFoundError as StorageNotFoundError
-
+from werkzeug.http import parse_etags
+from werkzeug.http import parse_range_header
+
+from .aggregation import MetricsAggregator
+from .cache import ARTIFACT_CACHE
+from .cache import CachedArtifact
+from .compression import compress_chunks
+from .compression import negotiate_encoding
 from .configuration import Configuration
 from .dockerfile import create_dockerfile
+from .dockerfile import create_environment_dockerfile
+from .dockerfile import create_script_dockerfile
+from .dockerfile import environment_fingerprint
+from .dockerfile import may_contain_quotes
 from .exceptions import ScriptObtainingError
+from .index import InspectionIndex
+from .index import get_inspection_index
+from .metrics import observe_stage
+from .scripts import SCRIPT_FETCHER
+from .storage import decode_continuation_token
+from .storage import encode_continuation_token
+from .storage import get_inspection_store
+from .storage import iter_inspection_results
+from .storage import StoredArtifact
+from .storage import list_inspections
+from .storage import open_inspection_artifact
+from .workflows import CachedWorkflowStatus
+from .workflows import get_workflow_status_informer
+from .workflows import list_workflow_statuses
 
 _LOGGER = logging.getLogger(__name__)
 
+# A single quote not followed by another one, escaped for Argo Workflows by doubling it.
+_SINGLE_QUOTE_RE = re.compile(r"'(?!')")
+_ESCAPED_SINGLE_QUOTE_RE = re.compile(r"''")
+
+_HandlerT = TypeVar("_HandlerT", bound=Callable[..., Any])
+
 _OPENSHIFT = OpenShift()
 _PAGE_LIMIT = 100
+# Maximum number of inspections queried in one batched status request.
+_STATUS_BATCH_LIMIT = 500
+# Threads kept for concurrent storage and cluster calls, shared by requests so
+# that thread local S3 sessions are reused.
+_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("THOTH_AMUN_EXECUTOR_WORKERS", 16)))
+# Artifacts stored on Ceph never change, let clients cache them for a year.
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Number of threads used to retrieve batch results concurrently in one request.
+_RESULTS_FETCH_WORKERS = int(os.getenv("THOTH_AMUN_RESULTS_FETCH_WORKERS", 8))
+# Size of chunks artifacts are streamed from Ceph to clients in, peak memory of a stream does not depend on its size.
+_ARTIFACT_CHUNK_SIZE = 64 * 1024
+# Artifacts streamed which are smaller than this are not worth compressing.
+_ARTIFACT_COMPRESSION_MIN_SIZE = 1024
+# Maximum number of inspections submitted in one batch request.
+_BATCH_SUBMIT_LIMIT = 1000
+# Number of inspections of a batch request scheduled concurrently.
+_BATCH_SUBMIT_WORKERS = int(os.getenv("THOTH_AMUN_BATCH_SUBMIT_WORKERS", 8))
+# Maximum number of seconds an inspection event stream is kept open.
+_EVENTS_TIMEOUT = int(os.getenv("THOTH_AMUN_EVENTS_TIMEOUT", 1800))
+# Seconds between comments sent to keep idle event streams open through proxies.
+_EVENTS_KEEPALIVE_INTERVAL = 15
+# Event streams must not be cached or buffered by proxies.
+_EVENTS_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Phases of an Argo Workflow after which the workflow does not change anymore.
+_WORKFLOW_FINISHED_PHASES = frozenset(("Succeeded", "Failed", "Error"))
 
 _AMUN_API_URL = os.getenv("THOTH_AMUN_API_URL")
 _AMUN_DEPLOYMENT_NAME = os.getenv("THOTH_DEPLOYMENT_NAME")
+# Reference of environment images with dependencies installed, shared by inspections
+# differing only in the script run, "{fingerprint}" is replaced by fingerprint of
+# dependencies. Each inspection is built as a whole if not set.
+_ENVIRONMENT_IMAGE = os.getenv("THOTH_AMUN_ENVIRONMENT_IMAGE")
 
 # These are default requests for inspection builds and runs if not stated
 # otherwise. We explicitly assign defaults to requests coming to API so that
@@ -54,6 +133,46 @@ _DEFAULT_REQUESTS = {
 }
 
 
+def _retrieve_artifact(
+    handler: Callable[..., Tuple[Dict[str, Any], int]], *args: Any, **kwargs: Any
+) -> Union[CachedArtifact, Tuple[Dict[str, Any], int]]:
+    """Get serialized successful response of a handler serving an immutable artifact, pass errors through."""
+    key = handler.__name__ + json.dumps([args, kwargs], sort_keys=True)
+    artifact = ARTIFACT_CACHE.get(key)
+
+    if artifact is None:
+        result, status_code = handler(*args, **kwargs)
+        if status_code != 200:
+            return result, status_code
+
+        artifact = ARTIFACT_CACHE.put(key, json.dumps(result).encode())
+
+    return artifact
+
+
+def _immutable_artifact(handler: _HandlerT) -> _HandlerT:
+    """Cache successful responses of the given handler serving immutable artifacts, support conditional requests."""
+
+    @functools.wraps(handler)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        artifact = _retrieve_artifact(handler, *args, **kwargs)
+        if not isinstance(artifact, CachedArtifact):
+            return artifact
+
+        return _artifact_response(artifact)
+
+    return cast(_HandlerT, wrapper)
+
+
+def _artifact_response(artifact: CachedArtifact) -> Response:
+    """Create response serving a cached immutable artifact, support conditional requests."""
+    response = Response(artifact.body, mimetype="application/json")
+    response.set_etag(artifact.etag)
+    response.headers["Cache-Control"] = _IMMUTABLE_CACHE_CONTROL
+    # Turns the response into 304 Not Modified if If-None-Match matches.
+    return response.make_conditional(request)
+
+
 def _construct_parameters_dict(specification: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
     """Construct parameters that should be passed to build or inspection job."""
     # Name of parameters are shared in build/job templates so parameters are constructed regardless build or job.
@@ -78,14 +197,32 @@ def _construct_parameters_dict(specification: Dict[str, Any]) -> Tuple[Dict[str,
     return parameters, use_hw_template
 
 
-def _do_create_dockerfile(specification: Dict[Any, Any]) -> Tuple[Any, Any]:
+def _do_create_dockerfile(specification: Dict[Any, Any], environment_image: Optional[str] = None) -> Tuple[Any, Any]:
     """Wrap dockerfile generation and report back an error if any."""
     try:
-        return create_dockerfile(specification)
-    except ScriptObtainingError as exc:
+        script = specification.get("script", "")
+        if script.startswith(("https://", "http://")):
+            # Downloaded upfront to be measured on its own, rendering uses the cached script.
+            with observe_stage("script.fetch"):
+                SCRIPT_FETCHER.fetch(script)
+
+        with observe_stage("render.dockerfile"):
+            if environment_image is not None:
+                return create_script_dockerfile(specification, environment_image)
+
+            return create_dockerfile(specification)
+    except (ScriptObtainingError, ValueError) as exc:
         return None, str(exc)
 
 
+def _get_environment_image(specification: Dict[str, Any]) -> Optional[str]:
+    """Get environment image the script should be run on top of, None if the inspection is built as a whole."""
+    if not _ENVIRONMENT_IMAGE or "script" not in specification:
+        return None
+
+    return _ENVIRONMENT_IMAGE.format(fingerprint=environment_fingerprint(specification))
+
+
 def post_generate_dockerfile(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
     """Generate Dockerfile out of software stack specification."""
     parameters = {"specification": specification}
@@ -106,19 +243,18 @@ def _adjust_default_requests(dict_: Dict[str, Any]) -> None:
     dict_["requests"]["memory"] = dict_["requests"].get("memory") or _DEFAULT_REQUESTS["memory"]
 
 
-def _parse_specification(obj: Dict[str, Any]) -> Any:
+def _parse_specification(obj: Any) -> Any:
     """Parse inspection specification.
 
-    Cast types to comply with Argo and escapes quotes.
+    Cast types to comply with Argo and escapes quotes. The given specification
+    is not modified, containers are copied as they are traversed.
     """
     if isinstance(obj, dict):
-        for k in obj:
-            obj[k] = _parse_specification(obj[k])
+        return {k: _parse_specification(v) for k, v in obj.items()}
     elif isinstance(obj, list):
-        for i, v in enumerate(obj):
-            obj[i] = _parse_specification(v)
-    elif isinstance(obj, str):
-        return re.sub(r"'(?!')", "''", obj)
+        return [_parse_specification(v) for v in obj]
+    elif isinstance(obj, str) and "'" in obj:
+        return _SINGLE_QUOTE_RE.sub("''", obj)
 
     return obj
 
@@ -126,26 +262,24 @@ def _parse_specification(obj: Dict[str, Any]) -> Any:
 def _unparse_specification(parsed_specification: Dict[Any, Any]) -> Dict[Any, Any]:
     """Unparse inspection specification.
 
-    Casts types to comply with the inspection scheme and unescapes quotes.
+    Casts types to comply with the inspection scheme and unescapes quotes. The
+    given specification is not modified.
     """
-    specification = parsed_specification.copy()
 
-    def _unescape_single_quotes(obj: Dict[Any, Any]) -> Any:
+    def _unescape_single_quotes(obj: Any) -> Any:
         if isinstance(obj, dict):
-            for k in obj:
-                obj[k] = _unescape_single_quotes(obj[k])
+            return {k: _unescape_single_quotes(v) for k, v in obj.items()}
         elif isinstance(obj, list):
-            for i, v in enumerate(obj):
-                obj[i] = _unescape_single_quotes(v)
-        elif isinstance(obj, str):
-            return re.sub(r"''", "'", obj)
+            return [_unescape_single_quotes(v) for v in obj]
+        elif isinstance(obj, str) and "''" in obj:
+            return _ESCAPED_SINGLE_QUOTE_RE.sub("'", obj)
 
         return obj
 
-    specification = _unescape_single_quotes(specification)
+    specification: Dict[Any, Any] = _unescape_single_quotes(parsed_specification)
 
-    if "batch_size" in parsed_specification:
-        parsed_specification["batch_size"] = int(parsed_specification["batch_size"])
+    if "batch_size" in specification:
+        specification["batch_size"] = int(specification["batch_size"])
 
     return specification
 
@@ -153,7 +287,7 @@ def _unparse_specification(parsed_specification: Dict[Any, Any]) -> Dict[Any, An
 def get_version() -> Dict[str, Any]:
     """Obtain service version identifier."""
     from amun import __version__ as __amun_version__
-    from amun.entrypoint import __service_version__ as __service_version__
+    from amun.application import __service_version__ as __service_version__
 
     return {
         "version": __amun_version__,
@@ -161,21 +295,31 @@ def get_version() -> Dict[str, Any]:
     }
 
 
-def post_inspection(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
-    """Create new inspection for the given software stack."""
-    from amun.entrypoint import __service_version__ as __service_version__
+class _PreparedInspection(NamedTuple):
+    """An inspection ready to be scheduled."""
+
+    dockerfile: str
+    specification: Dict[str, Any]
+    raw_specification: Dict[str, Any]
+    target: str
+    parameters: Dict[str, Any]
+
+
+def _prepare_inspection(specification: Dict[Any, Any]) -> Tuple[Optional[_PreparedInspection], Optional[str]]:
+    """Render Dockerfile and adjust specification to schedule the inspection, report back an error if any."""
+    from amun.application import __service_version__ as __service_version__
+
+    environment_image = _get_environment_image(specification)
 
     # Generate first Dockerfile so we do not end up with an empty imagestream if Dockerfile creation fails.
-    dockerfile, run_job_or_error = _do_create_dockerfile(specification)
+    dockerfile, run_job_or_error = _do_create_dockerfile(specification, environment_image)
     if dockerfile is None:
-        return (
-            {
-                "parameters:": specification,
-                # If not dockerfile is produced, run_job holds the error message.
-                "error": run_job_or_error,
-            },
-            400,
-        )
+        # If not dockerfile is produced, run_job holds the error message.
+        return None, run_job_or_error
+
+    # Escaping is skipped if nothing to escape can be present, files embedded in base64 can be large.
+    if may_contain_quotes(specification):
+        dockerfile = dockerfile.replace("'", "''")
 
     run_job = run_job_or_error
 
@@ -193,54 +337,143 @@ def post_inspection(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]
     specification["@amun_service_version"] = __service_version__
     specification["@amun_api_url"] = _AMUN_API_URL
     specification["@amun_deployment_name"] = _AMUN_DEPLOYMENT_NAME
+    if environment_image is not None:
+        specification["@environment_image"] = environment_image
 
     # Without escaped characters, as retrieved on endpoint with defaults.
-    raw_specification = copy.deepcopy(specification)
-
-    if "batch_size" in specification:
-        # Convert to a string due to serialization when submitting to Argo Workflows.
-        specification["batch_size"] = str(specification["batch_size"])
-    else:
-        specification["batch_size"] = "1"
-        raw_specification["batch_size"] = 1
-
-    specification = _parse_specification(specification)
-    parameters, use_hw_template = _construct_parameters_dict(specification.get("build", {}))
-
-    target = "inspection-run-result" if run_job else "inspection-build"
-
-    dockerfile = dockerfile.replace("'", "''")
-
-    inspection_id = _OPENSHIFT.schedule_inspection(
+    raw_specification = specification
+    raw_specification.setdefault("batch_size", 1)
+
+    # Escaping copies the specification, the raw one is kept untouched.
+    with observe_stage("render.parse_specification"):
+        specification = _parse_specification(raw_specification)
+    # Convert to a string due to serialization when submitting to Argo Workflows.
+    specification["batch_size"] = str(specification["batch_size"])
+    parameters, _ = _construct_parameters_dict(specification.get("build", {}))
+    if environment_image is not None:
+        # The environment image is built by the workflow only if it does not exist yet.
+        parameters["ENVIRONMENT_IMAGE"] = environment_image
+        with observe_stage("render.environment_dockerfile"):
+            environment_dockerfile = create_environment_dockerfile(raw_specification)
+        if may_contain_quotes(raw_specification):
+            environment_dockerfile = environment_dockerfile.replace("'", "''")
+        parameters["ENVIRONMENT_DOCKERFILE"] = environment_dockerfile
+
+    prepared = _PreparedInspection(
         dockerfile=dockerfile,
         specification=specification,
-        target=target,
-        parameters=parameters,
         raw_specification=raw_specification,
+        target="inspection-run-result" if run_job else "inspection-build",
+        parameters=parameters,
     )
+    return prepared, None
+
+
+def _schedule_inspection(prepared: _PreparedInspection) -> Optional[str]:
+    """Schedule a prepared inspection and add it to the inspection index."""
+    with observe_stage("openshift.schedule_inspection"):
+        inspection_id: Optional[str] = _OPENSHIFT.schedule_inspection(
+            dockerfile=prepared.dockerfile,
+            specification=prepared.specification,
+            target=prepared.target,
+            parameters=prepared.parameters,
+            raw_specification=prepared.raw_specification,
+        )
+
+    index = get_inspection_index()
+    if index is not None and inspection_id is not None:
+        try:
+            index.add(inspection_id, prepared.raw_specification)
+        except sqlite3.Error:
+            _LOGGER.exception("Failed to add inspection %r to the inspection index", inspection_id)
 
     # TODO: Check whether the workflow spec has been resolved successfully
     # The resolution happens on the server side, therefore even if the WF
     # is submitted successfully, it mail fail due to an invalid spec later on
 
+    return inspection_id
+
+
+def post_inspection(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
+    """Create new inspection for the given software stack."""
+    prepared, error = _prepare_inspection(specification)
+    if prepared is None:
+        return (
+            {
+                "parameters:": specification,
+                "error": error,
+            },
+            400,
+        )
+
+    inspection_id = _schedule_inspection(prepared)
+
     return (
         {
             "inspection_id": inspection_id,
-            "parameters": raw_specification,
+            "parameters": prepared.raw_specification,
         },
         202,
     )
 
 
+def post_inspection_batch(inspection_batch: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Create new inspections for the given software stacks in one call."""
+    specifications = inspection_batch["specifications"]
+    parameters = {"count": len(specifications)}
+
+    if len(specifications) > _BATCH_SUBMIT_LIMIT:
+        return {
+            "error": f"Too many inspections submitted, at most {_BATCH_SUBMIT_LIMIT} can be submitted at once",
+            "parameters": parameters,
+        }, 400
+
+    # Download scripts shared by inspections once and concurrently, Dockerfiles are rendered using cached scripts.
+    with observe_stage("script.fetch_many"):
+        SCRIPT_FETCHER.fetch_many(
+            specification["script"]
+            for specification in specifications
+            if specification.get("script", "").startswith(("https://", "http://"))
+        )
+
+    def _do_prepare_inspection(specification: Dict[str, Any]) -> Tuple[Optional[_PreparedInspection], Optional[str]]:
+        # An invalid specification is reported for its item, other inspections in the batch are still scheduled.
+        try:
+            return _prepare_inspection(specification)
+        except Exception as exc:
+            _LOGGER.exception("Failed to prepare inspection")
+            return None, f"Failed to prepare inspection: {exc}"
+
+    # Identical build stacks share the Dockerfile rendered, see amun.dockerfile.create_dockerfile.
+    prepared_inspections = [_do_prepare_inspection(specification) for specification in specifications]
+
+    def _do_schedule_inspection(prepared: _PreparedInspection) -> Dict[str, Any]:
+        try:
+            return {"inspection_id": _schedule_inspection(prepared), "error": None}
+        except Exception as exc:
+            _LOGGER.exception("Failed to schedule inspection")
+            return {"inspection_id": None, "error": f"Failed to schedule inspection: {exc}"}
+
+    inspections: List[Dict[str, Any]] = [{"inspection_id": None, "error": error} for _, error in prepared_inspections]
+    to_schedule = [idx for idx, (prepared, _) in enumerate(prepared_inspections) if prepared is not None]
+    if to_schedule:
+        with ThreadPoolExecutor(max_workers=min(_BATCH_SUBMIT_WORKERS, len(to_schedule))) as executor:
+            scheduled = executor.map(_do_schedule_inspection, (prepared_inspections[idx][0] for idx in to_schedule))
+            for idx, result in zip(to_schedule, scheduled):
+                inspections[idx] = result
+
+    return {"inspections": inspections, "parameters": parameters}, 202
+
+
 def get_inspection_job_batch_size(inspection_id: str) -> Tuple[Dict[str, Any], int]:
     """Get batch size for the given inspection."""
     parameters = {"inspection_id": inspection_id}
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
+    inspection_store = get_inspection_store(inspection_id)
 
     try:
-        batch_size = inspection_store.results.get_results_count()
+        with observe_stage("storage.get_results_count"):
+            batch_size = inspection_store.results.get_results_count()
     except StorageNotFoundError:
         return {
             "error": f"No inspection {inspection_id!r} found",
@@ -250,15 +483,16 @@ def get_inspection_job_batch_size(inspection_id: str) -> Tuple[Dict[str, Any], i
     return {"batch_size": batch_size, "parameters": parameters}, 200
 
 
+@_immutable_artifact
 def get_inspection_job_log(inspection_id: str, item: int) -> Tuple[Dict[str, Any], int]:
     """Get logs of the given inspection."""
     parameters = {"inspection_id": inspection_id}
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
+    inspection_store = get_inspection_store(inspection_id)
 
     try:
-        log = inspection_store.results.retrieve_log(item)
+        with observe_stage("storage.retrieve_log"):
+            log = inspection_store.results.retrieve_log(item)
     except StorageNotFoundError:
         return (
             {
@@ -272,15 +506,16 @@ def get_inspection_job_log(inspection_id: str, item: int) -> Tuple[Dict[str, Any
     return {"log": log, "parameters": parameters}, 200
 
 
+@_immutable_artifact
 def get_inspection_job_result(inspection_id: str, item: int) -> Tuple[Dict[str, Any], int]:
     """Get logs of the given inspection."""
     parameters = {"inspection_id": inspection_id}
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
+    inspection_store = get_inspection_store(inspection_id)
 
     try:
-        result = inspection_store.results.retrieve_result(item)
+        with observe_stage("storage.retrieve_result"):
+            result = inspection_store.results.retrieve_result(item)
     except StorageNotFoundError:
         return (
             {
@@ -294,30 +529,138 @@ def get_inspection_job_result(inspection_id: str, item: int) -> Tuple[Dict[str,
     return {"result": result, "parameters": parameters}, 200
 
 
+def _get_job_results_stream(
+    inspection_id: str, start: Optional[int], end: Optional[int]
+) -> Union[Tuple[Dict[str, Any], int], Generator[str, None, None]]:
+    """Get NDJSON lines with results of the requested batch items, or an error response if they cannot be served."""
+    parameters = {"inspection_id": inspection_id, "start": start, "end": end}
+
+    inspection_store = get_inspection_store(inspection_id)
+
+    start = start or 0
+    if end is None:
+        with observe_stage("storage.get_results_count"):
+            end = inspection_store.results.get_results_count()
+        if end == 0:
+            return {
+                "error": f"No results for inspection {inspection_id!r} found",
+                "parameters": parameters,
+            }, 404
+
+    if start < 0 or end <= start:
+        return {
+            "error": f"Invalid range of batch items requested - [{start}, {end})",
+            "parameters": parameters,
+        }, 400
+
+    def _stream_results() -> Generator[str, None, None]:
+        for item, result in iter_inspection_results(inspection_store, range(start, end), _RESULTS_FETCH_WORKERS):
+            if result is None:
+                entry = {"item": item, "error": f"No result for item {item!r} for inspection {inspection_id!r} found"}
+            else:
+                entry = {"item": item, "result": result}
+
+            yield json.dumps(entry) + "\n"
+
+    return _stream_results()
+
+
+def get_inspection_job_results(
+    inspection_id: str, start: Optional[int] = None, end: Optional[int] = None
+) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream results of all the batch items of an inspection (or the requested range) as NDJSON."""
+    stream = _get_job_results_stream(inspection_id, start, end)
+    if isinstance(stream, tuple):
+        return stream
+
+    return Response(stream_with_context(stream), mimetype="application/x-ndjson")
+
+
+def _compute_job_statistics(inspection_id: str) -> Tuple[Dict[str, Any], int]:
+    """Aggregate metrics reported in results of all the batch items of an inspection."""
+    parameters = {"inspection_id": inspection_id}
+
+    inspection_store = get_inspection_store(inspection_id)
+
+    try:
+        with observe_stage("storage.retrieve_specification"):
+            specification = inspection_store.retrieve_specification()
+        with observe_stage("storage.get_results_count"):
+            results_count = inspection_store.results.get_results_count()
+    except StorageNotFoundError:
+        results_count = 0
+
+    if results_count == 0:
+        return {
+            "error": f"No results for inspection {inspection_id!r} found",
+            "parameters": parameters,
+        }, 404
+
+    aggregator = MetricsAggregator()
+    for _, result in iter_inspection_results(inspection_store, range(results_count), _RESULTS_FETCH_WORKERS):
+        if result is not None:
+            aggregator.add(result)
+
+    batch_size = int(specification.get("batch_size", 1))
+    return {
+        "batch_size": batch_size,
+        "complete": aggregator.items >= batch_size,
+        "items": aggregator.items,
+        "parameters": parameters,
+        "statistics": aggregator.summarize(),
+    }, 200
+
+
+def _retrieve_job_statistics(inspection_id: str) -> Union[CachedArtifact, Tuple[Dict[str, Any], int]]:
+    """Get statistics of an inspection, statistics are cached once results of all the batch items are stored."""
+    key = f"get_inspection_job_statistics:{inspection_id}"
+    artifact = ARTIFACT_CACHE.get(key)
+
+    if artifact is None:
+        result, status_code = _compute_job_statistics(inspection_id)
+        if status_code != 200 or not result["complete"]:
+            return result, status_code
+
+        artifact = ARTIFACT_CACHE.put(key, json.dumps(result).encode())
+
+    return artifact
+
+
+def get_inspection_job_statistics(inspection_id: str) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Get statistics of metrics reported by the batch items of an inspection."""
+    statistics = _retrieve_job_statistics(inspection_id)
+    if not isinstance(statistics, CachedArtifact):
+        return statistics
+
+    return _artifact_response(statistics)
+
+
+@_immutable_artifact
 def get_inspection_build_log(inspection_id: str) -> Tuple[Dict[str, Any], int]:
     """Get build log of an inspection."""
     parameters = {"inspection_id": inspection_id}
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
+    inspection_store = get_inspection_store(inspection_id)
 
     try:
-        log = inspection_store.build.retrieve_log()
+        with observe_stage("storage.retrieve_build_log"):
+            log = inspection_store.build.retrieve_log()
     except StorageNotFoundError:
         return {"error": "Build log for the given inspection id was not found", "parameters": parameters}, 404
 
     return {"log": log, "parameters": parameters}, 200
 
 
+@_immutable_artifact
 def get_inspection_specification(inspection_id: str) -> Tuple[Dict[str, Any], int]:
     """Get specification for the given build."""
     parameters = {"inspection_id": inspection_id}
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
+    inspection_store = get_inspection_store(inspection_id)
 
     try:
-        specification = inspection_store.retrieve_specification()
+        with observe_stage("storage.retrieve_specification"):
+            specification = inspection_store.retrieve_specification()
     except StorageNotFoundError:
         return {
             "error": f"No specification for inspection {inspection_id!r} found",
@@ -330,50 +673,423 @@ def get_inspection_specification(inspection_id: str) -> Tuple[Dict[str, Any], in
     }, 200
 
 
-def get_inspection_status(inspection_id: str) -> Tuple[Dict[str, Any], int]:
-    """Get status of an inspection."""
-    parameters = {"inspection_id": inspection_id}
+class _RawArtifact(NamedTuple):
+    """A stored artifact ready to be streamed to a client as stored."""
+
+    status_code: int
+    headers: Dict[str, str]
+    # None if the client already has the artifact.
+    chunks: Optional[Generator[bytes, None, None]]
 
-    inspection_store = InspectionStore(inspection_id)
-    inspection_store.connect()
-    data_stored = inspection_store.exists()
 
-    workflow_status = None
+def _iter_artifact_chunks(artifact: StoredArtifact, encoding: Optional[str]) -> Generator[bytes, None, None]:
+    """Read artifact from Ceph in chunks, compress them if an encoding is given."""
     try:
-        wf: Dict[str, Any] = _OPENSHIFT.get_workflow(
-            label_selector=f"inspection_id={inspection_id}",
-            namespace=_OPENSHIFT.amun_inspection_namespace,
-        )
-        workflow_status = wf["status"]
-    except NotFoundExceptionError:
-        pass
+        yield from compress_chunks(artifact.body.iter_chunks(_ARTIFACT_CHUNK_SIZE), encoding)
+    finally:
+        artifact.body.close()
+
+
+def _open_raw_artifact(
+    inspection_id: str,
+    key: str,
+    range_header: Optional[str],
+    accept_encoding: Optional[str],
+    if_none_match: Optional[str],
+) -> Union[_RawArtifact, Tuple[Dict[str, Any], int]]:
+    """Start streaming an artifact of an inspection, honour requested range, content encoding and entity tags."""
+    parameters = {"inspection_id": inspection_id, "artifact": key}
+
+    byte_range = None
+    if range_header:
+        requested_range = parse_range_header(range_header)
+        if requested_range is None or requested_range.units != "bytes" or len(requested_range.ranges) != 1:
+            return {
+                "error": f"Invalid range {range_header!r}, a single byte range is supported",
+                "parameters": parameters,
+            }, 416
+
+        byte_range = requested_range.to_header()
 
-    build_status = None
+    try:
+        with observe_stage("storage.open_artifact"):
+            artifact = open_inspection_artifact(inspection_id, key, byte_range)
+    except ValueError as exc:
+        return {"error": str(exc), "parameters": parameters}, 416
+
+    if artifact is None:
+        return {"error": f"No {key} found for inspection {inspection_id!r}", "parameters": parameters}, 404
+
+    # Ranges are served as stored, a range of a compressed representation is of no use for a client.
+    encoding = None
+    if byte_range is None and artifact.content_length >= _ARTIFACT_COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(accept_encoding)
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": _IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if artifact.etag:
+        # Each encoded representation has its own entity tag.
+        etag = artifact.etag.strip('"') + (f"-{encoding}" if encoding else "")
+        headers["ETag"] = f'"{etag}"'
+        if if_none_match and parse_etags(if_none_match).contains_weak(etag):
+            artifact.body.close()
+            return _RawArtifact(status_code=304, headers=headers, chunks=None)
+
+    status_code = 200
+    if artifact.content_range:
+        status_code = 206
+        headers["Content-Range"] = artifact.content_range
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    else:
+        headers["Content-Length"] = str(artifact.content_length)
+
+    return _RawArtifact(status_code=status_code, headers=headers, chunks=_iter_artifact_chunks(artifact, encoding))
+
+
+def _stream_raw_artifact(inspection_id: str, key: str, mimetype: str) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream an artifact of an inspection as stored on Ceph."""
+    raw_artifact = _open_raw_artifact(
+        inspection_id,
+        key,
+        request.headers.get("Range"),
+        request.headers.get("Accept-Encoding"),
+        request.headers.get("If-None-Match"),
+    )
+    if not isinstance(raw_artifact, _RawArtifact):
+        return raw_artifact
+
+    return Response(
+        stream_with_context(raw_artifact.chunks) if raw_artifact.chunks is not None else None,
+        status=raw_artifact.status_code,
+        headers=raw_artifact.headers,
+        mimetype=mimetype,
+    )
+
+
+def get_inspection_build_log_raw(inspection_id: str) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream build log of an inspection as stored, optionally compressed or just the requested range."""
+    return _stream_raw_artifact(inspection_id, "build/log", "text/plain")
+
+
+def get_inspection_job_log_raw(inspection_id: str, item: int) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream log of an inspection run as stored, optionally compressed or just the requested range."""
+    return _stream_raw_artifact(inspection_id, f"results/{item}/log", "text/plain")
+
+
+def get_inspection_job_result_raw(inspection_id: str, item: int) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream result of an inspection run as stored, optionally compressed or just the requested range."""
+    return _stream_raw_artifact(inspection_id, f"results/{item}/result", "application/json")
+
+
+def get_inspection_job_profile(inspection_id: str, item: int) -> Union[Tuple[Dict[str, Any], int], Response]:
+    """Stream profile of the profiled run of an inspection job as written by the profiler."""
+    return _stream_raw_artifact(inspection_id, f"results/{item}/profile", "application/octet-stream")
+
+
+def _is_data_stored(inspection_store: InspectionStore) -> bool:
+    """Check whether data of an inspection are stored on Ceph."""
+    with observe_stage("storage.exists"):
+        data_stored: bool = inspection_store.exists()
+
+    return data_stored
+
+
+def _get_build_status(inspection_id: str) -> Optional[Dict[str, Any]]:
+    """Get status of the build pod of an inspection, if any."""
     try:
         # As we treat inspection_id same all over the places (dc, dc, job), we can
         # safely call gathering info about pod. There will be always only one build
         # (hopefully) - created per a user request.
         # OpenShift does not expose any endpoint for a build status anyway.
-        build_status = _OPENSHIFT.get_pod_status_report(
-            inspection_id + "-1-build", Configuration.AMUN_INSPECTION_NAMESPACE
-        )
+        with observe_stage("openshift.get_pod_status_report"):
+            build_status: Dict[str, Any] = _OPENSHIFT.get_pod_status_report(
+                inspection_id + "-1-build", Configuration.AMUN_INSPECTION_NAMESPACE
+            )
     except NotFoundExceptionError:
-        pass
+        return None
+
+    return build_status
+
+
+def _get_cached_workflow_status(inspection_id: str) -> Optional[CachedWorkflowStatus]:
+    """Get workflow status as seen by the workflow informer, None if it needs to be queried on the cluster."""
+    informer = get_workflow_status_informer(_OPENSHIFT, Configuration.AMUN_INSPECTION_NAMESPACE)
+    if informer is None:
+        return None
+
+    return informer.get(inspection_id)
+
+
+def _get_workflow_metadata(cached_statuses: List[Optional[CachedWorkflowStatus]]) -> Dict[str, Any]:
+    """Describe where workflow statuses come from and how stale they can be."""
+    source = "cluster"
+    staleness = None
+    synced_at = None
+    if any(cached_statuses):
+        source = "informer" if all(cached_statuses) else "mixed"
+        oldest_sync = min(cached.synced_at for cached in cached_statuses if cached is not None)
+        staleness = time.monotonic() - oldest_sync
+        synced_at = datetime2datetime_str(datetime.utcnow() - timedelta(seconds=staleness))
+
+    return {
+        "workflow_source": source,
+        "workflow_synced_at": synced_at,
+        "workflow_staleness": staleness,
+    }
+
+
+def get_inspection_status(inspection_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get status of an inspection."""
+    parameters = {"inspection_id": inspection_id}
+
+    data_stored = _is_data_stored(get_inspection_store(inspection_id))
+
+    cached = _get_cached_workflow_status(inspection_id)
+    if cached is not None:
+        workflow_status = cached.status
+    else:
+        workflow_status = None
+        try:
+            with observe_stage("openshift.get_workflow"):
+                wf: Dict[str, Any] = _OPENSHIFT.get_workflow(
+                    label_selector=f"inspection_id={inspection_id}",
+                    namespace=_OPENSHIFT.amun_inspection_namespace,
+                )
+            workflow_status = wf["status"]
+        except NotFoundExceptionError:
+            pass
+
+    build_status = _get_build_status(inspection_id)
 
     return (
         {
             "status": {"build": build_status, "data_stored": data_stored, "workflow": workflow_status},
+            "metadata": _get_workflow_metadata([cached]),
             "parameters": parameters,
         },
         200,
     )
 
 
-def get_inspection(page: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+def post_inspection_status(status_request: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Get status of multiple inspections in one call."""
+    # Preserve order of inspection ids as stated by user, discard duplicates.
+    ids = list(dict.fromkeys(status_request["inspection_ids"]))
+    parameters = {"inspection_ids": ids}
+
+    if len(ids) > _STATUS_BATCH_LIMIT:
+        return {
+            "error": f"Too many inspections requested, at most {_STATUS_BATCH_LIMIT} can be queried at once",
+            "parameters": parameters,
+        }, 400
+
+    data_stored = _EXECUTOR.map(lambda inspection_id: _is_data_stored(get_inspection_store(inspection_id)), ids)
+    build_statuses = _EXECUTOR.map(_get_build_status, ids)
+    cached_statuses = [_get_cached_workflow_status(inspection_id) for inspection_id in ids]
+    workflow_statuses = {
+        inspection_id: cached.status for inspection_id, cached in zip(ids, cached_statuses) if cached is not None
+    }
+    missing = [inspection_id for inspection_id in ids if inspection_id not in workflow_statuses]
+    if missing:
+        with observe_stage("openshift.list_workflow_statuses"):
+            statuses = list_workflow_statuses(_OPENSHIFT, Configuration.AMUN_INSPECTION_NAMESPACE, missing)
+        workflow_statuses.update(statuses)
+
+    return {
+        "statuses": {
+            inspection_id: {
+                "build": build_status,
+                "data_stored": stored,
+                "workflow": workflow_statuses.get(inspection_id),
+            }
+            for inspection_id, stored, build_status in zip(ids, data_stored, build_statuses)
+        },
+        "metadata": _get_workflow_metadata(cached_statuses),
+        "parameters": parameters,
+    }, 200
+
+
+def _format_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _get_events_timeout(timeout: Optional[int]) -> int:
+    """Get number of seconds an inspection event stream is kept open for, bounded by configuration."""
+    return _EVENTS_TIMEOUT if timeout is None or timeout <= 0 or timeout > _EVENTS_TIMEOUT else timeout
+
+
+def _events_unavailable(inspection_id: str, timeout: int) -> Tuple[Dict[str, Any], int]:
+    """Report inspection events cannot be streamed."""
+    return {
+        "error": "Streaming inspection events is not available as the workflow informer is turned off",
+        "parameters": {"inspection_id": inspection_id, "timeout": timeout},
+    }, 503
+
+
+def get_inspection_events(inspection_id: str, timeout: Optional[int] = None) -> Any:
+    """Stream workflow phase changes of an inspection and a final event once the inspection finishes."""
+    timeout = _get_events_timeout(timeout)
+
+    informer = get_workflow_status_informer(_OPENSHIFT, Configuration.AMUN_INSPECTION_NAMESPACE)
+    if informer is None:
+        return _events_unavailable(inspection_id, timeout)
+
+    inspection_store = get_inspection_store(inspection_id)
+
+    def _stream_events() -> Iterator[str]:
+        # Subscribe before reading the current state so that no change is missed.
+        subscription = informer.subscribe(inspection_id)
+        try:
+            if _is_data_stored(inspection_store):
+                yield _format_event("stored", {"inspection_id": inspection_id})
+                return
+
+            cached = informer.get(inspection_id)
+            workflow_status = cached.status if cached is not None else None
+            phase = None
+            deadline = time.monotonic() + timeout
+            while True:
+                if workflow_status is not None and workflow_status.get("phase") != phase:
+                    phase = workflow_status.get("phase")
+                    yield _format_event("workflow", {"phase": phase, "status": workflow_status})
+
+                if phase in _WORKFLOW_FINISHED_PHASES:
+                    # The workflow stores inspection data as its last step.
+                    event = "stored" if _is_data_stored(inspection_store) else "failed"
+                    yield _format_event(event, {"inspection_id": inspection_id, "phase": phase})
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield _format_event("timeout", {"inspection_id": inspection_id, "phase": phase})
+                    return
+
+                try:
+                    workflow_status = subscription.get(timeout=min(remaining, _EVENTS_KEEPALIVE_INTERVAL))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            informer.unsubscribe(inspection_id, subscription)
+
+    return Response(
+        stream_with_context(_stream_events()),
+        mimetype="text/event-stream",
+        headers=_EVENTS_HEADERS,
+    )
+
+
+def _normalize_datetime_filter(value: Optional[str]) -> Optional[str]:
+    """Normalize datetime given on input so that it can be compared with datetimes stored in the index."""
+    if value is None:
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise ValueError(f"Invalid datetime {value!r}, expected ISO 8601 format") from exc
+
+    # Datetimes are stored in UTC without timezone information, naive datetimes on input are considered UTC.
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+
+    normalized: str = datetime2datetime_str(parsed)
+    return normalized
+
+
+def _get_inspection_from_index(
+    index: InspectionIndex, limit: int, continuation_token: Optional[str], query: Dict[str, Any]
+) -> Tuple[List[str], Optional[str]]:
+    """Answer inspection listing using the local inspection index."""
+    after = None
+    if continuation_token is not None:
+        marker = decode_continuation_token(continuation_token)
+        if not isinstance(marker.get("after"), str) or not isinstance(marker.get("key"), (str, int, type(None))):
+            raise ValueError(f"Invalid continuation token {continuation_token!r}")
+
+        after = marker["after"], marker.get("key")
+
+    query = dict(query)
+    query["created_after"] = _normalize_datetime_filter(query.get("created_after"))
+    query["created_before"] = _normalize_datetime_filter(query.get("created_before"))
+
+    # Ask for one more item to find out if there is a next page.
+    inspections = index.query(limit=limit + 1, after=after, **query)
+
+    next_continuation_token = None
+    if len(inspections) > limit:
+        inspections = inspections[:limit]
+        last_id, last_value = inspections[-1]
+        marker = {"after": last_id}
+        if query.get("sort_by", "inspection_id") != "inspection_id":
+            marker["key"] = last_value
+        next_continuation_token = encode_continuation_token(marker)
+
+    return [inspection_id for inspection_id, _ in inspections], next_continuation_token
+
+
+def get_inspection(
+    page: Optional[int] = None,
+    limit: Optional[int] = None,
+    continuation_token: Optional[str] = None,
+    base: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    status: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = None,
+) -> Tuple[Dict[str, Any], int]:
     """Get listing of inspections available on Ceph."""
-    page = 1 if page is None or page <= 0 else page
     limit = _PAGE_LIMIT if limit is None or limit <= 0 or limit > _PAGE_LIMIT else limit
-    return {
-        "inspections": list(itertools.islice(InspectionStore.iter_inspections(), page - 1, limit)),
-        "parameters": {"page": page, "limit": limit},
+
+    query = {
+        "base": base,
+        "created_after": created_after,
+        "created_before": created_before,
+        "batch_size": batch_size,
+        "status": status,
+        "sort_by": sort_by,
+        "sort_order": sort_order,
     }
+    query = {k: v for k, v in query.items() if v is not None}
+
+    if page is not None and continuation_token is None and not query:
+        # Deprecated page based listing, kept for backwards compatibility.
+        page = 1 if page <= 0 else page
+        return {
+            "inspections": list(itertools.islice(InspectionStore.iter_inspections(), page - 1, limit)),
+            "next_continuation_token": None,
+            "parameters": {"page": page, "limit": limit},
+        }, 200
+
+    parameters = {"limit": limit, "continuation_token": continuation_token, **query}
+
+    index = get_inspection_index()
+    if index is not None:
+        index.refresh_if_stale()
+        if not index.is_populated():
+            index = None
+
+    if index is None and query:
+        return {
+            "error": "Filtering and sorting inspections is not available as the inspection index is not ready",
+            "parameters": parameters,
+        }, 503
+
+    try:
+        # Listings not filtered nor sorted are served from the object store so that they are always up to date.
+        if index is not None and query:
+            inspections, next_continuation_token = _get_inspection_from_index(index, limit, continuation_token, query)
+        else:
+            with observe_stage("storage.list_inspections"):
+                inspections, next_continuation_token = list_inspections(limit, continuation_token)
+    except ValueError as exc:
+        return {"error": str(exc), "parameters": parameters}, 400
+
+    return {
+        "inspections": inspections,
+        "next_continuation_token": next_continuation_token,
+        "parameters": parameters,
+    }, 200
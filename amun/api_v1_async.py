@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Asynchronous variants of API v1 handlers used when the API is served by aiohttp.
+
+Handlers are a thread-offload adapter of the synchronous implementation rather
+than natively asynchronous - blocking calls to Ceph and the cluster are run in
+a bounded thread pool (THOTH_AMUN_ASYNC_EXECUTOR_WORKERS) so that they do not
+block the event loop. Only event streams are non-blocking, they wait for
+workflow changes on the event loop and do not hold a thread.
+"""
+
+import asyncio
+import contextlib
+import functools
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from typing import Union
+
+from aiohttp import web
+
+from . import api_v1
+from .cache import CachedArtifact
+from .configuration import Configuration
+from .storage import get_inspection_store
+from .workflows import get_workflow_status_informer
+
+_T = TypeVar("_T")
+
+# Threads running blocking calls of handlers, they bound the number of requests waiting on Ceph and the cluster.
+_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("THOTH_AMUN_ASYNC_EXECUTOR_WORKERS", 32)))
+
+
+async def _run(func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+    """Run a blocking function in the thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+async def _serve_artifact(
+    request: web.Request, handler: Callable[..., Any], **kwargs: Any
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Serve an immutable artifact from the cache shared with synchronous handlers, support conditional requests."""
+    artifact = await _run(api_v1._retrieve_artifact, inspect.unwrap(handler), **kwargs)
+    if not isinstance(artifact, CachedArtifact):
+        return artifact
+
+    return _artifact_response(request, artifact)
+
+
+def _artifact_response(request: web.Request, artifact: CachedArtifact) -> web.Response:
+    """Create response serving a cached immutable artifact, support conditional requests."""
+    if request.if_none_match is not None and any(etag.value in (artifact.etag, "*") for etag in request.if_none_match):
+        response = web.Response(status=304)
+    else:
+        response = web.Response(body=artifact.body, content_type="application/json")
+
+    response.etag = artifact.etag
+    response.headers["Cache-Control"] = api_v1._IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+async def _write_stream(
+    request: web.Request, response: web.StreamResponse, chunks: Generator[Union[str, bytes], None, None]
+) -> None:
+    """Send chunks produced by a blocking generator, the generator is run in the thread pool."""
+    await response.prepare(request)
+
+    try:
+        while True:
+            chunk = await _run(next, chunks, None)
+            if chunk is None:
+                break
+
+            await response.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    finally:
+        # The generator cannot be closed if still running in the thread pool, it is closed once collected then.
+        with contextlib.suppress(ValueError):
+            chunks.close()
+
+
+async def _stream_raw_artifact(
+    request: web.Request, inspection_id: str, key: str, content_type: str
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream an artifact of an inspection as stored on Ceph."""
+    raw_artifact = await _run(
+        api_v1._open_raw_artifact,
+        inspection_id,
+        key,
+        request.headers.get("Range"),
+        request.headers.get("Accept-Encoding"),
+        request.headers.get("If-None-Match"),
+    )
+    if not isinstance(raw_artifact, api_v1._RawArtifact):
+        return raw_artifact
+
+    response = web.StreamResponse(status=raw_artifact.status_code, headers=raw_artifact.headers)
+    response.content_type = content_type
+    if content_type.startswith("text/"):
+        response.charset = "utf-8"
+
+    if raw_artifact.chunks is not None:
+        await _write_stream(request, response, raw_artifact.chunks)
+
+    return response
+
+
+class _EventLoopSubscriber:
+    """Pass workflow status changes sent by the informer thread to a queue on the event loop."""
+
+    def __init__(self) -> None:
+        """Initialize subscriber bound to the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+
+    def put(self, item: Optional[Dict[str, Any]]) -> None:
+        """Receive workflow status in the informer thread."""
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+
+async def get_version() -> Dict[str, Any]:
+    """Obtain service version identifier."""
+    return api_v1.get_version()
+
+
+async def post_generate_dockerfile(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
+    """Generate Dockerfile out of software stack specification."""
+    return await _run(api_v1.post_generate_dockerfile, specification)
+
+
+async def post_inspection(specification: Dict[Any, Any]) -> Tuple[Dict[str, Any], int]:
+    """Create new inspection for the given software stack."""
+    return await _run(api_v1.post_inspection, specification)
+
+
+async def post_inspection_batch(inspection_batch: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Create new inspections for the given software stacks in one call."""
+    return await _run(api_v1.post_inspection_batch, inspection_batch)
+
+
+async def get_inspection_job_batch_size(inspection_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get batch size for the given inspection."""
+    return await _run(api_v1.get_inspection_job_batch_size, inspection_id)
+
+
+async def get_inspection_job_log(
+    request: web.Request, inspection_id: str, item: int
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Get logs of the given inspection."""
+    return await _serve_artifact(request, api_v1.get_inspection_job_log, inspection_id=inspection_id, item=item)
+
+
+async def get_inspection_job_result(
+    request: web.Request, inspection_id: str, item: int
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Get result of the given inspection."""
+    return await _serve_artifact(request, api_v1.get_inspection_job_result, inspection_id=inspection_id, item=item)
+
+
+async def get_inspection_job_results(
+    request: web.Request, inspection_id: str, start: Optional[int] = None, end: Optional[int] = None
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream results of all the batch items of an inspection (or the requested range) as NDJSON."""
+    stream = await _run(api_v1._get_job_results_stream, inspection_id, start, end)
+    if isinstance(stream, tuple):
+        return stream
+
+    response = web.StreamResponse()
+    response.content_type = "application/x-ndjson"
+    await _write_stream(request, response, stream)
+    return response
+
+
+async def get_inspection_job_statistics(
+    request: web.Request, inspection_id: str
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Get statistics of metrics reported by the batch items of an inspection."""
+    statistics = await _run(api_v1._retrieve_job_statistics, inspection_id)
+    if not isinstance(statistics, CachedArtifact):
+        return statistics
+
+    return _artifact_response(request, statistics)
+
+
+async def get_inspection_build_log_raw(
+    request: web.Request, inspection_id: str
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream build log of an inspection as stored, optionally compressed or just the requested range."""
+    return await _stream_raw_artifact(request, inspection_id, "build/log", "text/plain")
+
+
+async def get_inspection_job_log_raw(
+    request: web.Request, inspection_id: str, item: int
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream log of an inspection run as stored, optionally compressed or just the requested range."""
+    return await _stream_raw_artifact(request, inspection_id, f"results/{item}/log", "text/plain")
+
+
+async def get_inspection_job_result_raw(
+    request: web.Request, inspection_id: str, item: int
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream result of an inspection run as stored, optionally compressed or just the requested range."""
+    return await _stream_raw_artifact(request, inspection_id, f"results/{item}/result", "application/json")
+
+
+async def get_inspection_job_profile(
+    request: web.Request, inspection_id: str, item: int
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream profile of the profiled run of an inspection job as written by the profiler."""
+    return await _stream_raw_artifact(request, inspection_id, f"results/{item}/profile", "application/octet-stream")
+
+
+async def get_inspection_build_log(
+    request: web.Request, inspection_id: str
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Get build log of an inspection."""
+    return await _serve_artifact(request, api_v1.get_inspection_build_log, inspection_id=inspection_id)
+
+
+async def get_inspection_specification(
+    request: web.Request, inspection_id: str
+) -> Union[web.Response, Tuple[Dict[str, Any], int]]:
+    """Get specification for the given build."""
+    return await _serve_artifact(request, api_v1.get_inspection_specification, inspection_id=inspection_id)
+
+
+async def get_inspection_status(inspection_id: str) -> Tuple[Dict[str, Any], int]:
+    """Get status of an inspection."""
+    return await _run(api_v1.get_inspection_status, inspection_id)
+
+
+async def post_inspection_status(status_request: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Get status of multiple inspections in one call."""
+    return await _run(api_v1.post_inspection_status, status_request)
+
+
+async def get_inspection_events(
+    request: web.Request, inspection_id: str, timeout: Optional[int] = None
+) -> Union[web.StreamResponse, Tuple[Dict[str, Any], int]]:
+    """Stream workflow phase changes of an inspection and a final event once the inspection finishes."""
+    timeout = api_v1._get_events_timeout(timeout)
+
+    informer = get_workflow_status_informer(api_v1._OPENSHIFT, Configuration.AMUN_INSPECTION_NAMESPACE)
+    if informer is None:
+        return api_v1._events_unavailable(inspection_id, timeout)
+
+    inspection_store = await _run(get_inspection_store, inspection_id)
+
+    response = web.StreamResponse(headers=api_v1._EVENTS_HEADERS)
+    response.content_type = "text/event-stream"
+    await response.prepare(request)
+
+    async def _send(event: str, data: Dict[str, Any]) -> None:
+        await response.write(api_v1._format_event(event, data).encode())
+
+    # Subscribe before reading the current state so that no change is missed.
+    subscriber = _EventLoopSubscriber()
+    informer.add_subscriber(inspection_id, subscriber)
+    try:
+        if await _run(api_v1._is_data_stored, inspection_store):
+            await _send("stored", {"inspection_id": inspection_id})
+            return response
+
+        cached = informer.get(inspection_id)
+        workflow_status = cached.status if cached is not None else None
+        phase = None
+        deadline = time.monotonic() + timeout
+        while True:
+            if workflow_status is not None and workflow_status.get("phase") != phase:
+                phase = workflow_status.get("phase")
+                await _send("workflow", {"phase": phase, "status": workflow_status})
+
+            if phase in api_v1._WORKFLOW_FINISHED_PHASES:
+                # The workflow stores inspection data as its last step.
+                event = "stored" if await _run(api_v1._is_data_stored, inspection_store) else "failed"
+                await _send(event, {"inspection_id": inspection_id, "phase": phase})
+                return response
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                await _send("timeout", {"inspection_id": inspection_id, "phase": phase})
+                return response
+
+            try:
+                workflow_status = await asyncio.wait_for(
+                    subscriber.queue.get(), timeout=min(remaining, api_v1._EVENTS_KEEPALIVE_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                await response.write(b": keepalive\n\n")
+    finally:
+        informer.unsubscribe(inspection_id, subscriber)
+
+
+async def get_inspection(
+    page: Optional[int] = None,
+    limit: Optional[int] = None,
+    continuation_token: Optional[str] = None,
+    base: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    status: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    sort_order: Optional[str] = None,
+) -> Tuple[Dict[str, Any], int]:
+    """Get listing of inspections available on Ceph."""
+    return await _run(
+        api_v1.get_inspection,
+        page=page,
+        limit=limit,
+        continuation_token=continuation_token,
+        base=base,
+        created_after=created_after,
+        created_before=created_before,
+        batch_size=batch_size,
+        status=status,
+        sort_by=sort_by,
+        sort_order=sort_order,
+    )
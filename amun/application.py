@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Select the application serving Amun API.
+
+The Flask application from amun.entrypoint is served by default. If
+AMUN_API_ASYNC is set, the aiohttp application from amun.entrypoint_async is
+served instead and gunicorn has to use aiohttp.GunicornWebWorker worker class.
+Only the application selected is created.
+"""
+
+import os
+
+# Serve the API by aiohttp with asynchronous handlers.
+_API_ASYNC = bool(int(os.getenv("AMUN_API_ASYNC", 0)))
+
+if _API_ASYNC:
+    from .entrypoint_async import __service_version__
+    from .entrypoint_async import application
+else:
+    from .entrypoint import __service_version__
+    from .entrypoint import application
+
+__all__ = ["__service_version__", "application"]
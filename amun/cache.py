@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A cache of immutable inspection artifacts such as logs, results and specifications.
+
+Artifacts are stored on Ceph once and never change afterwards, so they can be
+cached without any invalidation. Items evicted from memory can be optionally
+spilled to a local directory.
+"""
+
+import atexit
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import NamedTuple
+from typing import Optional
+
+from prometheus_client import Counter
+
+from .lru import LRUCache
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum size of artifacts kept in memory, in bytes.
+_CACHE_SIZE = int(os.getenv("THOTH_AMUN_ARTIFACT_CACHE_SIZE", 64 * 1024 * 1024))
+# A directory to spill artifacts evicted from memory to, spilling is turned off if not set.
+_CACHE_DIR = os.getenv("THOTH_AMUN_ARTIFACT_CACHE_DIR")
+# Maximum size of artifacts spilled to disk, in bytes.
+_CACHE_DIR_SIZE = int(os.getenv("THOTH_AMUN_ARTIFACT_CACHE_DIR_SIZE", 1024 * 1024 * 1024))
+
+_CACHE_HITS = Counter("amun_artifact_cache_hits_total", "Artifacts served from the cache.", ["tier"])
+_CACHE_MISSES = Counter("amun_artifact_cache_misses_total", "Artifacts not found in the cache.")
+
+
+class CachedArtifact(NamedTuple):
+    """A serialized artifact together with its strong entity tag."""
+
+    body: bytes
+    etag: str
+
+
+class ArtifactCache:
+    """A size bounded LRU cache of serialized artifacts with optional on-disk spill."""
+
+    def __init__(self, size: int, spill_dir: Optional[str] = None, spill_dir_size: int = 0) -> None:
+        """Initialize cache, spilled artifacts are placed in a directory private to this process."""
+        self._memory = LRUCache[str, CachedArtifact](size, sizeof=lambda artifact: len(artifact.body))
+        self._spill_dir = None
+        self._spilled = LRUCache[str, str](spill_dir_size, sizeof=os.path.getsize)
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix=f"amun-{os.getpid()}-", dir=spill_dir)
+            atexit.register(shutil.rmtree, self._spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def compute_etag(body: bytes) -> str:
+        """Compute strong entity tag of the given artifact."""
+        return hashlib.sha256(body).hexdigest()
+
+    def _spill(self, key: str, artifact: CachedArtifact) -> None:
+        """Write an artifact evicted from memory to disk."""
+        if self._spill_dir is None:
+            return
+
+        # Keep entity tag in the file name so that it does not need to be computed again on load.
+        file_name = f"{hashlib.sha256(key.encode()).hexdigest()}.{artifact.etag}"
+        path = os.path.join(self._spill_dir, file_name)
+        try:
+            with open(path, "wb") as spill_file:
+                spill_file.write(artifact.body)
+        except OSError:
+            _LOGGER.exception("Failed to spill artifact %r to disk", key)
+            return
+
+        for _, evicted_path in self._spilled.put(key, path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(evicted_path)
+
+    def _load_spilled(self, key: str) -> Optional[CachedArtifact]:
+        """Load an artifact spilled to disk, remove it from disk as it is promoted back to memory."""
+        path = self._spilled.pop(key)
+        if path is None:
+            return None
+
+        try:
+            with open(path, "rb") as spill_file:
+                body = spill_file.read()
+            os.remove(path)
+        except OSError:
+            _LOGGER.exception("Failed to load artifact %r spilled to disk", key)
+            return None
+
+        return CachedArtifact(body=body, etag=os.path.basename(path).rsplit(".", maxsplit=1)[-1])
+
+    def get(self, key: str) -> Optional[CachedArtifact]:
+        """Get a cached artifact, None if not cached."""
+        artifact = self._memory.get(key)
+        if artifact is not None:
+            _CACHE_HITS.labels(tier="memory").inc()
+            return artifact
+
+        artifact = self._load_spilled(key)
+        if artifact is not None:
+            _CACHE_HITS.labels(tier="disk").inc()
+            self._store(key, artifact)
+            return artifact
+
+        _CACHE_MISSES.inc()
+        return None
+
+    def _store(self, key: str, artifact: CachedArtifact) -> None:
+        """Store artifact in memory, spill evicted artifacts."""
+        for evicted_key, evicted_artifact in self._memory.put(key, artifact):
+            self._spill(evicted_key, evicted_artifact)
+
+    def put(self, key: str, body: bytes) -> CachedArtifact:
+        """Cache a serialized artifact."""
+        artifact = CachedArtifact(body=body, etag=self.compute_etag(body))
+        self._store(key, artifact)
+        return artifact
+
+
+ARTIFACT_CACHE = ArtifactCache(_CACHE_SIZE, _CACHE_DIR, _CACHE_DIR_SIZE)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Content encoding of streamed responses.
+
+Zstandard is offered only if the zstandard package is installed, gzip is
+always available.
+"""
+
+import zlib
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression levels favour speed as responses are compressed on the fly.
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+# Preferred encodings first.
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Choose content encoding based on Accept-Encoding request header, None if the content is sent as is."""
+    if not accept_encoding:
+        return None
+
+    encoding: Optional[str] = parse_accept_header(accept_encoding).best_match(SUPPORTED_ENCODINGS)
+    return encoding
+
+
+def _create_compressor(encoding: str) -> Any:
+    """Create a streaming compressor for the given content encoding."""
+    if encoding == "gzip":
+        # Use gzip container, not raw deflate or zlib one.
+        return zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compressobj()
+
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress chunks using the given content encoding, chunks are passed through if no encoding is given."""
+    if encoding is None:
+        yield from chunks
+        return
+
+    compressor = _create_compressor(encoding)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
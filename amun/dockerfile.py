@@ -17,16 +17,23 @@
 
 """Utility functions for Amun API."""
 
+import base64
+import functools
+import gzip
+import hashlib
 import json
 import logging
 import os
 from typing import Any
 from typing import Dict
+from typing import List
+from typing import Optional
 from typing import Tuple
 import toml
-import requests
+from prometheus_client import Counter
 
-from .exceptions import ScriptObtainingError
+from .lru import LRUCache
+from .scripts import SCRIPT_FETCHER
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -37,6 +44,58 @@ _PIP_CONF = """
 [global]
 trusted-host = tensorflow.pypi.thoth-station.ninja
 """
+# Maximum size of commands merged into one RUN instruction, the shell gets them as one argument limited to 128 KiB.
+_RUN_COMMAND_MAX_SIZE = 64 * 1024
+# Parts of specification that affect the rendered Dockerfile.
+_DOCKERFILE_KEYS = (
+    "base",
+    "environment",
+    "update",
+    "packages",
+    "upgrade_pip",
+    "python_packages",
+    "files",
+    "python",
+    "package_manager",
+    "optimize_layers",
+    "file_embedding",
+    "inspection",
+)
+# Parts of specification that affect dependencies installed in the environment image.
+_ENVIRONMENT_KEYS = (
+    "base",
+    "update",
+    "packages",
+    "upgrade_pip",
+    "python_packages",
+    "files",
+    "python",
+    "package_manager",
+    "file_embedding",
+)
+# Parts of specification rendered into the Dockerfile verbatim, not embedded as files.
+_VERBATIM_KEYS = (
+    "base",
+    "environment",
+    "python_packages",
+    "inspection",
+)
+# Options of the inspection entrypoint stated in specification and environment variables they are passed in.
+_INSPECTION_OPTIONS = {
+    "output_head_size": "THOTH_AMUN_OUTPUT_HEAD_SIZE",
+    "output_tail_size": "THOTH_AMUN_OUTPUT_TAIL_SIZE",
+    "sampling_interval": "THOTH_AMUN_SAMPLING_INTERVAL",
+    "repetitions": "THOTH_AMUN_REPETITIONS",
+    "warmup_runs": "THOTH_AMUN_WARMUP_RUNS",
+    "perf_stat": "THOTH_AMUN_PERF_STAT",
+    "profiler": "THOTH_AMUN_PROFILER",
+}
+# Maximum size of rendered Dockerfiles kept in memory, in characters.
+_DOCKERFILE_CACHE_SIZE = int(os.getenv("THOTH_AMUN_DOCKERFILE_CACHE_SIZE", 32 * 1024 * 1024))
+
+_DOCKERFILE_CACHE = LRUCache[str, str](_DOCKERFILE_CACHE_SIZE, sizeof=len)
+_DOCKERFILE_CACHE_HITS = Counter("amun_dockerfile_cache_hits_total", "Dockerfiles served from the render cache.")
+_DOCKERFILE_CACHE_MISSES = Counter("amun_dockerfile_cache_misses_total", "Dockerfiles rendered.")
 
 
 def _determine_update_string() -> str:
@@ -59,47 +118,121 @@ def _obtain_script(script: str) -> Any:
     """Obtain script if it was specified by an URL, if script was provided inline, return it."""
     if script.startswith(("https://", "http://")):
         # Download script from remote if needed.
-        response = requests.get(script)
-        try:
-            response.raise_for_status()
-        except requests.HTTPError:
-            raise ScriptObtainingError(f"Failed to obtain script from {script} (HTTP status: {response.status_code})")
-
-        return response.text
+        return SCRIPT_FETCHER.fetch(script)
 
     return script
 
 
-def _write_file_string(content: str, path: str) -> str:
-    """Generate Dockerfile instruction that writes down the file content on the given path."""
-    # TODO: accept a list of files so we generate only one layer for all files
+def _printf_file_string(content: str, path: str) -> str:
+    """Generate shell command that writes down the file content on the given path."""
     # TODO: escape content
     # TODO: handle it in nice way so we can see it nicely in OpenShift's configuration
     content = content.replace("\\", "\\\\\\\\").replace('"', '\\"').replace("\n", "\\n\\\\n").replace("%", "%%")
     path = path.replace('"', '"')
-    return f'RUN printf "{content}" > "{path}"\n\n'
+    return f'printf "{content}" > "{path}"'
 
 
-def _write_file_script(content: str, path: str) -> str:
-    """Generate Dockerfile instruction that writes down the file content on the given path."""
+def _printf_file_script(content: str, path: str) -> str:
+    """Generate shell command that writes down the script content on the given path."""
     content = content.replace("\\", "\\\\\\\\").replace('"', '\\"').replace("\n", "\\\\n").replace("%", "%%")
     path = path.replace('"', '"')
-    return f'RUN printf "{content}" > "{path}"\n\n'
+    return f'printf "{content}" > "{path}"'
 
 
-def create_dockerfile(specification: Dict[str, Any]) -> Tuple[str, bool]:
-    """Create a Dockerfile based on software stack specification."""
-    script_present = False
-    dockerfile = "FROM " + specification["base"] + "\n\n"
+def _file_command(content: str, path: str, embedding: str, script: bool = False) -> str:
+    """Generate shell command that writes down the file content on the given path using the given embedding."""
+    if embedding == "printf":
+        return _printf_file_script(content, path) if script else _printf_file_string(content, path)
 
-    dockerfile += "USER root\n\n"
+    data = content.encode()
+    decode = "base64 -d"
+    if embedding == "gzip-base64":
+        # No modification time so that the output is reproducible and the build cache can be used.
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+        decode += " | gunzip"
+    elif embedding != "base64":
+        raise ValueError(f"Unknown file embedding {embedding!r}")
 
-    env_str = ""
-    for environ in specification.get("environment", []):
-        env_str += f"{environ['name']}={environ['value']} "
+    # Base64 alphabet is safe to be used in shell and in Argo parameters without any escaping.
+    return f'printf %s {base64.b64encode(data).decode()} | {decode} > "{path}"'
 
-    if env_str:
-        dockerfile += f"ENV {env_str}\n\n"
+
+def _write_file_string(content: str, path: str, embedding: str = "printf") -> str:
+    """Generate Dockerfile instruction that writes down the file content on the given path."""
+    return f"RUN {_file_command(content, path, embedding)}\n\n"
+
+
+def _write_file_script(content: str, path: str, embedding: str = "printf") -> str:
+    """Generate Dockerfile instruction that writes down the file content on the given path."""
+    return f"RUN {_file_command(content, path, embedding, script=True)}\n\n"
+
+
+def _run_commands(commands: List[str]) -> str:
+    """Generate Dockerfile instruction running all the given commands in one layer.
+
+    Commands are split into more instructions if they would not fit into one
+    argument of the shell, a command exceeding the limit on its own is run by a
+    dedicated instruction.
+    """
+    dockerfile = ""
+    merged: List[str] = []
+    merged_size = 0
+    for command in commands:
+        # The limit applies to bytes, content of files written can be any text.
+        command_size = len(command.encode())
+        if merged and merged_size + len(" && ") + command_size > _RUN_COMMAND_MAX_SIZE:
+            dockerfile += "RUN " + " && ".join(merged) + "\n\n"
+            merged, merged_size = [], 0
+
+        merged_size += command_size + (len(" && ") if merged else 0)
+        merged.append(command)
+
+    if merged:
+        dockerfile += "RUN " + " && ".join(merged) + "\n\n"
+
+    return dockerfile
+
+
+def _get_python_requirements(specification: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Get content of Pipfile and Pipfile.lock to be installed, None if no Python requirements are stated."""
+    if "python" not in specification:
+        return None
+
+    requirements = specification["python"]["requirements"]
+    requirements_locked = specification["python"]["requirements_locked"]
+
+    if not any([requirements, requirements_locked]):
+        _LOGGER.debug("No requirements specified.")
+        return None
+
+    if not all([requirements, requirements_locked]):
+        raise ValueError("Both `requirements` and `requirements_locked` must be provided.")
+
+    if specification.get("file_embedding", "printf") == "printf":
+        return toml.dumps(requirements), json.dumps(requirements_locked, sort_keys=True, indent=4)
+
+    # Whitespace does not matter to installers, keep the embedded lock file compact.
+    return toml.dumps(requirements), json.dumps(requirements_locked, sort_keys=True, separators=(",", ":"))
+
+
+def _python_install_string(specification: Dict[str, Any]) -> str:
+    """Generate Dockerfile instruction installing Python requirements written to /home/amun."""
+    if specification.get("package_manager", "micropipenv") == "micropipenv":
+        install = "RUN cd /home/amun && " "python3 -m venv venv/ && " ". venv/bin/activate && "
+
+        if specification.get("upgrade_pip"):
+            install += "pip install --upgrade pip && "
+
+        return install + "micropipenv install --deploy\n\n"
+    elif specification.get("package_manager") == "pipenv":
+        return "RUN cd /home/amun && pipenv install --deploy\n\n"
+
+    raise ValueError(f"Unknown package manager to be used {specification.get('package_manager')!r}")
+
+
+def _system_packages_string(specification: Dict[str, Any]) -> str:
+    """Generate Dockerfile instructions updating the system and installing native and Python packages."""
+    dockerfile = ""
 
     # Updating the base has to be turned on explicitly.
     if specification.get("update", False):
@@ -116,56 +249,177 @@ def create_dockerfile(specification: Dict[str, Any]) -> Tuple[str, bool]:
             "RUN pip3 install --force-reinstall --upgrade " + " ".join(specification["python_packages"]) + "\n\n"
         )
 
+    return dockerfile
+
+
+def _environment_string(specification: Dict[str, Any]) -> str:
+    """Generate Dockerfile instruction setting environment variables."""
+    env_str = ""
+    for environ in specification.get("environment", []):
+        env_str += f"{environ['name']}={environ['value']} "
+
+    for option, value in sorted(specification.get("inspection", {}).items()):
+        # Flags are passed as 0 or 1.
+        env_str += f"{_INSPECTION_OPTIONS[option]}={int(value) if isinstance(value, bool) else value} "
+
+    if env_str:
+        return f"ENV {env_str}\n\n"
+
+    return ""
+
+
+@functools.lru_cache(maxsize=1)
+def _read_entrypoint() -> str:
+    """Read the inspection entrypoint shipped with Amun, it does not change during the process lifetime."""
+    with open(_ENTRYPOINT_PY, "r") as entrypoint_file:
+        return entrypoint_file.read()
+
+
+def _compute_dockerfile_key(specification: Dict[str, Any], script: Optional[str]) -> str:
+    """Compute a canonical hash of the parts of specification the Dockerfile is rendered from."""
+    build_specification = {key: specification[key] for key in _DOCKERFILE_KEYS if key in specification}
+    build_specification["script"] = script
+    return hashlib.sha256(json.dumps(build_specification, sort_keys=True).encode()).hexdigest()
+
+
+def may_contain_quotes(specification: Dict[str, Any]) -> bool:
+    """Check whether a Dockerfile rendered from the specification can contain single quotes.
+
+    Files embedded in base64 cannot contain quotes, so that only values rendered
+    verbatim need to be checked instead of the whole Dockerfile.
+    """
+    # Installation of packages detects the package manager using quoted commands.
+    if specification.get("file_embedding", "printf") == "printf" or specification.get("packages"):
+        return True
+
+    verbatim = {key: specification.get(key) for key in _VERBATIM_KEYS}
+    verbatim["files"] = [file_spec["path"] for file_spec in specification.get("files", [])]
+    return "'" in json.dumps(verbatim)
+
+
+def create_dockerfile(specification: Dict[str, Any]) -> Tuple[str, bool]:
+    """Create a Dockerfile based on software stack specification.
+
+    Rendered Dockerfiles are cached based on the build relevant parts of the
+    specification, with the script resolved if it was given by an URL.
+    """
+    script = _obtain_script(specification["script"]) if "script" in specification else None
+    script_present = script is not None
+
+    key = _compute_dockerfile_key(specification, script)
+    dockerfile = _DOCKERFILE_CACHE.get(key)
+    if dockerfile is not None:
+        _DOCKERFILE_CACHE_HITS.inc()
+        return dockerfile, script_present
+
+    _DOCKERFILE_CACHE_MISSES.inc()
+    dockerfile = _render_dockerfile(specification, script)
+    _DOCKERFILE_CACHE.put(key, dockerfile)
+    return dockerfile, script_present
+
+
+def _render_dockerfile(specification: Dict[str, Any], script: Optional[str]) -> str:
+    """Render a Dockerfile based on software stack specification and the script to be run."""
+    embedding = specification.get("file_embedding", "printf")
+    if specification.get("optimize_layers", False):
+        return _render_dockerfile_optimized(specification, script)
+
+    dockerfile: str = "FROM " + specification["base"] + "\n\n"
+
+    dockerfile += "USER root\n\n"
+
+    dockerfile += _environment_string(specification)
+    dockerfile += _system_packages_string(specification)
+
     for file_spec in specification.get("files", []):
         path = file_spec["path"]
         content = file_spec["content"]
         # This trick helps so that env variables are not expanded.
-        dockerfile += _write_file_string(content, path)
+        dockerfile += _write_file_string(content, path, embedding)
 
     # Create workdir only if needed.
-    if "python" in specification or "script" in specification:
+    if "python" in specification or script is not None:
         dockerfile += "RUN mkdir -p /home/amun && chmod -R 777 /home/amun\n\n"
 
-    if "python" in specification:
-        requirements = specification["python"]["requirements"]
-        requirements_locked = specification["python"]["requirements_locked"]
+    python_requirements = _get_python_requirements(specification)
+    if python_requirements is not None:
+        pipfile_content, pipfile_lock_content = python_requirements
+        dockerfile += _write_file_script(pipfile_content, "/home/amun/Pipfile", embedding)
+        dockerfile += _write_file_script(pipfile_lock_content, "/home/amun/Pipfile.lock", embedding)
+        dockerfile += _write_file_string(_PIP_CONF, "/etc/pip.conf", embedding)
+        dockerfile += _python_install_string(specification)
 
-        if not any([requirements, requirements_locked]):
-            _LOGGER.debug("No requirements specified.")
-        elif not all([requirements, requirements_locked]):
-            raise ValueError("Both `requirements` and `requirements_locked` must be provided.")
-        else:
-            pipfile_content = toml.dumps(requirements)
-            dockerfile += _write_file_script(pipfile_content, "/home/amun/Pipfile")
+    if script is not None:
+        dockerfile += _write_file_script(script, "/home/amun/script", embedding)
+        dockerfile += _write_file_string(_read_entrypoint(), "/home/amun/entrypoint", embedding)
 
-            pipfile_lock_content = json.dumps(requirements_locked, sort_keys=True, indent=4)
-            dockerfile += _write_file_script(pipfile_lock_content, "/home/amun/Pipfile.lock")
+        dockerfile += (
+            "RUN chmod a+x /home/amun/script /home/amun/entrypoint && "
+            "touch /home/amun/script.stderr /home/amun/script.stdout && "
+            "chmod 777 /home/amun/script.stderr /home/amun/script.stdout\n\n"
+        )
+        dockerfile += 'CMD ["/home/amun/entrypoint"]\n\n'
 
-            dockerfile += _write_file_string(_PIP_CONF, "/etc/pip.conf")
+    # An arbitrary user.
+    dockerfile += "USER 1042\n\n"
+    dockerfile += "WORKDIR /home/amun"
 
-            if specification.get("package_manager", "micropipenv") == "micropipenv":
-                dockerfile += "RUN cd /home/amun && " "python3 -m venv venv/ && " ". venv/bin/activate && "
+    return dockerfile
 
-                if specification.get("upgrade_pip"):
-                    dockerfile += "pip install --upgrade pip && "
 
-                dockerfile += "micropipenv install --deploy\n\n"
-            elif specification.get("package_manager") == "pipenv":
-                dockerfile += "RUN cd /home/amun && pipenv install --deploy\n\n"
-            else:
-                raise ValueError(f"Unknown package manager to be used {specification.get('package_manager')!r}")
+def _render_environment(specification: Dict[str, Any], workdir: bool) -> str:
+    """Render Dockerfile instructions installing dependencies, ordered from the least to the most volatile ones."""
+    embedding = specification.get("file_embedding", "printf")
+    dockerfile: str = "FROM " + specification["base"] + "\n\n"
 
-    if "script" in specification:
-        script_present = True
-        content = _obtain_script(specification["script"])
-        dockerfile += _write_file_script(content, "/home/amun/script")
-        with open(_ENTRYPOINT_PY, "r") as entrypoint_file:
-            dockerfile += _write_file_string(entrypoint_file.read(), "/home/amun/entrypoint")
+    dockerfile += "USER root\n\n"
 
-        dockerfile += (
-            "RUN chmod a+x /home/amun/script /home/amun/entrypoint && "
-            "touch /home/amun/script.stderr /home/amun/script.stdout && "
-            "chmod 777 /home/amun/script.stderr /home/amun/script.stdout\n\n"
+    dockerfile += _system_packages_string(specification)
+
+    # This trick helps so that env variables are not expanded.
+    commands = [
+        _file_command(file_spec["content"], file_spec["path"], embedding)
+        for file_spec in specification.get("files", [])
+    ]
+
+    if "python" in specification or workdir:
+        commands.append("mkdir -p /home/amun && chmod -R 777 /home/amun")
+
+    python_requirements = _get_python_requirements(specification)
+    if python_requirements is not None:
+        pipfile_content, pipfile_lock_content = python_requirements
+        commands.append(_file_command(pipfile_content, "/home/amun/Pipfile", embedding, script=True))
+        commands.append(_file_command(pipfile_lock_content, "/home/amun/Pipfile.lock", embedding, script=True))
+        commands.append(_file_command(_PIP_CONF, "/etc/pip.conf", embedding))
+
+    dockerfile += _run_commands(commands)
+
+    if python_requirements is not None:
+        dockerfile += _python_install_string(specification)
+
+    return dockerfile
+
+
+def _render_script(specification: Dict[str, Any], script: Optional[str]) -> str:
+    """Render Dockerfile instructions placing the script to be run on top of installed dependencies."""
+    embedding = specification.get("file_embedding", "printf")
+    dockerfile = ""
+    if script is not None:
+        # The entrypoint changes only with Amun version.
+        dockerfile += _run_commands(
+            [_file_command(_read_entrypoint(), "/home/amun/entrypoint", embedding), "chmod a+x /home/amun/entrypoint"]
+        )
+
+    dockerfile += _environment_string(specification)
+
+    if script is not None:
+        dockerfile += _run_commands(
+            [
+                _file_command(script, "/home/amun/script", embedding, script=True),
+                "chmod a+x /home/amun/script",
+                "touch /home/amun/script.stderr /home/amun/script.stdout",
+                "chmod 777 /home/amun/script.stderr /home/amun/script.stdout",
+            ]
         )
         dockerfile += 'CMD ["/home/amun/entrypoint"]\n\n'
 
@@ -173,4 +427,41 @@ def create_dockerfile(specification: Dict[str, Any]) -> Tuple[str, bool]:
     dockerfile += "USER 1042\n\n"
     dockerfile += "WORKDIR /home/amun"
 
-    return dockerfile, script_present
+    return dockerfile
+
+
+def _render_dockerfile_optimized(specification: Dict[str, Any], script: Optional[str]) -> str:
+    """Render a Dockerfile with instructions ordered from the least to the most volatile ones.
+
+    Files are written in one layer and environment variables are set only after
+    dependencies are installed, so that specifications differing only in script
+    or environment share all the layers with dependencies in the build cache.
+    """
+    return _render_environment(specification, workdir=script is not None) + _render_script(specification, script)
+
+
+def environment_fingerprint(specification: Dict[str, Any]) -> str:
+    """Compute a canonical fingerprint of dependencies installed for the given specification."""
+    environment = {key: specification[key] for key in _ENVIRONMENT_KEYS if key in specification}
+    return hashlib.sha256(json.dumps(environment, sort_keys=True).encode()).hexdigest()
+
+
+def create_environment_dockerfile(specification: Dict[str, Any]) -> str:
+    """Create a Dockerfile of an environment image with dependencies installed, shared by scripts run on top of it."""
+    key = f"environment-{environment_fingerprint(specification)}"
+    dockerfile = _DOCKERFILE_CACHE.get(key)
+    if dockerfile is not None:
+        _DOCKERFILE_CACHE_HITS.inc()
+        return dockerfile
+
+    _DOCKERFILE_CACHE_MISSES.inc()
+    dockerfile = _render_environment(specification, workdir=True)
+    _DOCKERFILE_CACHE.put(key, dockerfile)
+    return dockerfile
+
+
+def create_script_dockerfile(specification: Dict[str, Any], environment_image: str) -> Tuple[str, bool]:
+    """Create a Dockerfile adding the script to be run on top of an environment image."""
+    script = _obtain_script(specification["script"]) if "script" in specification else None
+    dockerfile = f"FROM {environment_image}\n\nUSER root\n\n" + _render_script(specification, script)
+    return dockerfile, script is not None
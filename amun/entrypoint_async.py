@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Amun API served asynchronously by aiohttp.
+
+The application is run by gunicorn using aiohttp.GunicornWebWorker worker
+class, operations are handled by asynchronous handlers in amun.api_v1_async.
+Responses are adjusted the same way as in the Flask application in
+amun.entrypoint - CORS headers, JSON 404 and 500 pages and per-endpoint
+metrics reported under the same names.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+import connexion
+from aiohttp import web
+from connexion.resolver import Resolver
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from prometheus_client import generate_latest
+from thoth.common import datetime2datetime_str
+from thoth.common import init_logging
+from thoth.common import __version__ as __common__version__
+from thoth.storages import __version__ as __storages__version__
+from werkzeug.exceptions import NotFound
+
+from . import __version__ as __amun_version__
+from . import api_v1_async
+from .configuration import Configuration
+
+# Configure global application logging using Thoth's init_logging.
+init_logging(logging_env_var_start="AMUN_LOG_")
+
+_LOGGER = logging.getLogger("amun")
+_LOGGER.setLevel(logging.DEBUG if bool(int(os.getenv("AMUN_DEBUG", 0))) else logging.INFO)
+
+# Stated the same way as in amun.entrypoint which is not imported as it creates the Flask application.
+__service_version__ = f"{__amun_version__}+storage.{__storages__version__}.common.{__common__version__}"
+
+_LOGGER.info(f"This is Amun API v{__service_version__}")
+
+_Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+# Paths not tracked in metrics, the same as in the Flask application.
+_UNTRACKED_PATHS = frozenset(("/", "/api/v1", "/readiness", "/liveness", "/metrics"))
+# Methods allowed in preflight requests, the same as reported by flask_cors by default.
+_CORS_ALLOW_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+# Metrics named the same as the ones reported by prometheus_flask_exporter so that dashboards work in both modes.
+_HTTP_REQUEST_DURATION = Histogram(
+    "flask_http_request_duration_seconds", "Flask HTTP request duration in seconds", ("method", "path", "status")
+)
+_HTTP_REQUEST_TOTAL = Counter("flask_http_request_total", "Total number of HTTP requests", ("method", "status"))
+_HTTP_REQUEST_EXCEPTIONS_TOTAL = Counter(
+    "flask_http_request_exceptions_total",
+    "Total number of HTTP requests which resulted in an exception",
+    ("method", "status"),
+)
+_AMUN_API_INFO = Gauge("amun_api_info", "Amun API info", ("version",))
+
+
+@web.middleware
+async def _metrics_middleware(request: web.Request, handler: _Handler) -> web.StreamResponse:
+    """Observe duration and status of each request."""
+    if request.path in _UNTRACKED_PATHS:
+        return await handler(request)
+
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        _HTTP_REQUEST_DURATION.labels(request.method, request.path, status).observe(time.perf_counter() - start)
+        _HTTP_REQUEST_TOTAL.labels(request.method, status).inc()
+
+
+@web.middleware
+async def _cors_middleware(request: web.Request, handler: _Handler) -> web.StreamResponse:
+    """Add Cross Origin Request Policy to all responses, answer preflight requests."""
+    if request.method == "OPTIONS" and "Access-Control-Request-Method" in request.headers:
+        response: web.StreamResponse = web.Response()
+        response.headers["Access-Control-Allow-Methods"] = _CORS_ALLOW_METHODS
+        if "Access-Control-Request-Headers" in request.headers:
+            response.headers["Access-Control-Allow-Headers"] = request.headers["Access-Control-Request-Headers"]
+    else:
+        try:
+            response = await handler(request)
+        except web.HTTPException as exc:
+            exc.headers["Access-Control-Allow-Origin"] = "*"
+            raise
+
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+@web.middleware
+async def _error_middleware(request: web.Request, handler: _Handler) -> web.StreamResponse:
+    """Adjust 404 and 500 pages to be consistent with errors reported back from API."""
+    try:
+        return await handler(request)
+    except web.HTTPNotFound:
+        return web.json_response({"error": str(NotFound())}, status=404)
+    except web.HTTPException:
+        raise
+    except Exception as exc:
+        _LOGGER.exception("Error handling request %s %s", request.method, request.path)
+        if request.path not in _UNTRACKED_PATHS:
+            _HTTP_REQUEST_EXCEPTIONS_TOTAL.labels(request.method, 500).inc()
+
+        # Provide some additional information so we can easily find exceptions in logs (time and exception type).
+        return web.json_response(
+            {
+                "error": "Internal server error occurred, please contact administrator with provided details.",
+                "details": {"type": exc.__class__.__name__, "datetime": datetime2datetime_str(datetime.utcnow())},
+            },
+            status=500,
+        )
+
+
+def _resolve_async_handler(function_name: str) -> Any:
+    """Resolve handler of an operation stated in the OpenAPI specification to its asynchronous variant."""
+    return getattr(api_v1_async, function_name.rsplit(".", maxsplit=1)[-1])
+
+
+def create_application(service_version: str) -> web.Application:
+    """Create aiohttp application serving Amun API."""
+    app = connexion.AioHttpApp(__name__)
+    application: web.Application = app.app
+    application.middlewares.extend((_metrics_middleware, _cors_middleware, _error_middleware))
+
+    async def base_url(request: web.Request) -> web.Response:
+        """Redirect to UI by default."""
+        raise web.HTTPFound("/api/v1/ui/")
+
+    async def api_v1(request: web.Request) -> web.Response:
+        """Provide a listing of all available endpoints."""
+        paths = [resource.canonical for resource in api.subapp.router.resources()]
+        return web.json_response({"paths": paths})
+
+    async def healthiness(request: web.Request) -> web.Response:
+        """Report readiness and liveness for OpenShift probes."""
+        return web.json_response({"status": "ready", "version": service_version})
+
+    async def prometheus_metrics(request: web.Request) -> web.Response:
+        """Expose metrics for Prometheus."""
+        response = web.Response(body=generate_latest())
+        response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+        return response
+
+    async def apply_headers(request: web.Request, response: web.StreamResponse) -> None:
+        """Add headers to each response."""
+        response.headers["X-Amun-Version"] = service_version
+
+    # Registered before the API so that the listing is not shadowed by the API sub-application.
+    application.router.add_get("/", base_url)
+    application.router.add_get("/api/v1", api_v1)
+    application.router.add_get("/readiness", healthiness)
+    application.router.add_get("/liveness", healthiness)
+    application.router.add_get("/metrics", prometheus_metrics)
+    application.on_response_prepare.append(apply_headers)
+
+    api = app.add_api(
+        Configuration.SWAGGER_YAML_PATH,
+        resolver=Resolver(_resolve_async_handler),
+        pass_context_arg_name="request",
+        # Handle errors before connexion turns them into problem responses, as done by the Flask application.
+        options={"middlewares": [_error_middleware]},
+    )
+
+    # static information as metric
+    _AMUN_API_INFO.labels(service_version).set(1)
+
+    _LOGGER.info("Serving Amun API asynchronously")
+    return application
+
+
+# Expose for gunicorn.
+application = create_application(__service_version__)
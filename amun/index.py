@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A local index of inspections stored on Ceph, backed by SQLite.
+
+The index is filled from inspection specifications, updated on each submitted
+inspection and refreshed periodically by a delta scan of the object store. It
+is shared by all the workers on the same node as SQLite handles locking.
+
+A delta scan lists ids of all the inspections stored, which is cheap as only
+"directories" are listed, and retrieves specifications of the ones not indexed
+yet. It also probes results of inspections still pending. Inspections not
+completed long after their creation are marked as stale and are not probed
+anymore.
+"""
+
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from thoth.common import datetime2datetime_str
+from thoth.storages.exceptions import NotFoundError as StorageNotFoundError
+
+from .storage import get_inspection_store
+from .storage import list_inspections
+
+_LOGGER = logging.getLogger(__name__)
+
+# Path to the SQLite database, the index is turned off if not set.
+_INDEX_PATH = os.getenv("THOTH_AMUN_INSPECTION_INDEX_PATH")
+# Seconds between delta scans of the object store.
+_INDEX_REFRESH_INTERVAL = int(os.getenv("THOTH_AMUN_INSPECTION_INDEX_REFRESH_INTERVAL", 300))
+# Seconds after creation an inspection not completed is considered stale, e.g. failed, and is not probed anymore.
+_INDEX_STALE_AFTER = int(os.getenv("THOTH_AMUN_INSPECTION_INDEX_STALE_AFTER", 7 * 24 * 3600))
+_INDEX_LIST_LIMIT = 1000
+
+STATUS_SUBMITTED = "submitted"
+STATUS_COMPLETED = "completed"
+STATUS_STALE = "stale"
+
+SORT_COLUMNS = ("created", "inspection_id", "batch_size", "base")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspection (
+    inspection_id TEXT PRIMARY KEY,
+    base TEXT,
+    identifier TEXT,
+    created TEXT,
+    batch_size INTEGER,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inspection_base ON inspection(base);
+CREATE INDEX IF NOT EXISTS inspection_created ON inspection(created);
+CREATE INDEX IF NOT EXISTS inspection_status ON inspection(status);
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO index_meta(key, value) VALUES ('refresh_claimed_at', 0);
+INSERT OR IGNORE INTO index_meta(key, value) VALUES ('refreshed_at', 0);
+"""
+
+
+class InspectionIndex:
+    """Index of inspections answering filtered and sorted listing queries."""
+
+    def __init__(self, path: str, refresh_interval: int = _INDEX_REFRESH_INTERVAL) -> None:
+        """Initialize index stored at the given path, create the database if needed."""
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection to the database, commit on success."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_from_specification(
+        inspection_id: str, specification: Dict[str, Any], status: str
+    ) -> Tuple[str, Optional[str], Optional[str], Optional[str], int, str]:
+        """Extract indexed columns out of an inspection specification."""
+        return (
+            inspection_id,
+            specification.get("base"),
+            specification.get("identifier"),
+            specification.get("@created"),
+            int(specification.get("batch_size", 1)),
+            status,
+        )
+
+    def add(self, inspection_id: str, specification: Dict[str, Any], status: str = STATUS_SUBMITTED) -> None:
+        """Add or replace an inspection in the index."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO inspection VALUES (?, ?, ?, ?, ?, ?)",
+                self._row_from_specification(inspection_id, specification, status),
+            )
+
+    def is_populated(self) -> bool:
+        """Check whether the index was filled by a scan of the object store at least once."""
+        with self._connection() as conn:
+            (refreshed_at,) = conn.execute("SELECT value FROM index_meta WHERE key = 'refreshed_at'").fetchone()
+
+        return bool(refreshed_at)
+
+    def query(
+        self,
+        *,
+        limit: int,
+        after: Optional[Tuple[str, Any]] = None,
+        base: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        status: Optional[str] = None,
+        sort_by: str = "inspection_id",
+        sort_order: str = "asc",
+    ) -> List[Tuple[str, Any]]:
+        """Query inspection ids matching the given filters together with values they are sorted by.
+
+        Only inspections sorted after the given inspection id and its value
+        sorted by are reported so that pages are not affected by inspections
+        added or removed in the meantime.
+        """
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Unknown column to sort by {sort_by!r}, available: {', '.join(SORT_COLUMNS)}")
+
+        if sort_order not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort order {sort_order!r}, available: asc, desc")
+
+        conditions = []
+        arguments: List[Any] = []
+        for column, operator, value in (
+            ("base", "=", base),
+            ("created", ">=", created_after),
+            ("created", "<", created_before),
+            ("batch_size", "=", batch_size),
+            ("status", "=", status),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                arguments.append(value)
+
+        if after is not None:
+            after_id, after_value = after
+            operator = ">" if sort_order == "asc" else "<"
+            if sort_by == "inspection_id":
+                conditions.append(f"inspection_id {operator} ?")
+                arguments.append(after_id)
+            elif after_value is None:
+                # NULL values are sorted first in ascending order and last in descending order.
+                condition = f"{sort_by} IS NULL AND inspection_id {operator} ?"
+                if sort_order == "asc":
+                    condition += f" OR {sort_by} IS NOT NULL"
+                conditions.append(f"({condition})")
+                arguments.append(after_id)
+            else:
+                condition = f"{sort_by} {operator} ? OR {sort_by} = ? AND inspection_id {operator} ?"
+                if sort_order == "desc":
+                    condition += f" OR {sort_by} IS NULL"
+                conditions.append(f"({condition})")
+                arguments.extend((after_value, after_value, after_id))
+
+        statement = f"SELECT inspection_id, {sort_by} FROM inspection"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+
+        # Sort by inspection id as a second key so that pagination is stable.
+        statement += f" ORDER BY {sort_by} {sort_order}, inspection_id {sort_order} LIMIT ?"
+        arguments.append(limit)
+
+        with self._connection() as conn:
+            return [(row[0], row[1]) for row in conn.execute(statement, arguments)]
+
+    def _claim_refresh(self) -> bool:
+        """Claim a refresh so that only one worker on the node performs the delta scan."""
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE index_meta SET value = ? WHERE key = 'refresh_claimed_at' AND value < ?",
+                (now, now - self.refresh_interval),
+            )
+            return cursor.rowcount == 1
+
+    def _index_new_inspections(self) -> None:
+        """List inspections stored on Ceph and index the ones not indexed yet, failed ones are retried next time."""
+        continuation_token = None
+        while True:
+            inspection_ids, continuation_token = list_inspections(_INDEX_LIST_LIMIT, continuation_token)
+
+            known = set()
+            if inspection_ids:
+                with self._connection() as conn:
+                    known = {
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT inspection_id FROM inspection WHERE inspection_id BETWEEN ? AND ?",
+                            (min(inspection_ids), max(inspection_ids)),
+                        )
+                    }
+
+            for inspection_id in inspection_ids:
+                if inspection_id not in known:
+                    try:
+                        self.add(inspection_id, get_inspection_store(inspection_id).retrieve_specification())
+                    except StorageNotFoundError:
+                        _LOGGER.debug("Inspection %r has no specification stored yet", inspection_id)
+                    except Exception:
+                        _LOGGER.exception("Failed to index inspection %r", inspection_id)
+
+            if continuation_token is None:
+                break
+
+    def _update_pending_inspections(self) -> None:
+        """Probe results of inspections not completed yet, mark them completed or stale."""
+        stale_before = datetime2datetime_str(datetime.utcnow() - timedelta(seconds=_INDEX_STALE_AFTER))
+        with self._connection() as conn:
+            pending = conn.execute(
+                "SELECT inspection_id, batch_size, created FROM inspection WHERE status = ?", (STATUS_SUBMITTED,)
+            ).fetchall()
+
+        for inspection_id, batch_size, created in pending:
+            try:
+                results_count = get_inspection_store(inspection_id).results.get_results_count()
+            except Exception:
+                _LOGGER.exception("Failed to obtain number of results of inspection %r", inspection_id)
+                continue
+
+            if results_count >= batch_size:
+                status = STATUS_COMPLETED
+            elif created is None or created < stale_before:
+                status = STATUS_STALE
+            else:
+                continue
+
+            with self._connection() as conn:
+                conn.execute("UPDATE inspection SET status = ? WHERE inspection_id = ?", (status, inspection_id))
+
+    def refresh(self) -> None:
+        """Perform a delta scan of the object store - index new inspections and update statuses."""
+        self._index_new_inspections()
+        self._update_pending_inspections()
+
+        with self._connection() as conn:
+            conn.execute("UPDATE index_meta SET value = ? WHERE key = 'refreshed_at'", (time.time(),))
+
+    def _do_refresh(self) -> None:
+        """Refresh the index, log any failure as it is run in a background thread."""
+        try:
+            self.refresh()
+        except Exception:
+            _LOGGER.exception("Failed to refresh inspection index")
+
+    def refresh_if_stale(self) -> None:
+        """Start a delta scan in background if the index was not refreshed recently."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+
+            if not self._claim_refresh():
+                return
+
+            self._refresh_thread = threading.Thread(target=self._do_refresh, name="amun-index-refresh", daemon=True)
+            self._refresh_thread.start()
+
+
+_INDEX: Optional[InspectionIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_inspection_index() -> Optional[InspectionIndex]:
+    """Get the process-wide inspection index, None if turned off."""
+    global _INDEX
+
+    if not _INDEX_PATH:
+        return None
+
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = InspectionIndex(_INDEX_PATH)
+
+    return _INDEX
@@ -23,15 +23,23 @@ results to stdout as a JSON. It also aggregates information from hwinfo
 init-container aggregating hardware information.
 """
 
+import codecs
+import itertools
 import os
-import resource
 import json
+import pstats
+import shutil
+import statistics
 import subprocess
 import hashlib
 import sys
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
 from datetime import datetime
 import platform
-from typing import Any, Dict
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, TextIO, Tuple
 
 # A path to file containing hardware information as gathered by init-container
 # amun-hwinfo.
@@ -43,7 +51,86 @@ _EXEC_STDERR_FILE = os.getenv("THOTH_AMUN_STDERR_PATH", "/home/amun/script.stder
 _EXEC_DIR = os.getenv("THOTH_AMUN_EXEC_DIR", "/home/amun")
 _EXEC_FILE = os.getenv("THOTH_AMUN_EXEC_FILE", os.path.join(_EXEC_DIR, "script"))
 _ETC_OS_RELEASE = "/etc/os-release"
-# Names of items on certain position in return value of resource.getrusage()
+# Number of bytes from the start and from the end of stdout and stderr kept in
+# the report, the rest is omitted. Outputs are kept whole if neither is set.
+_OUTPUT_HEAD_SIZE = int(os.getenv("THOTH_AMUN_OUTPUT_HEAD_SIZE", 0))
+_OUTPUT_TAIL_SIZE = int(os.getenv("THOTH_AMUN_OUTPUT_TAIL_SIZE", 0))
+# Stdout larger than this is reported as a string, it is not parsed as JSON.
+_STDOUT_JSON_MAX_SIZE = int(os.getenv("THOTH_AMUN_STDOUT_JSON_MAX_SIZE", 16 * 1024 * 1024))
+# Outputs are copied to the report in chunks so that memory used does not depend on their size.
+_OUTPUT_CHUNK_SIZE = 64 * 1024
+# Seconds between samples of resources used by the script, resources are not sampled if not set.
+_SAMPLING_INTERVAL = float(os.getenv("THOTH_AMUN_SAMPLING_INTERVAL", 0))
+# Maximum number of samples kept, every other sample is dropped and the interval doubled once reached.
+_SAMPLING_MAX_SAMPLES = int(os.getenv("THOTH_AMUN_SAMPLING_MAX_SAMPLES", 3600))
+_PROC_DIR = "/proc"
+_CGROUP_DIR = "/sys/fs/cgroup"
+# Number of times the script is run and reported, preceded by warmup runs which are not reported.
+_REPETITIONS = int(os.getenv("THOTH_AMUN_REPETITIONS", 1))
+_WARMUP_RUNS = int(os.getenv("THOTH_AMUN_WARMUP_RUNS", 0))
+# Run the script under "perf stat" and report hardware performance counters, if perf is available.
+_PERF_STAT = bool(int(os.getenv("THOTH_AMUN_PERF_STAT", 0)))
+_PERF_EVENTS = os.getenv(
+    "THOTH_AMUN_PERF_EVENTS", "cycles,instructions,cache-references,cache-misses,branches,branch-misses"
+)
+_PERF_OUTPUT_FILE = os.getenv("THOTH_AMUN_PERF_PATH", "/home/amun/script.perf")
+# Profiler the script is run under, "cprofile" or "pyinstrument", the script is not profiled if not set.
+_PROFILER = os.getenv("THOTH_AMUN_PROFILER")
+# Profile of the extra profiled run is written next to the report by default so that it is stored together with it.
+_PROFILE_FILE = os.getenv("THOTH_AMUN_PROFILE_PATH") or os.path.join(
+    os.path.dirname(os.getenv("THOTH_OUTPUT_PATH") or "/home/amun/"), "profile"
+)
+# Number of functions with the most time spent in them reported in the profile summary.
+_PROFILE_TOP = int(os.getenv("THOTH_AMUN_PROFILE_TOP", 20))
+# Programs run by the interpreter of the script to profile it, the exit code of the script is preserved.
+_CPROFILE_RUNNER = """
+import cProfile, os, runpy, sys
+profile_path, sys.argv = sys.argv[1], sys.argv[2:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+profiler = cProfile.Profile()
+try:
+    profiler.runcall(runpy.run_path, sys.argv[0], run_name="__main__")
+finally:
+    profiler.dump_stats(profile_path)
+"""
+_PYINSTRUMENT_RUNNER = """
+import os, runpy, sys
+from pyinstrument import Profiler
+from pyinstrument.renderers import JSONRenderer
+profile_path, sys.argv = sys.argv[1], sys.argv[2:]
+sys.path[0] = os.path.dirname(sys.argv[0])
+profiler = Profiler()
+profiler.start()
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    profiler.stop()
+    with open(profile_path, "w") as profile_file:
+        profile_file.write(profiler.output(JSONRenderer()))
+"""
+# Ratios of counters reported together with the counters, if both counters are available.
+_PERF_RATIOS = {
+    "ipc": ("instructions", "cycles"),
+    "cache_miss_ratio": ("cache_misses", "cache_references"),
+    "branch_miss_ratio": ("branch_misses", "branches"),
+}
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+# Metrics sampled, CPU time is in seconds and memory and I/O in bytes, summed over the script and its subprocesses.
+_TIMELINE_METRICS = (
+    "time",
+    "cpu_time",
+    "rss",
+    "read_bytes",
+    "write_bytes",
+    "voluntary_ctxt_switches",
+    "nonvoluntary_ctxt_switches",
+    "threads",
+    "processes",
+    "cgroup_cpu_time",
+    "cgroup_memory",
+)
+# Names of items on certain position in resources usage as returned by os.wait4()
 #   https://docs.python.org/3.6/library/resource.html#resource.getrusage
 _RESOURCE_STRUCT_RUSAGE_ITEMS = (
     "ru_utime",
@@ -100,6 +187,423 @@ def _gather_runtime_environment(os_release: Dict[str, int], hwinfo: Dict[str, An
     }
 
 
+def _get_omitted_size(size: int) -> int:
+    """Compute number of bytes omitted from the report for an output of the given size."""
+    if not _OUTPUT_HEAD_SIZE and not _OUTPUT_TAIL_SIZE:
+        return 0
+
+    return max(size - _OUTPUT_HEAD_SIZE - _OUTPUT_TAIL_SIZE, 0)
+
+
+def _iter_file_text(file_: BinaryIO, size: int) -> Iterator[str]:
+    """Read the given number of bytes from the current position in a file, decode them in chunks."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while size > 0:
+        data = file_.read(min(size, _OUTPUT_CHUNK_SIZE))
+        if not data:
+            break
+
+        size -= len(data)
+        yield decoder.decode(data)
+
+    yield decoder.decode(b"", final=True)
+
+
+def _iter_output(path: str) -> Iterator[str]:
+    """Read an output of the script in chunks, keep only its head and tail if configured so."""
+    size = os.path.getsize(path)
+    omitted = _get_omitted_size(size)
+    with open(path, "rb") as output_file:
+        if not omitted:
+            yield from _iter_file_text(output_file, size)
+            return
+
+        yield from _iter_file_text(output_file, _OUTPUT_HEAD_SIZE)
+        yield "\n... {} bytes omitted ...\n".format(omitted)
+        output_file.seek(size - _OUTPUT_TAIL_SIZE)
+        yield from _iter_file_text(output_file, _OUTPUT_TAIL_SIZE)
+
+
+def _load_stdout() -> Optional[Any]:
+    """Load stdout of the script if it is a JSON small enough to be parsed, None if it is reported as a string."""
+    size = os.path.getsize(_EXEC_STDOUT_FILE)
+    if size == 0:
+        return {}
+
+    if size > _STDOUT_JSON_MAX_SIZE or _get_omitted_size(size):
+        return None
+
+    with open(_EXEC_STDOUT_FILE, "r") as stdout_file:
+        try:
+            return json.load(stdout_file)
+        except ValueError:
+            return None
+
+
+def _write_report(output_file: TextIO, report: Dict[str, Any], streamed: Dict[str, Iterator[str]]) -> None:
+    """Write report as json.dump(report, sort_keys=True, indent=2) would, streamed values are written in chunks."""
+    output_file.write("{")
+    for idx, key in enumerate(sorted(itertools.chain(report, streamed))):
+        output_file.write(",\n  " if idx else "\n  ")
+        output_file.write(json.dumps(key) + ": ")
+        if key in streamed:
+            output_file.write('"')
+            for chunk in streamed[key]:
+                # Escape the chunk as a JSON string, without the enclosing quotes.
+                output_file.write(json.dumps(chunk)[1:-1])
+            output_file.write('"')
+        else:
+            # Nested lines are indented by one more level.
+            output_file.write(json.dumps(report[key], sort_keys=True, indent=2).replace("\n", "\n  "))
+
+    output_file.write("\n}")
+
+
+def _read_proc_file(pid: int, name: str) -> Optional[str]:
+    """Read a file describing a process in procfs, None if the process is gone."""
+    try:
+        with open(os.path.join(_PROC_DIR, str(pid), name), "r") as proc_file:
+            return proc_file.read()
+    except OSError:
+        return None
+
+
+def _parse_fields(content: str) -> Dict[str, int]:
+    """Parse lines with a name and a numeric value, as in procfs status or cgroup cpu.stat, other lines are skipped."""
+    result = {}
+    for line in content.splitlines():
+        name, _, value = line.replace(":", " ").partition(" ")
+        if value.strip().isdigit():
+            result[name] = int(value)
+
+    return result
+
+
+def _list_process_tree(root_pid: int) -> Dict[int, List[str]]:
+    """List stat of a process and all its descendants, fields are indexed from the process state (third field)."""
+    stats = {}
+    children: Dict[int, List[int]] = defaultdict(list)
+    for entry in os.listdir(_PROC_DIR):
+        if not entry.isdigit():
+            continue
+
+        content = _read_proc_file(int(entry), "stat")
+        if content is None:
+            continue
+
+        # Process name is in parentheses and can contain spaces.
+        stat = content[content.rindex(")") + 2 :].split()
+        stats[int(entry)] = stat
+        children[int(stat[1])].append(int(entry))
+
+    tree = {}
+    to_visit = [root_pid]
+    while to_visit:
+        pid = to_visit.pop()
+        if pid in stats:
+            tree[pid] = stats[pid]
+            to_visit.extend(children[pid])
+
+    return tree
+
+
+def _read_cgroup_file(path: str) -> Optional[str]:
+    """Read a file of the cgroup the container runs in, None if not available."""
+    try:
+        with open(os.path.join(_CGROUP_DIR, path), "r") as cgroup_file:
+            return cgroup_file.read()
+    except OSError:
+        return None
+
+
+def _read_cgroup_value(path: str) -> Optional[int]:
+    """Read a file of the cgroup holding a single number, None if not available."""
+    content = _read_cgroup_file(path)
+    if content is None or not content.strip().isdigit():
+        return None
+
+    return int(content)
+
+
+def _sample_cgroup() -> Tuple[Optional[float], Optional[int]]:
+    """Sample CPU time in seconds and memory in bytes used by the whole container, cgroup v2 and v1 are supported."""
+    cpu_stat = _read_cgroup_file("cpu.stat")
+    if cpu_stat is not None:
+        cpu_usage = _parse_fields(cpu_stat).get("usage_usec")
+        cpu_time = cpu_usage / 1e6 if cpu_usage is not None else None
+        return cpu_time, _read_cgroup_value("memory.current")
+
+    cpu_usage = _read_cgroup_value("cpuacct/cpuacct.usage")
+    cpu_time = cpu_usage / 1e9 if cpu_usage is not None else None
+    return cpu_time, _read_cgroup_value("memory/memory.usage_in_bytes")
+
+
+def _sample_resources(root_pid: int) -> Dict[str, Any]:
+    """Sample resources used by all the descendants of a process, including the ones which already finished."""
+    sample: Dict[str, Any] = dict.fromkeys(_TIMELINE_METRICS, 0)
+
+    for pid, stat in _list_process_tree(root_pid).items():
+        if pid == root_pid:
+            # Only CPU time of children which already finished, not of the process itself.
+            sample["cpu_time"] += sum(int(value) for value in stat[13:15]) / _CLOCK_TICKS
+            continue
+
+        # CPU time of the process and its children which already finished.
+        sample["cpu_time"] += sum(int(value) for value in stat[11:15]) / _CLOCK_TICKS
+        sample["threads"] += int(stat[17])
+        sample["rss"] += int(stat[21]) * _PAGE_SIZE
+        sample["processes"] += 1
+
+        for name in ("io", "status"):
+            fields = _parse_fields(_read_proc_file(pid, name) or "")
+            for metric in ("read_bytes", "write_bytes", "voluntary_ctxt_switches", "nonvoluntary_ctxt_switches"):
+                sample[metric] += fields.get(metric, 0)
+
+    sample["cpu_time"] = round(sample["cpu_time"], 3)
+    cgroup_cpu_time, sample["cgroup_memory"] = _sample_cgroup()
+    sample["cgroup_cpu_time"] = round(cgroup_cpu_time, 3) if cgroup_cpu_time is not None else None
+    return sample
+
+
+class _ResourceSampler(threading.Thread):
+    """Sample resources used by the script periodically, samples are kept as a time series of each metric."""
+
+    def __init__(self, pid: int, interval: float) -> None:
+        """Initialize sampler of descendants of the given process."""
+        super().__init__(daemon=True)
+        self._pid = pid
+        self._interval = interval
+        self._finished = threading.Event()
+        self._start_time = time.monotonic()
+        self._timeline: Dict[str, List[Any]] = {metric: [] for metric in _TIMELINE_METRICS}
+
+    def run(self) -> None:
+        """Sample resources until stopped."""
+        while not self._finished.wait(self._interval):
+            sample = _sample_resources(self._pid)
+            sample["time"] = round(time.monotonic() - self._start_time, 3)
+            for metric, value in sample.items():
+                self._timeline[metric].append(value)
+
+            if len(self._timeline["time"]) >= _SAMPLING_MAX_SAMPLES:
+                # Keep the timeline compact for long runs.
+                for values in self._timeline.values():
+                    del values[1::2]
+                self._interval *= 2
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling, return the timeline sampled."""
+        self._finished.set()
+        self.join()
+
+        timeline: Dict[str, Any] = {"interval": self._interval}
+        timeline.update(self._timeline)
+        return timeline
+
+
+def _get_usage(usage_info: Any) -> Dict[str, Any]:
+    """Convert resources usage as returned by os.wait4() to a dictionary."""
+    usage = {}
+    for idx in range(len(_RESOURCE_STRUCT_RUSAGE_ITEMS)):
+        usage[_RESOURCE_STRUCT_RUSAGE_ITEMS[idx]] = usage_info[idx]
+
+    return usage
+
+
+def _iter_numeric_fields(obj: Any, path: str) -> Iterator[Tuple[str, float]]:
+    """Iterate over numeric values of a possibly nested dictionary, keys of nested values are joined by a dot."""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from _iter_numeric_fields(value, "{}.{}".format(path, key) if path else key)
+    # Booleans are integers in Python, they are flags and not metrics though.
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield path, obj
+
+
+def _get_perf_command() -> Tuple[Optional[List[str]], Optional[str]]:
+    """Get command prefix counting hardware events of a command by perf, or an error stating why it cannot be used."""
+    perf = shutil.which("perf")
+    if perf is None:
+        return None, "perf not found"
+
+    command = [perf, "stat", "--field-separator", ",", "--event", _PERF_EVENTS, "--output", _PERF_OUTPUT_FILE, "--"]
+
+    # Counters can be unavailable in containers, perf does not run the command then.
+    try:
+        probe = subprocess.run(
+            command + ["true"], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError) as exc:
+        return None, str(exc)
+
+    if probe.returncode != 0:
+        return None, probe.stderr.strip() or "perf exited with {}".format(probe.returncode)
+
+    return command, None
+
+
+def _parse_perf_stat() -> Optional[Dict[str, Any]]:
+    """Parse counters written by perf stat as CSV, None if perf did not write any.
+
+    Counters not supported or not counted are reported as None.
+    """
+    try:
+        with open(_PERF_OUTPUT_FILE, "r") as perf_file:
+            lines = perf_file.read().splitlines()
+    except OSError:
+        return None
+
+    counters: Dict[str, Any] = {}
+    for line in lines:
+        fields = line.split(",")
+        if line.startswith("#") or len(fields) < 3:
+            continue
+
+        # Events can be stated with modifiers, such as "cycles:u".
+        name = fields[2].split(":")[0].replace("-", "_")
+        try:
+            counters[name] = int(fields[0])
+        except ValueError:
+            try:
+                counters[name] = float(fields[0])
+            except ValueError:
+                counters[name] = None
+
+    for name, (numerator, denominator) in _PERF_RATIOS.items():
+        if counters.get(numerator) is not None and counters.get(denominator):
+            counters[name] = round(counters[numerator] / counters[denominator], 4)
+
+    return counters
+
+
+def _get_profiler_command(python: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """Get command running the script under the requested profiler, cProfile is used if pyinstrument is missing."""
+    profile: Dict[str, Any] = {"profiler": "cprofile", "error": None, "top": None}
+    if _PROFILER == "pyinstrument":
+        probe = subprocess.run(python + ["-c", "import pyinstrument"], stderr=subprocess.DEVNULL)
+        if probe.returncode == 0:
+            profile["profiler"] = "pyinstrument"
+            return python + ["-c", _PYINSTRUMENT_RUNNER, _PROFILE_FILE, _EXEC_FILE], profile
+
+        profile["error"] = "pyinstrument is not installed, cProfile used instead"
+
+    return python + ["-c", _CPROFILE_RUNNER, _PROFILE_FILE, _EXEC_FILE], profile
+
+
+def _summarize_cprofile() -> List[Dict[str, Any]]:
+    """Summarize functions of a profile written by cProfile."""
+    stats = pstats.Stats(_PROFILE_FILE).stats  # type: ignore
+    functions = []
+    for (file_path, line, function), (_, calls, self_time, cumulative_time, _) in stats.items():
+        functions.append(
+            {
+                "function": function,
+                "file": file_path,
+                "line": line,
+                "calls": calls,
+                "self_time": self_time,
+                "cumulative_time": cumulative_time,
+            }
+        )
+
+    return functions
+
+
+def _summarize_pyinstrument() -> List[Dict[str, Any]]:
+    """Summarize functions of a profile written by pyinstrument, calls are not known for sampled profiles."""
+    with open(_PROFILE_FILE, "r") as profile_file:
+        root_frame = json.load(profile_file).get("root_frame")
+
+    functions: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    # Frames of a function already on the stack are not counted again in its cumulative time.
+    active: Dict[Tuple[Any, ...], int] = Counter()
+    to_visit = [(root_frame, False)] if root_frame else []
+    while to_visit:
+        frame, leaving = to_visit.pop()
+        key = (frame.get("function"), frame.get("file_path"), frame.get("line_no"))
+        if leaving:
+            active[key] -= 1
+            continue
+
+        entry = functions.setdefault(
+            key,
+            {
+                "function": key[0],
+                "file": key[1],
+                "line": key[2],
+                "calls": None,
+                "self_time": 0.0,
+                "cumulative_time": 0.0,
+            },
+        )
+        # Synthetic frames, such as "[self]" or "[await]", account for time spent in the function itself.
+        children = [child for child in frame.get("children") or [] if not child["function"].startswith("[")]
+        entry["self_time"] += frame["time"] - sum(child["time"] for child in children)
+        if not active[key]:
+            entry["cumulative_time"] += frame["time"]
+
+        active[key] += 1
+        to_visit.append((frame, True))
+        to_visit.extend((child, False) for child in children)
+
+    return list(functions.values())
+
+
+def _summarize_profile(profile: Dict[str, Any]) -> None:
+    """Report functions the most time was spent in, as profiled in the extra profiled run."""
+    try:
+        functions = _summarize_pyinstrument() if profile["profiler"] == "pyinstrument" else _summarize_cprofile()
+    except Exception as exc:
+        profile["error"] = "Failed to load profile: {}".format(exc)
+        return
+
+    functions.sort(key=lambda function: function["self_time"], reverse=True)
+    profile["top"] = functions[:_PROFILE_TOP]
+
+
+def _run_script(
+    args: List[str], stdout_path: str = _EXEC_STDOUT_FILE, stderr_path: str = _EXEC_STDERR_FILE
+) -> Dict[str, Any]:
+    """Run the script once, report its exit code, time it ran in seconds and resources it used."""
+    with open(stdout_path, "w") as stdout_file, open(stderr_path, "w") as stderr_file:
+        start = time.monotonic()
+        process = subprocess.Popen(args, stdout=stdout_file, stderr=stderr_file, universal_newlines=True)
+
+    # Unlike getrusage(RUSAGE_CHILDREN), resources used by this run only are reported.
+    _, status, usage_info = os.wait4(process.pid, 0)
+    wall_time = time.monotonic() - start
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    return {"exit_code": process.returncode, "wall_time": wall_time, "usage": _get_usage(usage_info)}
+
+
+def _summarize_runs(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Compute summary statistics of wall time, usage and numeric fields in stdout over runs of the script."""
+    columns: Dict[str, List[float]] = defaultdict(list)
+    for run in runs:
+        columns["wall_time"].append(run["wall_time"])
+        for name, value in itertools.chain(
+            _iter_numeric_fields(run["usage"], "usage"),
+            _iter_numeric_fields(run["stdout"], "stdout"),
+            _iter_numeric_fields(run.get("perf") or {}, "perf"),
+        ):
+            columns[name].append(value)
+
+    summary = {}
+    for name in sorted(columns):
+        values = columns[name]
+        summary[name] = {
+            "count": len(values),
+            "min": min(values),
+            "max": max(values),
+            "mean": statistics.mean(values),
+            "median": statistics.median(values),
+            "stdev": statistics.stdev(values) if len(values) > 1 else None,
+        }
+
+    return summary
+
+
 def main() -> None:
     """Entrypoint for inspection container."""
     start_datetime = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")
@@ -111,28 +615,66 @@ def main() -> None:
 
     # Execute the supplied script.
     if os.path.isdir(os.path.join(_EXEC_DIR, "venv")):
-        args = [os.path.join(_EXEC_DIR, "venv", "bin", "python3"), _EXEC_FILE]
+        python = [os.path.join(_EXEC_DIR, "venv", "bin", "python3")]
+        args = python + [_EXEC_FILE]
     else:
+        python = ["pipenv", "run", "python3"]
         args = ["pipenv", "run", _EXEC_FILE]
-    with open(_EXEC_STDOUT_FILE, "w") as stdout_file, open(_EXEC_STDERR_FILE, "w") as stderr_file:
-        process = subprocess.Popen(args, stdout=stdout_file, stderr=stderr_file, universal_newlines=True)
-
-    process.communicate()
-
-    usage_info = resource.getrusage(resource.RUSAGE_CHILDREN)
 
-    usage = {}
-    for idx in range(len(_RESOURCE_STRUCT_RUSAGE_ITEMS)):
-        usage[_RESOURCE_STRUCT_RUSAGE_ITEMS[idx]] = usage_info[idx]
-
-    # Load stdout and stderr.
-    with open(_EXEC_STDOUT_FILE, "r") as stdout_file:
-        stdout = stdout_file.read()
-        try:
-            stdout = json.loads(str(stdout))
-        except Exception:
-            # We were not able to load JSON, pass string as output.
-            pass
+    # The script is profiled in an extra run after the runs measured so that the profiler does not affect them.
+    profile = None
+    profiled_args: List[str] = []
+    if _PROFILER:
+        profiled_args, profile = _get_profiler_command(python)
+        if os.path.dirname(_PROFILE_FILE):
+            os.makedirs(os.path.dirname(_PROFILE_FILE), exist_ok=True)
+
+    perf: Optional[Dict[str, Any]] = None
+    if _PERF_STAT:
+        perf_command, perf_error = _get_perf_command()
+        perf = {"available": perf_command is not None, "error": perf_error, "counters": None}
+        if perf_command is not None:
+            args = perf_command + args
+
+    sampler = None
+    if _SAMPLING_INTERVAL > 0:
+        sampler = _ResourceSampler(os.getpid(), _SAMPLING_INTERVAL)
+        sampler.start()
+
+    # Output of the last run is reported, runs stop on the first failure.
+    runs = []
+    for idx in range(_WARMUP_RUNS + _REPETITIONS):
+        if perf is not None and perf["available"] and os.path.exists(_PERF_OUTPUT_FILE):
+            # Counters of the probe or of a previous run are not reported if perf fails to write them.
+            os.remove(_PERF_OUTPUT_FILE)
+
+        run = _run_script(args)
+        if perf is not None and perf["available"]:
+            perf["counters"] = _parse_perf_stat()
+
+        if idx >= _WARMUP_RUNS:
+            # Only numeric fields of stdout are kept for each run.
+            run["stdout"] = dict(_iter_numeric_fields(_load_stdout() or {}, ""))
+            if perf is not None:
+                run["perf"] = perf["counters"]
+            runs.append(run)
+
+        if run["exit_code"] != 0:
+            break
+
+    timeline = sampler.stop() if sampler is not None else None
+
+    if profile is not None:
+        if run["exit_code"] == 0:
+            # Outputs of the profiled run are discarded, the ones of the last run measured are reported.
+            _run_script(profiled_args, os.devnull, os.devnull)
+            _summarize_profile(profile)
+        else:
+            profile["error"] = "The script failed in a run measured, it was not profiled"
+
+    repetitions = None
+    if _REPETITIONS > 1 or _WARMUP_RUNS > 0:
+        repetitions = {"warmup_runs": _WARMUP_RUNS, "runs": runs, "summary": _summarize_runs(runs)}
 
     # Gather os_release
     os_release = _gather_os_release()
@@ -140,9 +682,6 @@ def main() -> None:
     # Create runtime environment output
     runtime_environment = _gather_runtime_environment(os_release, hwinfo)
 
-    with open(_EXEC_STDERR_FILE, "r") as stderr_file:
-        stderr = stderr_file.read()
-
     # Compute script SHA-256.
     sha256 = hashlib.sha256()
     with open(_EXEC_FILE, "rb") as script_file:
@@ -156,19 +695,34 @@ def main() -> None:
     # Name return code as exit_code to be consistent in Thoth.
     report = {
         "hwinfo": hwinfo,
-        "stdout": stdout or {},
-        "stderr": stderr,
-        "exit_code": process.returncode,
+        "exit_code": run["exit_code"],
         "script_sha256": sha256.hexdigest(),
-        "usage": usage,
+        # Time and resources of the last run only, not of other runs, of the profiled run or of probes.
+        "usage": run["usage"],
+        "wall_time": run["wall_time"],
         "start_datetime": start_datetime,
         "end_datetime": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f"),
         "os_release": os_release,
         "runtime_environment": runtime_environment,
         "hostname": platform.node(),
+        "timeline": timeline,
+        "repetitions": repetitions,
+        "perf": perf,
+        "profile": profile,
+        "omitted_output": {
+            "stdout": _get_omitted_size(os.path.getsize(_EXEC_STDOUT_FILE)),
+            "stderr": _get_omitted_size(os.path.getsize(_EXEC_STDERR_FILE)),
+        },
     }
 
-    output = json.dumps(report, sort_keys=True, indent=2)
+    # Stdout and stderr are not kept in memory, they are copied to the report when it is written.
+    streamed = {"stderr": _iter_output(_EXEC_STDERR_FILE)}
+    stdout = _load_stdout()
+    if stdout is not None:
+        report["stdout"] = stdout or {}
+    else:
+        # We were not able to load JSON, pass string as output.
+        streamed["stdout"] = _iter_output(_EXEC_STDOUT_FILE)
 
     output_fp = os.environ.get("THOTH_OUTPUT_PATH")
     if output_fp:
@@ -177,7 +731,7 @@ def main() -> None:
             os.makedirs(dir_name, exist_ok=True)
 
         with open(output_fp, "w") as output_file:
-            output_file.write(output)
+            _write_report(output_file, report, streamed)
 
     sys.exit(report["exit_code"])
 
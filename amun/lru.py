@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A thread safe, size bounded least recently used cache."""
+
+import threading
+from collections import OrderedDict
+from typing import Callable
+from typing import Generic
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+KeyT = TypeVar("KeyT")
+ValueT = TypeVar("ValueT")
+
+
+class LRUCache(Generic[KeyT, ValueT]):
+    """A least recently used cache bounded by number of items or by their total size."""
+
+    def __init__(self, maxsize: int, sizeof: Optional[Callable[[ValueT], int]] = None) -> None:
+        """Initialize cache, the size of each item is one unless sizeof is provided."""
+        self.maxsize = maxsize
+        self._sizeof = sizeof
+        self._items: "OrderedDict[KeyT, Tuple[ValueT, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get number of items in the cache."""
+        return len(self._items)
+
+    def __contains__(self, key: KeyT) -> bool:
+        """Check if the given key is cached, does not affect recency of the item."""
+        return key in self._items
+
+    @property
+    def size(self) -> int:
+        """Get total size of items stored in the cache."""
+        return self._size
+
+    def get(self, key: KeyT) -> Optional[ValueT]:
+        """Get item from the cache, None if not cached."""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+
+            self._items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: KeyT, value: ValueT) -> List[Tuple[KeyT, ValueT]]:
+        """Store item in the cache, return items evicted to respect the size bound."""
+        item_size = self._sizeof(value) if self._sizeof is not None else 1
+        evicted: List[Tuple[KeyT, ValueT]] = []
+
+        if item_size > self.maxsize:
+            # Would evict everything and still not fit.
+            return [(key, value)]
+
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._items[key] = (value, item_size)
+            self._size += item_size
+
+            while self._size > self.maxsize:
+                evicted_key, (evicted_value, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+                evicted.append((evicted_key, evicted_value))
+
+        return evicted
+
+    def pop(self, key: KeyT) -> Optional[ValueT]:
+        """Remove item from the cache, return it if it was cached."""
+        with self._lock:
+            entry = self._items.pop(key, None)
+            if entry is None:
+                return None
+
+            self._size -= entry[1]
+            return entry[0]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Metrics of stages of handling requests, such as calls to Ceph and OpenShift or rendering Dockerfiles.
+
+Stages are named "<component>.<operation>" and measured on top of per-endpoint
+metrics so that it is visible where the time of a slow request goes. Stages
+are also traced as spans if a tracer is configured.
+"""
+
+import contextlib
+import time
+from typing import Iterator
+
+from prometheus_client import Counter
+from prometheus_client import Histogram
+from thoth.common.exceptions import NotFoundExceptionError
+from thoth.storages.exceptions import NotFoundError as StorageNotFoundError
+
+from .configuration import Configuration
+
+_STAGE_DURATION = Histogram(
+    "amun_stage_duration_seconds",
+    "Time spent in stages of handling requests.",
+    ["stage", "outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+_STAGE_ERRORS = Counter("amun_stage_errors_total", "Stages of handling requests failed.", ["stage", "error"])
+
+
+@contextlib.contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    """Measure duration and outcome of a stage, not found errors are reported as a distinct outcome."""
+    tracer = Configuration.tracer
+    span = tracer.start_active_span(stage) if tracer is not None else contextlib.nullcontext()
+
+    outcome = "error"
+    start = time.monotonic()
+    with span:
+        try:
+            yield
+            outcome = "success"
+        except (NotFoundExceptionError, StorageNotFoundError):
+            outcome = "not_found"
+            raise
+        except Exception as exc:
+            _STAGE_ERRORS.labels(stage=stage, error=exc.__class__.__name__).inc()
+            raise
+        finally:
+            _STAGE_DURATION.labels(stage=stage, outcome=outcome).observe(time.monotonic() - start)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Fetching of inspection scripts specified by an URL.
+
+Scripts are downloaded using a shared connection pool with strict timeouts and
+size limits. Downloaded scripts are cached for a while and revalidated using
+entity tags or modification time afterwards.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import Iterable
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+import requests
+from prometheus_client import Counter
+from requests.adapters import HTTPAdapter
+
+from .exceptions import ScriptObtainingError
+from .lru import LRUCache
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for connection to the script host, between bytes received and for the whole download.
+_SCRIPT_FETCH_TIMEOUT = float(os.getenv("THOTH_AMUN_SCRIPT_FETCH_TIMEOUT", 10))
+# Maximum size of a script, in bytes.
+_SCRIPT_MAX_SIZE = int(os.getenv("THOTH_AMUN_SCRIPT_MAX_SIZE", 1024 * 1024))
+# Seconds for which a downloaded script is used without revalidating it.
+_SCRIPT_CACHE_TTL = int(os.getenv("THOTH_AMUN_SCRIPT_CACHE_TTL", 300))
+# Seconds for which a failure to download a script is reported without trying to download it again.
+_SCRIPT_ERROR_TTL = 10
+# Maximum number of scripts kept in the cache.
+_SCRIPT_CACHE_SIZE = int(os.getenv("THOTH_AMUN_SCRIPT_CACHE_SIZE", 256))
+# Number of connections kept per script host and number of scripts downloaded concurrently.
+_SCRIPT_FETCH_WORKERS = int(os.getenv("THOTH_AMUN_SCRIPT_FETCH_WORKERS", 8))
+# Kept small as the deadline of the whole download is checked between chunks.
+_SCRIPT_FETCH_CHUNK_SIZE = 8 * 1024
+
+_SCRIPT_CACHE_HITS = Counter("amun_script_cache_hits_total", "Scripts served from the cache.", ["validation"])
+_SCRIPT_CACHE_MISSES = Counter("amun_script_cache_misses_total", "Scripts downloaded.")
+
+
+class _CachedScript(NamedTuple):
+    """A downloaded script together with information needed to revalidate it."""
+
+    content: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class ScriptFetcher:
+    """Download scripts over HTTP(S), cache them and revalidate them once they expire."""
+
+    def __init__(
+        self,
+        timeout: float = _SCRIPT_FETCH_TIMEOUT,
+        max_size: int = _SCRIPT_MAX_SIZE,
+        ttl: int = _SCRIPT_CACHE_TTL,
+        cache_size: int = _SCRIPT_CACHE_SIZE,
+        workers: int = _SCRIPT_FETCH_WORKERS,
+    ) -> None:
+        """Initialize fetcher with its own connection pool and cache."""
+        self.timeout = timeout
+        self.max_size = max_size
+        self.ttl = ttl
+        self.workers = workers
+        self._cache = LRUCache[str, _CachedScript](cache_size)
+        self._errors = LRUCache[str, Tuple[ScriptObtainingError, float]](cache_size)
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _download(self, url: str, cached: Optional[_CachedScript]) -> Tuple[_CachedScript, bool]:
+        """Download script, revalidate the cached one if provided - report whether it is still valid."""
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        started = time.monotonic()
+        try:
+            with self._session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if cached is not None and response.status_code == 304:
+                    return cached._replace(fetched_at=time.monotonic()), True
+
+                try:
+                    response.raise_for_status()
+                except requests.HTTPError:
+                    raise ScriptObtainingError(
+                        f"Failed to obtain script from {url} (HTTP status: {response.status_code})"
+                    )
+
+                content_length = response.headers.get("Content-Length")
+                if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+                    raise ScriptObtainingError(f"Script {url} is too large, at most {self.max_size} bytes allowed")
+
+                content = bytearray()
+                for chunk in response.iter_content(_SCRIPT_FETCH_CHUNK_SIZE):
+                    content += chunk
+                    if time.monotonic() - started > self.timeout:
+                        raise ScriptObtainingError(f"Failed to obtain script from {url} in {self.timeout} seconds")
+
+                    if len(content) > self.max_size:
+                        raise ScriptObtainingError(f"Script {url} is too large, at most {self.max_size} bytes allowed")
+
+                script = _CachedScript(
+                    content=content.decode(response.encoding or "utf-8", errors="replace"),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                    fetched_at=time.monotonic(),
+                )
+                return script, False
+        except requests.RequestException as exc:
+            raise ScriptObtainingError(f"Failed to obtain script from {url}: {exc}") from exc
+
+    def fetch(self, url: str) -> str:
+        """Get content of the script available at the given URL."""
+        cached = self._cache.get(url)
+        if cached is not None and time.monotonic() - cached.fetched_at < self.ttl:
+            _SCRIPT_CACHE_HITS.labels(validation="fresh").inc()
+            return cached.content
+
+        error = self._errors.get(url)
+        if error is not None and time.monotonic() - error[1] < _SCRIPT_ERROR_TTL:
+            raise error[0]
+
+        try:
+            script, revalidated = self._download(url, cached)
+        except ScriptObtainingError as exc:
+            # Do not try again for each inspection of a batch submitted.
+            self._errors.put(url, (exc, time.monotonic()))
+            raise
+
+        if revalidated:
+            _SCRIPT_CACHE_HITS.labels(validation="revalidated").inc()
+        else:
+            _SCRIPT_CACHE_MISSES.inc()
+
+        self._cache.put(url, script)
+        return script.content
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Union[str, ScriptObtainingError]]:
+        """Get content of scripts available at the given URLs concurrently, report errors per URL."""
+
+        def _fetch(url: str) -> Union[str, ScriptObtainingError]:
+            try:
+                return self.fetch(url)
+            except ScriptObtainingError as exc:
+                return exc
+
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(unique_urls))) as executor:
+            return dict(zip(unique_urls, executor.map(_fetch, unique_urls)))
+
+
+SCRIPT_FETCHER = ScriptFetcher()
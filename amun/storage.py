@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Low level helpers for accessing inspections stored on Ceph."""
+
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import botocore.exceptions
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from thoth.storages import CephStore
+from thoth.storages import InspectionStore
+from thoth.storages.inspections import InspectionBuildsStore
+from thoth.storages.inspections import InspectionResultsStore
+
+from .lru import LRUCache
+from .metrics import observe_stage
+
+_LOGGER = logging.getLogger(__name__)
+
+# Maximum number of per-inspection adapters kept in the pool.
+_STORE_POOL_SIZE = int(os.getenv("THOTH_AMUN_STORE_POOL_SIZE", 512))
+
+_STORE_POOL = LRUCache[str, InspectionStore](_STORE_POOL_SIZE)
+_S3_THREAD_LOCAL = threading.local()
+
+_STORE_POOL_HITS = Counter("amun_inspection_store_pool_hits_total", "Inspection store adapters reused from the pool.")
+_STORE_POOL_MISSES = Counter("amun_inspection_store_pool_misses_total", "Inspection store adapters created.")
+_STORE_POOL_EVICTIONS = Counter("amun_inspection_store_pool_evictions_total", "Inspection store adapters evicted.")
+_STORE_POOL_ITEMS = Gauge("amun_inspection_store_pool_items", "Inspection store adapters kept in the pool.")
+_S3_SESSIONS = Counter("amun_s3_sessions_created_total", "S3 sessions created to talk to Ceph.")
+
+
+def _get_inspections_prefix() -> str:
+    """Get prefix under which inspections are stored, matches layout used by thoth-storages."""
+    bucket_prefix = os.environ["THOTH_CEPH_BUCKET_PREFIX"]
+    deployment_name = os.environ["THOTH_DEPLOYMENT_NAME"]
+    return f"{bucket_prefix}/{deployment_name}/inspections/"
+
+
+def _get_s3_resource() -> Any:
+    """Get S3 resource of the current thread, create one on first use.
+
+    Resources are not thread safe so each thread keeps its own, the number of
+    sessions is bounded by the number of threads serving requests.
+    """
+    resource = getattr(_S3_THREAD_LOCAL, "resource", None)
+    if resource is None:
+        ceph = CephStore(prefix=_get_inspections_prefix())
+        ceph.connect()
+        resource = ceph._s3
+        _S3_THREAD_LOCAL.resource = resource
+        _S3_SESSIONS.inc()
+
+    return resource
+
+
+class _PooledCephStore(CephStore):
+    """Ceph adapter using S3 resource of the current thread instead of creating its own session on connect."""
+
+    @property
+    def _s3(self) -> Any:
+        """Get S3 resource shared by all the adapters used in the current thread."""
+        return _get_s3_resource()
+
+    @_s3.setter
+    def _s3(self, value: Any) -> None:
+        """Ignore assignment done on initialization and connect, the resource is managed by the pool."""
+
+    def connect(self) -> None:
+        """Connect adapter - the S3 resource is created lazily on first use."""
+
+
+def _create_inspection_store(inspection_id: str) -> InspectionStore:
+    """Create inspection store adapter using pooled S3 resources."""
+    # Constructors of the thoth-storages adapters connect on their own, assign the attributes directly instead.
+    prefix = f"{_get_inspections_prefix()}{inspection_id}"
+
+    build = InspectionBuildsStore.__new__(InspectionBuildsStore)
+    build.inspection_id = inspection_id
+    build.ceph = _PooledCephStore(prefix=f"{prefix}/build/")
+
+    results = InspectionResultsStore.__new__(InspectionResultsStore)
+    results.inspection_id = inspection_id
+    results.ceph = _PooledCephStore(prefix=f"{prefix}/results/")
+
+    inspection_store = InspectionStore.__new__(InspectionStore)
+    inspection_store.inspection_id = inspection_id
+    inspection_store.build = build
+    inspection_store.results = results
+    return inspection_store
+
+
+def get_inspection_store(inspection_id: str) -> InspectionStore:
+    """Get a connected inspection store adapter for the given inspection from the process-wide pool."""
+    inspection_store = _STORE_POOL.get(inspection_id)
+    if inspection_store is not None:
+        _STORE_POOL_HITS.inc()
+        return inspection_store
+
+    _STORE_POOL_MISSES.inc()
+    inspection_store = _create_inspection_store(inspection_id)
+    _STORE_POOL_EVICTIONS.inc(len(_STORE_POOL.put(inspection_id, inspection_store)))
+    _STORE_POOL_ITEMS.set(len(_STORE_POOL))
+    return inspection_store
+
+
+def encode_continuation_token(marker: Dict[str, Any]) -> str:
+    """Encode listing marker into an opaque continuation token handed to users."""
+    return base64.urlsafe_b64encode(json.dumps(marker, sort_keys=True).encode()).decode()
+
+
+def decode_continuation_token(continuation_token: str) -> Dict[str, Any]:
+    """Decode an opaque continuation token as produced by encode_continuation_token."""
+    try:
+        marker = json.loads(base64.urlsafe_b64decode(continuation_token.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Invalid continuation token {continuation_token!r}") from exc
+
+    if not isinstance(marker, dict):
+        raise ValueError(f"Invalid continuation token {continuation_token!r}")
+
+    return marker
+
+
+def list_inspections(limit: int, continuation_token: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """List one page of inspection ids stored on Ceph.
+
+    Only "directories" are listed using the object store delimiter so the
+    listing does not walk results stored for each inspection. The continuation
+    token states the last inspection listed so any page costs one list call,
+    tokens are shared with listings served by the inspection index.
+    """
+    list_kwargs: Dict[str, Any] = {
+        "Prefix": _get_inspections_prefix(),
+        "Delimiter": "/",
+        "MaxKeys": limit,
+    }
+
+    start_after = None
+    if continuation_token is not None:
+        marker = decode_continuation_token(continuation_token)
+        if isinstance(marker.get("after"), str):
+            start_after = marker["after"]
+        elif isinstance(marker.get("s3"), str):
+            # Token wrapping the object store listing marker, as issued by previous versions.
+            list_kwargs["ContinuationToken"] = marker["s3"]
+        else:
+            raise ValueError(f"Invalid continuation token {continuation_token!r}")
+
+    if start_after is not None:
+        # Keys of the inspection start with its id followed by a slash, the next character skips all of them.
+        list_kwargs["StartAfter"] = list_kwargs["Prefix"] + start_after + chr(ord("/") + 1)
+
+    ceph = _PooledCephStore(prefix=list_kwargs["Prefix"])
+    response = ceph._s3.meta.client.list_objects_v2(Bucket=ceph.bucket, **list_kwargs)
+
+    prefix_len = len(list_kwargs["Prefix"])
+    inspection_ids = [item["Prefix"][prefix_len:].rstrip("/") for item in response.get("CommonPrefixes", [])]
+
+    next_continuation_token = None
+    if response.get("IsTruncated") and inspection_ids:
+        next_continuation_token = encode_continuation_token({"after": inspection_ids[-1]})
+    elif response.get("IsTruncated") and response.get("NextContinuationToken"):
+        # A page with no inspection listed, continue using the object store listing marker.
+        next_continuation_token = encode_continuation_token({"s3": response["NextContinuationToken"]})
+
+    return inspection_ids, next_continuation_token
+
+
+def iter_inspection_results(
+    inspection_store: InspectionStore, items: Iterable[int], max_workers: int
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """Retrieve results of the given batch items concurrently, yield them in the order they arrive.
+
+    Items with no result stored are reported with None. The low level S3 client
+    is used as, unlike resources, it is safe to share it across threads.
+    """
+    ceph = inspection_store.results.ceph
+    client = _get_s3_resource().meta.client
+
+    def _retrieve_result(item: int) -> Optional[Dict[str, Any]]:
+        with observe_stage("storage.retrieve_result"):
+            try:
+                response = client.get_object(Bucket=ceph.bucket, Key=f"{ceph.prefix}{item}/result")
+            except client.exceptions.NoSuchKey:
+                return None
+
+            result: Dict[str, Any] = json.loads(response["Body"].read())
+            return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_retrieve_result, item): item for item in items}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Do not fetch remaining items if the consumer went away.
+            for future in futures:
+                future.cancel()
+
+
+class StoredArtifact(NamedTuple):
+    """An artifact of an inspection being downloaded from Ceph."""
+
+    # Body to be read in chunks, it has to be closed once done.
+    body: Any
+    # Size of the body, the requested range only if a range was requested.
+    content_length: int
+    # Content-Range of the body if a range was requested.
+    content_range: Optional[str]
+    etag: Optional[str]
+
+
+def open_inspection_artifact(
+    inspection_id: str, key: str, byte_range: Optional[str] = None
+) -> Optional[StoredArtifact]:
+    """Start download of an artifact of an inspection, such as "build/log", None if it is not stored.
+
+    The byte range is a value of HTTP Range header with a single range, ValueError
+    is raised if it is not satisfiable.
+    """
+    ceph = _PooledCephStore(prefix=f"{_get_inspections_prefix()}{inspection_id}/")
+    client = ceph._s3.meta.client
+
+    get_kwargs = {"Range": byte_range} if byte_range else {}
+    try:
+        response = client.get_object(Bucket=ceph.bucket, Key=f"{ceph.prefix}{key}", **get_kwargs)
+    except client.exceptions.NoSuchKey:
+        return None
+    except botocore.exceptions.ClientError as exc:
+        if exc.response["Error"]["Code"] == "InvalidRange":
+            raise ValueError(f"Range {byte_range!r} cannot be satisfied for {key!r}") from exc
+        raise
+
+    return StoredArtifact(
+        body=response["Body"],
+        content_length=response["ContentLength"],
+        content_range=response.get("ContentRange"),
+        etag=response.get("ETag"),
+    )
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Helpers for querying inspection Argo Workflows."""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Protocol
+
+from thoth.common import OpenShift
+
+_LOGGER = logging.getLogger(__name__)
+
+# Keep label selectors reasonably short so that the request URL is not rejected.
+_LABEL_SELECTOR_CHUNK_SIZE = 50
+# Turn on the background informer watching inspection workflows.
+_WORKFLOW_INFORMER = bool(int(os.getenv("THOTH_AMUN_WORKFLOW_INFORMER", 0)))
+# Seconds after which the watch is re-established, the informer is considered in sync at that point.
+_WORKFLOW_INFORMER_WATCH_TIMEOUT = int(os.getenv("THOTH_AMUN_WORKFLOW_INFORMER_WATCH_TIMEOUT", 300))
+# Seconds to wait before re-listing workflows after a failure.
+_WORKFLOW_INFORMER_BACKOFF = 5
+
+
+def get_workflow_resource(openshift: OpenShift) -> Any:
+    """Get dynamic client resource for Argo Workflows."""
+    return openshift.ocp_client.resources.get(api_version="argoproj.io/v1alpha1", kind="Workflow", name="workflows")
+
+
+def list_workflow_statuses(openshift: OpenShift, namespace: str, inspection_ids: List[str]) -> Dict[str, Any]:
+    """Get statuses of workflows for the given inspections using set based label selector queries.
+
+    Inspections with no workflow found are not present in the returned mapping.
+    """
+    resource = get_workflow_resource(openshift)
+
+    result = {}
+    for idx in range(0, len(inspection_ids), _LABEL_SELECTOR_CHUNK_SIZE):
+        chunk = inspection_ids[idx : idx + _LABEL_SELECTOR_CHUNK_SIZE]  # Ignore PycodestyleBear (E203)
+        response = resource.get(namespace=namespace, label_selector=f"inspection_id in ({','.join(chunk)})")
+
+        for item in response.to_dict()["items"]:
+            inspection_id = item["metadata"].get("labels", {}).get("inspection_id")
+            if inspection_id is None:
+                _LOGGER.warning("Workflow %r has no inspection_id label", item["metadata"].get("name"))
+                continue
+
+            result[inspection_id] = item.get("status")
+
+    return result
+
+
+class CachedWorkflowStatus(NamedTuple):
+    """Workflow status as observed by the informer."""
+
+    status: Optional[Dict[str, Any]]
+    # When the status was last updated by an event.
+    updated_at: float
+    # When the informer was last known to be in sync with the cluster.
+    synced_at: float
+
+
+class WorkflowStatusSubscriber(Protocol):
+    """Receiver of workflow status changes, such as a queue."""
+
+    def put(self, item: Optional[Dict[str, Any]]) -> None:
+        """Receive the current workflow status, None if the workflow is gone."""
+
+
+class WorkflowStatusInformer:
+    """Maintain an in-memory map of inspection workflow statuses based on a watch stream."""
+
+    def __init__(self, openshift: OpenShift, namespace: str, watch_timeout: int = _WORKFLOW_INFORMER_WATCH_TIMEOUT):
+        """Initialize informer, it needs to be started to receive any updates."""
+        self.openshift = openshift
+        self.namespace = namespace
+        self.watch_timeout = watch_timeout
+        self._statuses: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._updated_at: Dict[str, float] = {}
+        self._synced_at: Optional[float] = None
+        self._subscribers: Dict[str, List[WorkflowStatusSubscriber]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching workflows in a background thread."""
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target=self._run, name="amun-workflow-informer", daemon=True)
+            self._thread.start()
+
+    def is_in_sync(self) -> bool:
+        """Check whether the informer is in sync with the cluster - the watch was not broken for too long."""
+        return self._synced_at is not None and time.monotonic() - self._synced_at < 2 * self.watch_timeout
+
+    def get(self, inspection_id: str) -> Optional[CachedWorkflowStatus]:
+        """Get workflow status of the given inspection, None if not known or the informer is not in sync."""
+        if not self.is_in_sync():
+            return None
+
+        with self._lock:
+            if inspection_id not in self._statuses:
+                return None
+
+            return CachedWorkflowStatus(
+                status=self._statuses[inspection_id],
+                updated_at=self._updated_at[inspection_id],
+                synced_at=self._synced_at,  # type: ignore
+            )
+
+    def subscribe(self, inspection_id: str) -> "queue.Queue[Optional[Dict[str, Any]]]":
+        """Subscribe to workflow status changes of the given inspection, None is sent if the workflow is gone."""
+        subscription: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self.add_subscriber(inspection_id, subscription)
+        return subscription
+
+    def add_subscriber(self, inspection_id: str, subscriber: WorkflowStatusSubscriber) -> None:
+        """Send workflow status changes of the given inspection to a subscriber, it has to be non-blocking."""
+        with self._lock:
+            self._subscribers.setdefault(inspection_id, []).append(subscriber)
+
+    def unsubscribe(self, inspection_id: str, subscription: WorkflowStatusSubscriber) -> None:
+        """Cancel subscription created by subscribe or add_subscriber."""
+        with self._lock:
+            subscriptions = self._subscribers.get(inspection_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+
+            if not subscriptions:
+                self._subscribers.pop(inspection_id, None)
+
+    def _notify(self, inspection_id: str) -> None:
+        """Send the current workflow status to subscribers, has to be called with the lock held."""
+        for subscription in self._subscribers.get(inspection_id, ()):
+            subscription.put(self._statuses.get(inspection_id))
+
+    def handle_event(self, event_type: str, workflow: Dict[str, Any]) -> None:
+        """Update the map of statuses based on an event from the watch stream."""
+        inspection_id = workflow["metadata"].get("labels", {}).get("inspection_id")
+        if inspection_id is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if event_type == "DELETED":
+                self._statuses.pop(inspection_id, None)
+                self._updated_at.pop(inspection_id, None)
+            else:
+                self._statuses[inspection_id] = workflow.get("status")
+                self._updated_at[inspection_id] = now
+
+            self._synced_at = now
+            self._notify(inspection_id)
+
+    def _list(self) -> str:
+        """List all the inspection workflows, replace the map of statuses and return resource version to watch."""
+        response = get_workflow_resource(self.openshift).get(namespace=self.namespace, label_selector="inspection_id")
+        workflows = response.to_dict()
+
+        now = time.monotonic()
+        statuses = {}
+        for item in workflows["items"]:
+            statuses[item["metadata"]["labels"]["inspection_id"]] = item.get("status")
+
+        with self._lock:
+            self._statuses = statuses
+            self._updated_at = dict.fromkeys(statuses, now)
+            self._synced_at = now
+            # Changes could be missed while the watch was broken.
+            for inspection_id in self._subscribers:
+                self._notify(inspection_id)
+
+        resource_version: str = workflows["metadata"]["resourceVersion"]
+        return resource_version
+
+    def _watch(self, resource_version: str) -> str:
+        """Watch workflow events until the watch times out, return the last resource version seen."""
+        for event in get_workflow_resource(self.openshift).watch(
+            namespace=self.namespace,
+            label_selector="inspection_id",
+            resource_version=resource_version,
+            timeout=self.watch_timeout,
+        ):
+            if event["type"] == "ERROR":
+                # Most likely the resource version is too old, the caller re-lists.
+                raise RuntimeError(f"Error event received when watching workflows: {event['raw_object']!r}")
+
+            self.handle_event(event["type"], event["raw_object"])
+            resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+
+        with self._lock:
+            self._synced_at = time.monotonic()
+
+        return resource_version
+
+    def _run(self) -> None:
+        """List workflows and keep watching them, re-list on any failure."""
+        while True:
+            try:
+                resource_version = self._list()
+                while True:
+                    resource_version = self._watch(resource_version)
+            except Exception:
+                _LOGGER.exception("Workflow informer failed, re-listing workflows in %ds", _WORKFLOW_INFORMER_BACKOFF)
+                time.sleep(_WORKFLOW_INFORMER_BACKOFF)
+
+
+_INFORMER: Optional[WorkflowStatusInformer] = None
+_INFORMER_LOCK = threading.Lock()
+
+
+def get_workflow_status_informer(openshift: OpenShift, namespace: str) -> Optional[WorkflowStatusInformer]:
+    """Get the process-wide started workflow informer, None if turned off."""
+    global _INFORMER
+
+    if not _WORKFLOW_INFORMER:
+        return None
+
+    with _INFORMER_LOCK:
+        if _INFORMER is None:
+            # Started lazily so that the thread is not lost when uWSGI forks workers.
+            _INFORMER = WorkflowStatusInformer(openshift, namespace)
+            _INFORMER.start()
+
+    return _INFORMER
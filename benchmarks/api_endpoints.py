@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark of API endpoints served in-process against fake Ceph and OpenShift.
+
+The connexion application from amun.entrypoint handles requests issued by
+Flask test clients. Inspection stores and OpenShift are replaced with
+in-memory fakes seeded with the example inspection, each call to them can be
+delayed to emulate network round trips. Throughput and latency percentiles of
+each scenario are printed and written to a JSON report so that hot paths can
+be compared across revisions.
+
+Usage:
+  python3 benchmarks/api_endpoints.py [--inspections N] [--batch-size N] [--requests N] [--concurrency N]
+                                      [--latency MS] [--scenario NAME ...] [--output PATH]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import cast
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+_EXAMPLE = os.path.join(_ROOT, "example", "inspection-rhtf-conv2d-0f845f38")
+
+sys.path.insert(0, _ROOT)
+
+# Configuration read by the API on import, the fakes below are used instead of the services configured.
+for _name, _value in (
+    ("AMUN_API_APP_SECRET_KEY", "benchmark"),
+    ("THOTH_AMUN_INSPECTION_NAMESPACE", "amun-inspection"),
+    ("THOTH_AMUN_INFRA_NAMESPACE", "amun-infra"),
+    ("THOTH_CEPH_BUCKET_PREFIX", "data"),
+    ("THOTH_DEPLOYMENT_NAME", "benchmark"),
+):
+    os.environ.setdefault(_name, _value)
+
+import thoth.common  # noqa: E402
+from thoth.common.exceptions import NotFoundExceptionError  # noqa: E402
+from thoth.storages.exceptions import NotFoundError as StorageNotFoundError  # noqa: E402
+
+_LATENCY = 0.0
+
+
+def _round_trip() -> None:
+    """Emulate a network round trip to Ceph or OpenShift."""
+    if _LATENCY:
+        time.sleep(_LATENCY)
+
+
+class _Example:
+    """Serialized artifacts of the example inspection, shared by all the fake inspections."""
+
+    def __init__(self, batch_size: int) -> None:
+        """Load example inspection, results and logs are repeated to obtain the requested batch size."""
+        with open(os.path.join(_EXAMPLE, "build", "specification"), "rb") as specification_file:
+            self.specification = specification_file.read()
+
+        with open(os.path.join(_EXAMPLE, "build", "log")) as build_log_file:
+            self.build_log = build_log_file.read()
+
+        items = sorted(os.listdir(os.path.join(_EXAMPLE, "results")), key=int)
+        self.results = []
+        self.logs = []
+        for idx in range(batch_size):
+            item_path = os.path.join(_EXAMPLE, "results", items[idx % len(items)])
+            with open(os.path.join(item_path, "result"), "rb") as result_file:
+                self.results.append(result_file.read())
+            with open(os.path.join(item_path, "log")) as log_file:
+                self.logs.append(log_file.read())
+
+
+class _FakeBuildStore:
+    """In-memory replacement of thoth-storages' InspectionBuildsStore."""
+
+    def __init__(self, example: _Example) -> None:
+        """Initialize store serving the example build."""
+        self._example = example
+
+    def retrieve_log(self) -> str:
+        """Retrieve build log."""
+        _round_trip()
+        return self._example.build_log
+
+
+class _FakeResultsStore:
+    """In-memory replacement of thoth-storages' InspectionResultsStore."""
+
+    def __init__(self, example: _Example) -> None:
+        """Initialize store serving the example results."""
+        self._example = example
+
+    def get_results_count(self) -> int:
+        """Get number of batch items stored."""
+        _round_trip()
+        return len(self._example.results)
+
+    def retrieve_result(self, item: int) -> Dict[str, Any]:
+        """Retrieve result of a batch item, parsed as when downloaded from Ceph."""
+        _round_trip()
+        if item >= len(self._example.results):
+            raise StorageNotFoundError(f"No result for item {item}")
+
+        result: Dict[str, Any] = json.loads(self._example.results[item])
+        return result
+
+    def retrieve_log(self, item: int) -> str:
+        """Retrieve log of a batch item."""
+        _round_trip()
+        if item >= len(self._example.logs):
+            raise StorageNotFoundError(f"No log for item {item}")
+
+        return self._example.logs[item]
+
+
+class _FakeInspectionStore:
+    """In-memory replacement of thoth-storages' InspectionStore."""
+
+    def __init__(self, inspection_id: str, example: Optional[_Example]) -> None:
+        """Initialize store of an inspection, it is not stored if no example is given."""
+        self.inspection_id = inspection_id
+        self._example = example
+        if example is not None:
+            self.build = _FakeBuildStore(example)
+            self.results = _FakeResultsStore(example)
+
+    def exists(self) -> bool:
+        """Check whether the inspection is stored."""
+        _round_trip()
+        return self._example is not None
+
+    def retrieve_specification(self) -> Dict[str, Any]:
+        """Retrieve specification of the inspection."""
+        _round_trip()
+        if self._example is None:
+            raise StorageNotFoundError(f"No specification for inspection {self.inspection_id}")
+
+        specification: Dict[str, Any] = json.loads(self._example.specification)
+        return specification
+
+
+class _Response:
+    """Response of the OpenShift dynamic client."""
+
+    def __init__(self, content: Dict[str, Any]) -> None:
+        """Wrap response content."""
+        self._content = content
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get response content."""
+        return self._content
+
+
+class _FakeWorkflowResource:
+    """Argo Workflows resource of the OpenShift dynamic client."""
+
+    def __init__(self, openshift: "_FakeOpenShift") -> None:
+        """Initialize resource listing workflows known to the fake OpenShift."""
+        self._openshift = openshift
+
+    def get(self, namespace: str, label_selector: str) -> _Response:
+        """List workflows matching set based inspection_id selector."""
+        _round_trip()
+        inspection_ids = label_selector.split("(", maxsplit=1)[1].rstrip(")").split(",")
+        return _Response(
+            {
+                "items": [
+                    {"metadata": {"name": i, "labels": {"inspection_id": i}}, "status": self._openshift.workflows[i]}
+                    for i in inspection_ids
+                    if i in self._openshift.workflows
+                ]
+            }
+        )
+
+
+class _FakeResources:
+    """Resources of the OpenShift dynamic client."""
+
+    def __init__(self, openshift: "_FakeOpenShift") -> None:
+        """Initialize resources served by the fake OpenShift."""
+        self._workflows = _FakeWorkflowResource(openshift)
+
+    def get(self, api_version: str, kind: str, name: str) -> _FakeWorkflowResource:
+        """Get workflow resource."""
+        return self._workflows
+
+
+class _FakeOcpClient:
+    """OpenShift dynamic client."""
+
+    def __init__(self, openshift: "_FakeOpenShift") -> None:
+        """Initialize client of the fake OpenShift."""
+        self.resources = _FakeResources(openshift)
+
+
+class _FakeOpenShift:
+    """In-memory replacement of thoth-common's OpenShift with workflows of all the fake inspections."""
+
+    amun_inspection_namespace = os.environ["THOTH_AMUN_INSPECTION_NAMESPACE"]
+    infra_namespace = os.environ["THOTH_AMUN_INFRA_NAMESPACE"]
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize OpenShift with no workflows."""
+        self.workflows: Dict[str, Dict[str, Any]] = {}
+        self.ocp_client = _FakeOcpClient(self)
+        self._scheduled = 0
+        self._lock = threading.Lock()
+
+    def get_workflow(self, label_selector: str, namespace: str) -> Dict[str, Any]:
+        """Get workflow matching the given inspection_id label selector."""
+        _round_trip()
+        inspection_id = label_selector.split("=", maxsplit=1)[1]
+        if inspection_id not in self.workflows:
+            raise NotFoundExceptionError(f"No workflow for inspection {inspection_id}")
+
+        return {"metadata": {"name": inspection_id}, "status": self.workflows[inspection_id]}
+
+    def get_pod_status_report(self, pod_id: str, namespace: str) -> Dict[str, Any]:
+        """Get status of a build pod, build pods are garbage collected once the build is done."""
+        _round_trip()
+        raise NotFoundExceptionError(f"No pod {pod_id}")
+
+    def schedule_inspection(
+        self,
+        dockerfile: str,
+        specification: Dict[str, Any],
+        target: str,
+        parameters: Dict[str, Any],
+        *,
+        raw_specification: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Pretend submission of an inspection workflow."""
+        _round_trip()
+        with self._lock:
+            self._scheduled += 1
+            return f"inspection-benchmark-{self._scheduled:08d}"
+
+
+# Replaced before the API is imported as OpenShift is instantiated on import.
+setattr(thoth.common, "OpenShift", _FakeOpenShift)
+
+from amun import api_v1  # noqa: E402
+from amun import entrypoint  # noqa: E402
+from amun.storage import decode_continuation_token  # noqa: E402
+from amun.storage import encode_continuation_token  # noqa: E402
+
+
+def _workflow_status(inspection_id: str, batch_size: int) -> Dict[str, Any]:
+    """Create status of a finished inspection workflow with a node per batch item."""
+    nodes = {
+        f"{inspection_id}-{item}": {
+            "id": f"{inspection_id}-{item}",
+            "displayName": f"run({item})",
+            "type": "Pod",
+            "phase": "Succeeded",
+            "startedAt": "2020-08-05T14:41:01Z",
+            "finishedAt": "2020-08-05T14:45:41Z",
+        }
+        for item in range(batch_size)
+    }
+    return {
+        "phase": "Succeeded",
+        "startedAt": "2020-08-05T14:41:01Z",
+        "finishedAt": "2020-08-05T14:50:12Z",
+        "nodes": nodes,
+    }
+
+
+def _setup(inspections: int, batch_size: int) -> List[str]:
+    """Seed fakes with the example inspection and route API calls to them, return ids of inspections created."""
+    example = _Example(batch_size)
+    inspection_ids = [f"inspection-rhtf-conv2d-{idx:08x}" for idx in range(inspections)]
+    stores = {inspection_id: _FakeInspectionStore(inspection_id, example) for inspection_id in inspection_ids}
+
+    def _get_inspection_store(inspection_id: str) -> _FakeInspectionStore:
+        return stores.get(inspection_id) or _FakeInspectionStore(inspection_id, None)
+
+    def _list_inspections(limit: int, continuation_token: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        _round_trip()
+        offset = decode_continuation_token(continuation_token)["offset"] if continuation_token else 0
+        next_continuation_token = None
+        if offset + limit < len(inspection_ids):
+            next_continuation_token = encode_continuation_token({"offset": offset + limit})
+
+        return inspection_ids[offset : offset + limit], next_continuation_token  # Ignore PycodestyleBear (E203)
+
+    def _iter_inspection_results(
+        inspection_store: _FakeInspectionStore, items: Iterable[int], max_workers: int
+    ) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+        def _retrieve(item: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+            try:
+                return item, inspection_store.results.retrieve_result(item)
+            except StorageNotFoundError:
+                return item, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(_retrieve, items)
+
+    # The fakes stand in for storage types, assigned without type checking.
+    setattr(api_v1, "get_inspection_store", _get_inspection_store)
+    setattr(api_v1, "list_inspections", _list_inspections)
+    setattr(api_v1, "iter_inspection_results", _iter_inspection_results)
+
+    openshift = cast(_FakeOpenShift, api_v1._OPENSHIFT)
+    openshift.workflows = {
+        inspection_id: _workflow_status(inspection_id, batch_size) for inspection_id in inspection_ids
+    }
+    return inspection_ids
+
+
+def _inspection_request() -> Dict[str, Any]:
+    """Create inspection request out of the example specification, with the script inlined."""
+    with open(os.path.join(_EXAMPLE, "build", "specification")) as specification_file:
+        specification: Dict[str, Any] = json.load(specification_file)
+
+    specification = {key: value for key, value in specification.items() if not key.startswith("@")}
+    specification["script"] = "#!/usr/bin/env python3\nimport tensorflow as tf\nprint(tf.__version__)\n"
+    return specification
+
+
+_Request = Callable[[Any, int], Any]
+
+
+def _scenarios(inspection_ids: List[str], batch_size: int) -> Dict[str, _Request]:
+    """Create requests issued by each scenario, a request gets a test client and a sequence number."""
+    inspection_request = _inspection_request()
+    status_ids = inspection_ids[:50]
+
+    def _inspection_id(idx: int) -> str:
+        return inspection_ids[idx % len(inspection_ids)]
+
+    return {
+        "post_inspection": lambda client, idx: client.post("/api/v1/inspect", json=inspection_request),
+        "get_inspection": lambda client, idx: client.get("/api/v1/inspect?limit=100"),
+        "get_inspection_status": lambda client, idx: client.get(f"/api/v1/inspect/{_inspection_id(idx)}/status"),
+        "post_inspection_status": lambda client, idx: client.post(
+            "/api/v1/inspect/status", json={"inspection_ids": status_ids}
+        ),
+        "get_inspection_specification": lambda client, idx: client.get(
+            f"/api/v1/inspect/{_inspection_id(idx)}/specification"
+        ),
+        "get_inspection_build_log": lambda client, idx: client.get(f"/api/v1/inspect/{_inspection_id(idx)}/build/log"),
+        "get_inspection_job_result": lambda client, idx: client.get(
+            f"/api/v1/inspect/{_inspection_id(idx)}/job/{idx % batch_size}/result"
+        ),
+        "get_inspection_job_results": lambda client, idx: client.get(
+            f"/api/v1/inspect/{_inspection_id(idx)}/job/results"
+        ),
+    }
+
+
+def _percentile(latencies: List[float], percentile: int) -> float:
+    """Compute percentile of latencies, in milliseconds."""
+    if len(latencies) < 2:
+        return latencies[0] * 1000 if latencies else 0.0
+
+    return statistics.quantiles(latencies, n=100)[percentile - 1] * 1000
+
+
+def _run_scenario(request: _Request, requests_count: int, concurrency: int) -> Dict[str, Any]:
+    """Issue requests of a scenario concurrently, report throughput and latency."""
+    latencies: List[float] = []
+    errors: List[int] = []
+    local = threading.local()
+
+    def _request(idx: int) -> None:
+        if not hasattr(local, "client"):
+            local.client = entrypoint.app.app.test_client()
+
+        start = time.perf_counter()
+        response = request(local.client, idx)
+        # Consume streamed responses completely.
+        response.get_data()
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+    # Warm up caches so that steady state is measured.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_request, range(concurrency)))
+
+    latencies.clear()
+    errors.clear()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_request, range(requests_count)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests_count,
+        "errors": len(errors),
+        "throughput": requests_count / elapsed,
+        "latency_ms": {
+            "mean": statistics.mean(latencies) * 1000,
+            "p50": _percentile(latencies, 50),
+            "p99": _percentile(latencies, 99),
+            "max": max(latencies) * 1000,
+        },
+    }
+
+
+def main() -> None:
+    """Run benchmark scenarios and write the report."""
+    global _LATENCY
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inspections", type=int, default=1000, help="Number of inspections stored.")
+    parser.add_argument("--batch-size", type=int, default=20, help="Number of batch items of each inspection.")
+    parser.add_argument("--requests", type=int, default=500, help="Number of requests issued by each scenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay of calls to Ceph and OpenShift, in ms.")
+    parser.add_argument("--scenario", action="append", help="Run only the given scenario, can be repeated.")
+    parser.add_argument("--output", default="amun-api-benchmark.json", help="Path to the JSON report written.")
+    arguments = parser.parse_args()
+
+    _LATENCY = arguments.latency / 1000
+    inspection_ids = _setup(arguments.inspections, arguments.batch_size)
+    scenarios = _scenarios(inspection_ids, arguments.batch_size)
+
+    unknown = set(arguments.scenario or ()) - set(scenarios)
+    if unknown:
+        parser.error(f"Unknown scenarios {', '.join(sorted(unknown))}, available: {', '.join(scenarios)}")
+
+    results = {}
+    for name, request in scenarios.items():
+        if arguments.scenario and name not in arguments.scenario:
+            continue
+
+        result = _run_scenario(request, arguments.requests, arguments.concurrency)
+        results[name] = result
+        print(
+            f"{name:<32} {result['throughput']:10.1f} requests/s"
+            f"  p50 {result['latency_ms']['p50']:8.2f}ms  p99 {result['latency_ms']['p99']:8.2f}ms"
+            + (f"  {result['errors']} errors" if result["errors"] else "")
+        )
+
+    report = {
+        "amun_version": entrypoint.__service_version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "parameters": {
+            "inspections": arguments.inspections,
+            "batch_size": arguments.batch_size,
+            "requests": arguments.requests,
+            "concurrency": arguments.concurrency,
+            "latency_ms": arguments.latency,
+        },
+        "scenarios": results,
+    }
+    with open(arguments.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"Report written to {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Load test of read endpoints of running Amun API instances.
+
+Concurrent clients request status, specification, logs and results of an
+existing inspection. Pass multiple API URLs to compare deployments, such as
+the API served synchronously and asynchronously (AMUN_API_ASYNC=1):
+
+  gunicorn --workers 1 --threads 8 --bind :8080 amun.application:application
+  AMUN_API_ASYNC=1 gunicorn --worker-class aiohttp.GunicornWebWorker --bind :8081 amun.application:application
+
+Usage:
+  python3 benchmarks/api_load.py --inspection-id ID [--concurrency N] [--requests N] URL [URL ...]
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import requests
+
+_ENDPOINTS = (
+    "/api/v1/inspect/{inspection_id}/status",
+    "/api/v1/inspect/{inspection_id}/specification",
+    "/api/v1/inspect/{inspection_id}/job/batch-size",
+    "/api/v1/inspect/{inspection_id}/job/0/log",
+    "/api/v1/inspect/{inspection_id}/job/0/result",
+)
+
+
+def _percentile(latencies: List[float], percentile: int) -> float:
+    """Compute percentile of latencies, in milliseconds."""
+    if len(latencies) < 2:
+        return latencies[0] * 1000 if latencies else 0.0
+
+    return statistics.quantiles(latencies, n=100)[percentile - 1] * 1000
+
+
+def _run(url: str, inspection_id: str, concurrency: int, requests_count: int) -> Tuple[float, Dict[str, List[float]]]:
+    """Fire requests at the given API, return the elapsed time and latencies per endpoint."""
+    paths = [endpoint.format(inspection_id=inspection_id) for endpoint in _ENDPOINTS]
+    latencies: Dict[str, List[float]] = {path: [] for path in paths}
+    errors: List[str] = []
+    local = threading.local()
+
+    def _request(idx: int) -> None:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        path = paths[idx % len(paths)]
+        start = time.monotonic()
+        response = local.session.get(url.rstrip("/") + path)
+        latencies[path].append(time.monotonic() - start)
+        if response.status_code != 200:
+            errors.append(f"{path}: HTTP {response.status_code}")
+
+    # Warm up caches and connection pools so that steady state is measured.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_request, range(len(paths))))
+
+    for path in paths:
+        latencies[path].clear()
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_request, range(requests_count)))
+    elapsed = time.monotonic() - start
+
+    if errors:
+        print(f"  {len(errors)} requests failed, first one: {errors[0]}")
+
+    return elapsed, latencies
+
+
+def main() -> None:
+    """Run the load test against all the given API instances."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", metavar="URL", nargs="+", help="Base URL of an Amun API instance.")
+    parser.add_argument("--inspection-id", required=True, help="An inspection with at least one batch item stored.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of concurrent clients.")
+    parser.add_argument("--requests", type=int, default=2000, help="Number of requests per API instance.")
+    arguments = parser.parse_args()
+
+    for url in arguments.urls:
+        elapsed, latencies = _run(url, arguments.inspection_id, arguments.concurrency, arguments.requests)
+        print(f"{url}: {arguments.requests / elapsed:.1f} requests/s with {arguments.concurrency} clients")
+        for path, path_latencies in latencies.items():
+            print(
+                f"  {path:<64} p50 {_percentile(path_latencies, 50):8.2f}ms"
+                f"  p99 {_percentile(path_latencies, 99):8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
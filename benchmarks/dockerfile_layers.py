@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare build cache reuse of Dockerfiles rendered for variants of an inspection specification.
+
+For each variant, the number of leading instructions shared with the Dockerfile
+of the original specification is reported - these are the instructions served
+from the build cache when the variant is built after the original one.
+
+Usage:
+  python3 benchmarks/dockerfile_layers.py [path/to/specification]
+"""
+
+import copy
+import json
+import os
+import sys
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from amun.dockerfile import create_dockerfile  # noqa: E402
+
+_DEFAULT_SPECIFICATION = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "example",
+    "inspection-rhtf-conv2d-0f845f38",
+    "build",
+    "specification",
+)
+
+
+def _split_instructions(dockerfile: str) -> List[str]:
+    """Split Dockerfile into instructions, each of them is one step of the build cache."""
+    instructions: List[str] = []
+    for chunk in dockerfile.split("\n\n"):
+        if instructions and instructions[-1].endswith("\\"):
+            # A continuation line.
+            instructions[-1] += "\n\n" + chunk
+        else:
+            instructions.append(chunk)
+
+    return instructions
+
+
+def _shared_prefix(first: List[str], second: List[str]) -> int:
+    """Count leading instructions shared by two Dockerfiles."""
+    shared = 0
+    for first_instruction, second_instruction in zip(first, second):
+        if first_instruction != second_instruction:
+            break
+        shared += 1
+
+    return shared
+
+
+def _change_script(specification: Dict[str, Any]) -> None:
+    specification["script"] = "#!/usr/bin/env python3\nprint('a different script')\n"
+
+
+def _change_environment(specification: Dict[str, Any]) -> None:
+    specification["environment"] = [{"name": "OMP_NUM_THREADS", "value": "4"}]
+
+
+def _change_files(specification: Dict[str, Any]) -> None:
+    specification["files"] = [{"path": "/home/amun/data.txt", "content": "some data\n"}]
+
+
+def _change_lock(specification: Dict[str, Any]) -> None:
+    specification["python"]["requirements_locked"]["_meta"]["hash"]["sha256"] = "0" * 64
+
+
+_VARIANTS: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    "script": _change_script,
+    "environment": _change_environment,
+    "files": _change_files,
+    "lock": _change_lock,
+}
+
+
+def main() -> None:
+    """Print shared instruction prefixes of specification variants for both rendering modes."""
+    with open(sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_SPECIFICATION) as specification_file:
+        specification = json.load(specification_file)
+
+    # Do not download the script, it is replaced anyway.
+    specification["script"] = "#!/usr/bin/env python3\nprint('hello')\n"
+    specification["environment"] = [{"name": "OMP_NUM_THREADS", "value": "1"}]
+
+    print(f"{'variant':<12} {'mode':<10} {'shared':>6} {'total':>6} {'shared RUN':>10} {'total RUN':>9}")
+    for optimize_layers in (False, True):
+        base_specification = dict(specification, optimize_layers=optimize_layers)
+        original = _split_instructions(create_dockerfile(base_specification)[0])
+
+        for variant_name, change in _VARIANTS.items():
+            variant_specification = copy.deepcopy(base_specification)
+            change(variant_specification)
+            variant = _split_instructions(create_dockerfile(variant_specification)[0])
+
+            shared = _shared_prefix(original, variant)
+            shared_run = sum(1 for instruction in variant[:shared] if instruction.startswith("RUN "))
+            total_run = sum(1 for instruction in variant if instruction.startswith("RUN "))
+            mode = "optimized" if optimize_layers else "default"
+            print(f"{variant_name:<12} {mode:<10} {shared:>6} {len(variant):>6} {shared_run:>10} {total_run:>9}")
+
+
+if __name__ == "__main__":
+    main()
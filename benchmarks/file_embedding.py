@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare size and render time of Dockerfiles with large lock files embedded using different file embeddings.
+
+The reported size is the size of the Dockerfile as submitted to Argo Workflows,
+after single quotes are escaped.
+
+Usage:
+  python3 benchmarks/file_embedding.py [number of packages in lock file ...]
+"""
+
+import hashlib
+import os
+import sys
+import timeit
+from typing import Any
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from amun import dockerfile  # noqa: E402
+
+_EMBEDDINGS = ("printf", "base64", "gzip-base64")
+_HASHES_PER_PACKAGE = 20
+_REPEAT = 5
+
+
+def _create_specification(package_count: int) -> Dict[str, Any]:
+    """Create specification with a synthetic lock file of the given number of packages."""
+    default = {}
+    for idx in range(package_count):
+        default[f"package-{idx}"] = {
+            "hashes": [
+                "sha256:" + hashlib.sha256(f"{idx}-{hash_idx}".encode()).hexdigest()
+                for hash_idx in range(_HASHES_PER_PACKAGE)
+            ],
+            "index": "pypi",
+            "version": f"=={idx % 10}.{idx % 7}.{idx % 3}",
+        }
+
+    return {
+        "base": "quay.io/thoth-station/s2i-thoth-ubi8-py38",
+        "python": {
+            "requirements": {
+                "packages": {name: "*" for name in default},
+                "source": [{"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": True}],
+            },
+            "requirements_locked": {
+                "_meta": {
+                    "hash": {"sha256": "0" * 64},
+                    "pipfile-spec": 6,
+                    "requires": {"python_version": "3.8"},
+                    "sources": [{"name": "pypi", "url": "https://pypi.org/simple", "verify_ssl": True}],
+                },
+                "default": default,
+                "develop": {},
+            },
+        },
+        "script": "#!/usr/bin/env python3\nprint('hello')\n",
+    }
+
+
+def main() -> None:
+    """Print Dockerfile sizes and render times for each file embedding."""
+    package_counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+
+    print(f"{'packages':>8} {'embedding':<12} {'size [B]':>10} {'render [ms]':>12}")
+    for package_count in package_counts:
+        specification = _create_specification(package_count)
+        for embedding in _EMBEDDINGS:
+            embedded_specification = dict(specification, file_embedding=embedding)
+
+            def _render() -> str:
+                # Bypass the render cache, measure rendering itself together with escaping done on submit.
+                rendered = dockerfile._render_dockerfile(embedded_specification, embedded_specification["script"])
+                if dockerfile.may_contain_quotes(embedded_specification):
+                    rendered = rendered.replace("'", "''")
+                return rendered
+
+            size = len(_render().encode())
+            render_time = min(timeit.repeat(_render, number=1, repeat=_REPEAT)) * 1000
+            print(f"{package_count:>8} {embedding:<12} {size:>10} {render_time:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Micro-benchmark of escaping inspection specifications before they are submitted to Argo Workflows.
+
+The previous implementation - a deep copy followed by an in-place escaping
+pass calling uncompiled re.sub on each string - is compared to the current
+single traversal producing an escaped copy.
+
+The API module is imported, so environment variables configuring the API
+have to be set as when running the service.
+
+Usage:
+  python3 benchmarks/specification_escaping.py [number of packages in lock file ...]
+"""
+
+import copy
+import hashlib
+import os
+import re
+import sys
+import time
+import timeit
+from typing import Any
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from amun.api_v1 import _parse_specification  # noqa: E402
+
+_FILES = 20
+_FILE_SIZE = 64 * 1024
+_REPEAT = 5
+
+
+def _previous_parse_specification(obj: Any) -> Any:
+    """Escape specification in place, the previous implementation."""
+    if isinstance(obj, dict):
+        for k in obj:
+            obj[k] = _previous_parse_specification(obj[k])
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            obj[i] = _previous_parse_specification(v)
+    elif isinstance(obj, str):
+        return re.sub(r"'(?!')", "''", obj)
+
+    return obj
+
+
+def _create_specification(package_count: int) -> Dict[str, Any]:
+    """Create a large specification with big files and a lock file of the given number of packages."""
+    default = {
+        f"package-{idx}": {
+            "hashes": ["sha256:" + hashlib.sha256(f"{idx}-{hash_idx}".encode()).hexdigest() for hash_idx in range(20)],
+            "index": "pypi",
+            "version": f"=={idx % 10}.{idx % 7}.{idx % 3}",
+        }
+        for idx in range(package_count)
+    }
+
+    line = "print('Amun inspection') # it's a line of a file\n"
+    return {
+        "base": "quay.io/thoth-station/s2i-thoth-ubi8-py38",
+        "files": [
+            {"path": f"/home/amun/file-{idx}.py", "content": line * (_FILE_SIZE // len(line))} for idx in range(_FILES)
+        ],
+        "python": {
+            "requirements": {"packages": {name: "*" for name in default}},
+            "requirements_locked": {"_meta": {"hash": {"sha256": "0" * 64}}, "default": default, "develop": {}},
+        },
+        "script": "#!/usr/bin/env python3\nprint('hello')\n",
+    }
+
+
+def main() -> None:
+    """Print time needed to produce escaped and raw views of specifications."""
+    package_counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+
+    print(f"{'packages':>8} {'previous [ms]':>14} {'current [ms]':>13} {'speedup':>8}")
+    for package_count in package_counts:
+        specification = _create_specification(package_count)
+
+        def _previous() -> float:
+            # The previous implementation escaped the given specification in place, do not measure preparing it.
+            working_copy = copy.deepcopy(specification)
+            start = time.perf_counter()
+            copy.deepcopy(working_copy)
+            _previous_parse_specification(working_copy)
+            return time.perf_counter() - start
+
+        assert _previous_parse_specification(copy.deepcopy(specification)) == _parse_specification(specification)
+
+        previous = min(_previous() for _ in range(_REPEAT)) * 1000
+        current = min(timeit.repeat(lambda: _parse_specification(specification), number=1, repeat=_REPEAT)) * 1000
+        print(f"{package_count:>8} {previous:>14.2f} {current:>13.2f} {previous / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
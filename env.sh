@@ -0,0 +1 @@
+export THOTH_AMUN_HWINFO_PATH=/tmp/insp/hwinfo.json THOTH_AMUN_STDOUT_PATH=/tmp/insp/out/stdout THOTH_AMUN_STDERR_PATH=/tmp/insp/out/stderr THOTH_AMUN_EXEC_DIR=/tmp/insp THOTH_AMUN_EXEC_FILE=/tmp/insp/script THOTH_OUTPUT_PATH=/tmp/insp/out/result THOTH_AMUN_PERF_PATH=/tmp/insp/out/perf
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of aggregation of metrics reported in inspection results."""
+
+import math
+from typing import Any
+from typing import Dict
+
+import pytest
+
+from amun.aggregation import MetricsAggregator
+from amun.aggregation import extract_metrics
+from amun.aggregation import summarize
+
+
+def _result(**fields: Any) -> Dict[str, Any]:
+    """Construct a result of a batch item as reported by the inspection entrypoint."""
+    result: Dict[str, Any] = {
+        "usage": {"ru_utime": 1.0, "ru_maxrss": 2048},
+        "stdout": {"@result": {"elapsed": 0.5, "framework": "tensorflow", "ok": True}},
+        "perf": None,
+        "repetitions": None,
+        "start_datetime": "2026-10-18T10:00:00.000000",
+        "end_datetime": "2026-10-18T10:00:09.500000",
+    }
+    result.update(fields)
+    return result
+
+
+class TestExtractMetrics:
+    """Test extracting metrics out of a result of a batch item."""
+
+    def test_extract_metrics(self) -> None:
+        """Test numeric fields are extracted, the time of the run reported is preferred."""
+        result = _result(wall_time=1.25, perf={"available": True, "error": None, "counters": {"ipc": 2.5}})
+
+        assert extract_metrics(result) == [
+            {
+                "usage.ru_utime": 1.0,
+                "usage.ru_maxrss": 2048.0,
+                "stdout.@result.elapsed": 0.5,
+                "perf.ipc": 2.5,
+                "wall_time": 1.25,
+            }
+        ]
+
+    def test_extract_metrics_datetimes(self) -> None:
+        """Test the time of the whole inspection run is used for results not reporting the time of the run."""
+        assert extract_metrics(_result())[0]["wall_time"] == 9.5
+        assert "wall_time" not in extract_metrics(_result(start_datetime=None))[0]
+
+    def test_extract_metrics_repetitions(self) -> None:
+        """Test each run is extracted on its own if the script was run repeatedly."""
+        runs = [
+            {"exit_code": 0, "wall_time": 1.0, "usage": {"ru_utime": 0.5}, "stdout": {"@result.elapsed": 0.25}},
+            {"exit_code": 0, "wall_time": 2.0, "usage": {"ru_utime": 1.5}, "stdout": {}, "perf": {"ipc": 2.0}},
+        ]
+        result = _result(wall_time=2.0, repetitions={"warmup_runs": 1, "runs": runs, "summary": {}})
+
+        assert extract_metrics(result) == [
+            {"usage.ru_utime": 0.5, "stdout.@result.elapsed": 0.25, "wall_time": 1.0},
+            {"usage.ru_utime": 1.5, "perf.ipc": 2.0, "wall_time": 2.0},
+        ]
+
+    def test_aggregator(self) -> None:
+        """Test metrics are collected over items and their runs, items with no runs repeated count once."""
+        aggregator = MetricsAggregator()
+        aggregator.add(_result(wall_time=3.0))
+        runs = [{"wall_time": 1.0, "usage": {}, "stdout": {}}, {"wall_time": 2.0, "usage": {}, "stdout": {}}]
+        aggregator.add(_result(repetitions={"warmup_runs": 0, "runs": runs, "summary": {}}))
+
+        statistics = aggregator.summarize()
+        assert aggregator.items == 2
+        assert statistics["wall_time"]["count"] == 3
+        assert statistics["wall_time"]["mean"] == 2.0
+        assert statistics["usage.ru_utime"]["count"] == 1
+
+
+class TestSummarize:
+    """Test summary statistics of values of one metric."""
+
+    def test_summarize(self) -> None:
+        """Test percentiles are interpolated between values, the sample standard deviation is reported."""
+        values = [float(value) for value in range(100, 0, -1)]
+
+        assert summarize(values) == {
+            "count": 100,
+            "min": 1.0,
+            "max": 100.0,
+            "mean": 50.5,
+            "median": 50.5,
+            "stdev": pytest.approx(math.sqrt(100 * 101 / 12)),
+            "percentiles": {
+                "5": pytest.approx(5.95),
+                "25": pytest.approx(25.75),
+                "75": pytest.approx(75.25),
+                "90": pytest.approx(90.1),
+                "95": pytest.approx(95.05),
+                "99": pytest.approx(99.01),
+            },
+        }
+
+    def test_summarize_two(self) -> None:
+        """Test percentiles lie within the values even if only two values are summarized."""
+        summary = summarize([3.0, 1.0])
+
+        assert summary["median"] == 2.0
+        assert summary["stdev"] == pytest.approx(math.sqrt(2))
+        assert summary["percentiles"] == {
+            "5": pytest.approx(1.1),
+            "25": pytest.approx(1.5),
+            "75": pytest.approx(2.5),
+            "90": pytest.approx(2.8),
+            "95": pytest.approx(2.9),
+            "99": pytest.approx(2.98),
+        }
+
+    def test_summarize_one(self) -> None:
+        """Test all percentiles of a single value are the value, the standard deviation is not defined."""
+        summary = summarize([4.0])
+
+        assert summary["count"] == 1
+        assert summary["mean"] == summary["median"] == 4.0
+        assert summary["stdev"] is None
+        assert set(summary["percentiles"].values()) == {4.0}
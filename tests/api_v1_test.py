@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of API v1 handlers, called in a request context of a bare Flask application."""
+
+import copy
+import gzip
+import json
+import time
+from types import SimpleNamespace
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from unittest import mock
+
+import pytest
+from flask import Flask
+from flask import Response
+from thoth.common.exceptions import NotFoundExceptionError
+from thoth.storages.exceptions import NotFoundError as StorageNotFoundError
+from werkzeug.http import parse_range_header
+
+from amun import api_v1
+from amun.cache import ArtifactCache
+from amun.storage import StoredArtifact
+from amun.workflows import CachedWorkflowStatus
+
+
+def _call(handler: Callable[..., Any], *args: Any, headers: Optional[Dict[str, str]] = None) -> Any:
+    """Call a handler in a request context with the given headers, streamed responses are read within the context."""
+    with Flask(__name__).test_request_context(headers=headers or {}):
+        response = handler(*args)
+        if isinstance(response, Response):
+            response.get_data()
+
+    return response
+
+
+class _FakeResults:
+    """Logs of batch items of an inspection stored on Ceph."""
+
+    def __init__(self) -> None:
+        """Initialize results with no logs stored."""
+        self.logs: Dict[int, str] = {}
+        self.retrieved: List[int] = []
+
+    def retrieve_log(self, item: int) -> str:
+        """Retrieve log of a batch item, fail if not stored."""
+        self.retrieved.append(item)
+        if item not in self.logs:
+            raise StorageNotFoundError(item)
+        return self.logs[item]
+
+
+@pytest.fixture
+def results(monkeypatch: pytest.MonkeyPatch) -> _FakeResults:
+    """Serve results of inspections from a fake storage, artifacts are cached in an empty cache."""
+    fake_results = _FakeResults()
+    monkeypatch.setattr(api_v1, "ARTIFACT_CACHE", ArtifactCache(1024 * 1024))
+    monkeypatch.setattr(api_v1, "get_inspection_store", lambda inspection_id: SimpleNamespace(results=fake_results))
+    return fake_results
+
+
+class TestImmutableArtifacts:
+    """Test immutable artifacts are cached and served with entity tags."""
+
+    def test_etag(self, results: _FakeResults) -> None:
+        """Test an artifact is retrieved once, requests with a matching entity tag are answered with 304."""
+        results.logs[0] = "log"
+
+        response = _call(api_v1.get_inspection_job_log, "inspection-a", 0)
+
+        assert response.status_code == 200
+        assert json.loads(response.get_data()) == {"log": "log", "parameters": {"inspection_id": "inspection-a"}}
+        assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+        etag = response.headers["ETag"]
+
+        response = _call(api_v1.get_inspection_job_log, "inspection-a", 0, headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+        response = _call(api_v1.get_inspection_job_log, "inspection-a", 0, headers={"If-None-Match": '"other"'})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] == etag
+        assert results.retrieved == [0]
+
+    def test_not_found(self, results: _FakeResults) -> None:
+        """Test errors are not cached, the artifact is served once stored."""
+        response, status_code = _call(api_v1.get_inspection_job_log, "inspection-a", 0)
+
+        assert status_code == 404
+        assert response["parameters"] == {"inspection_id": "inspection-a"}
+
+        results.logs[0] = "log"
+        response = _call(api_v1.get_inspection_job_log, "inspection-a", 0)
+
+        assert response.status_code == 200
+        assert results.retrieved == [0, 0]
+
+
+class TestInspectionStatuses:
+    """Test querying statuses of multiple inspections in one call."""
+
+    @pytest.fixture
+    def workflows(self, monkeypatch: pytest.MonkeyPatch) -> List[List[str]]:
+        """Fake data stored, builds and workflows of inspections, report inspections listed in each workflow query."""
+        queried: List[List[str]] = []
+
+        def get_pod_status_report(pod_name: str, namespace: str) -> Dict[str, Any]:
+            if pod_name != "inspection-a-1-build":
+                raise NotFoundExceptionError(pod_name)
+            return {"state": "terminated"}
+
+        def list_workflow_statuses(openshift: Any, namespace: str, inspection_ids: List[str]) -> Dict[str, Any]:
+            queried.append(inspection_ids)
+            return {inspection_id: {"phase": "Running"} for inspection_id in inspection_ids if inspection_id != "x"}
+
+        openshift = mock.MagicMock()
+        openshift.get_pod_status_report.side_effect = get_pod_status_report
+        monkeypatch.setattr(api_v1, "_OPENSHIFT", openshift)
+        monkeypatch.setattr(api_v1, "list_workflow_statuses", list_workflow_statuses)
+        monkeypatch.setattr(
+            api_v1,
+            "get_inspection_store",
+            lambda inspection_id: SimpleNamespace(exists=lambda: inspection_id == "inspection-a"),
+        )
+        return queried
+
+    def test_statuses(self, workflows: List[List[str]]) -> None:
+        """Test statuses are reported in order requested, duplicates are discarded, workflows are queried at once."""
+        response, status_code = api_v1.post_inspection_status(
+            {"inspection_ids": ["inspection-b", "inspection-a", "x", "inspection-b"]}
+        )
+
+        assert status_code == 200
+        assert list(response["statuses"]) == ["inspection-b", "inspection-a", "x"]
+        assert response["statuses"] == {
+            "inspection-b": {"build": None, "data_stored": False, "workflow": {"phase": "Running"}},
+            "inspection-a": {"build": {"state": "terminated"}, "data_stored": True, "workflow": {"phase": "Running"}},
+            "x": {"build": None, "data_stored": False, "workflow": None},
+        }
+        assert response["metadata"] == {
+            "workflow_source": "cluster",
+            "workflow_synced_at": None,
+            "workflow_staleness": None,
+        }
+        assert response["parameters"] == {"inspection_ids": ["inspection-b", "inspection-a", "x"]}
+        assert workflows == [["inspection-b", "inspection-a", "x"]]
+
+    def test_statuses_cached(self, workflows: List[List[str]], monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test only workflows not seen by the informer are queried on the cluster."""
+        cached = CachedWorkflowStatus(
+            status={"phase": "Succeeded"}, updated_at=time.monotonic(), synced_at=time.monotonic()
+        )
+        monkeypatch.setattr(
+            api_v1,
+            "_get_cached_workflow_status",
+            lambda inspection_id: cached if inspection_id == "inspection-a" else None,
+        )
+
+        response, status_code = api_v1.post_inspection_status({"inspection_ids": ["inspection-a", "inspection-b"]})
+
+        assert status_code == 200
+        assert response["statuses"]["inspection-a"]["workflow"] == {"phase": "Succeeded"}
+        assert response["statuses"]["inspection-b"]["workflow"] == {"phase": "Running"}
+        assert response["metadata"]["workflow_source"] == "mixed"
+        assert 0 <= response["metadata"]["workflow_staleness"] < 60
+        assert workflows == [["inspection-b"]]
+
+    def test_statuses_limit(self, workflows: List[List[str]], monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test too many inspections are rejected, duplicates do not count."""
+        monkeypatch.setattr(api_v1, "_STATUS_BATCH_LIMIT", 2)
+
+        _, status_code = api_v1.post_inspection_status(
+            {"inspection_ids": ["inspection-a", "inspection-b", "inspection-a"]}
+        )
+        assert status_code == 200
+
+        response, status_code = api_v1.post_inspection_status({"inspection_ids": ["inspection-a", "inspection-b", "x"]})
+        assert status_code == 400
+        assert response["error"] == "Too many inspections requested, at most 2 can be queried at once"
+        assert workflows == [["inspection-a", "inspection-b"]]
+
+
+class TestInspectionBatch:
+    """Test submitting many inspections in one call."""
+
+    @pytest.fixture
+    def openshift(self, monkeypatch: pytest.MonkeyPatch) -> mock.MagicMock:
+        """Schedule inspections on a fake cluster, inspections identified as unschedulable fail to be scheduled."""
+
+        def schedule_inspection(specification: Dict[str, Any], **kwargs: Any) -> str:
+            if specification["identifier"] == "unschedulable":
+                raise RuntimeError("Quota exceeded")
+            return f"inspection-{specification['identifier']}"
+
+        openshift = mock.MagicMock()
+        openshift.schedule_inspection.side_effect = schedule_inspection
+        monkeypatch.setattr(api_v1, "_OPENSHIFT", openshift)
+        return openshift
+
+    def test_batch(self, openshift: mock.MagicMock) -> None:
+        """Test errors are reported for each item, other inspections in the batch are scheduled."""
+        specifications = [
+            {"base": "fedora:32", "identifier": "first", "script": "print('first')\n"},
+            {
+                "base": "fedora:32",
+                "identifier": "invalid",
+                "python": {"requirements": {"source": []}, "requirements_locked": {}},
+            },
+            {"identifier": "no-base"},
+            {"base": "fedora:32", "identifier": "unschedulable"},
+            {"base": "fedora:32", "identifier": "last"},
+        ]
+
+        response, status_code = api_v1.post_inspection_batch({"specifications": specifications})
+
+        assert status_code == 202
+        assert response == {
+            "inspections": [
+                {"inspection_id": "inspection-first", "error": None},
+                {"inspection_id": None, "error": "Both `requirements` and `requirements_locked` must be provided."},
+                {"inspection_id": None, "error": "Failed to prepare inspection: 'base'"},
+                {"inspection_id": None, "error": "Failed to schedule inspection: Quota exceeded"},
+                {"inspection_id": "inspection-last", "error": None},
+            ],
+            "parameters": {"count": 5},
+        }
+        scheduled = sorted(
+            call.kwargs["specification"]["identifier"] for call in openshift.schedule_inspection.call_args_list
+        )
+        assert scheduled == ["first", "last", "unschedulable"]
+
+    def test_batch_limit(self, openshift: mock.MagicMock, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test too many inspections are rejected as a whole."""
+        monkeypatch.setattr(api_v1, "_BATCH_SUBMIT_LIMIT", 2)
+        specifications = [{"base": "fedora:32", "identifier": str(idx)} for idx in range(3)]
+
+        response, status_code = api_v1.post_inspection_batch({"specifications": specifications})
+
+        assert status_code == 400
+        assert response["error"] == "Too many inspections submitted, at most 2 can be submitted at once"
+        assert not openshift.schedule_inspection.called
+
+
+class TestSpecificationEscaping:
+    """Test escaping quotes in specifications passed to Argo Workflows."""
+
+    _SPECIFICATION: Dict[str, Any] = {
+        "base": "fedora:32",
+        "batch_size": 2,
+        "environment": [{"name": "GREETING", "value": "it's"}, {"name": "QUOTED", "value": "''"}],
+        "files": [],
+        "run": {"requests": {"cpu": "1"}},
+        "script": "print('hello')\n",
+        "upgrade_pip": True,
+        "@amun_api_url": None,
+    }
+
+    def test_parse_specification(self) -> None:
+        """Test quotes are escaped in a copy, the specification given is not modified nor shared."""
+        specification = copy.deepcopy(self._SPECIFICATION)
+
+        parsed = api_v1._parse_specification(specification)
+
+        assert specification == self._SPECIFICATION
+        assert parsed == dict(
+            self._SPECIFICATION,
+            # Quotes already followed by a quote are kept.
+            environment=[{"name": "GREETING", "value": "it''s"}, {"name": "QUOTED", "value": "'''"}],
+            script="print(''hello'')\n",
+        )
+        assert parsed["environment"] is not specification["environment"]
+        assert parsed["environment"][0] is not specification["environment"][0]
+        assert parsed["files"] is not specification["files"]
+        assert parsed["run"]["requests"] is not specification["run"]["requests"]
+
+    def test_unparse_specification(self) -> None:
+        """Test escaping is reverted for specifications with no doubled quotes."""
+        specification = copy.deepcopy(self._SPECIFICATION)
+        specification["environment"].pop()
+        parsed = api_v1._parse_specification(specification)
+        parsed["batch_size"] = str(parsed["batch_size"])
+
+        assert api_v1._unparse_specification(parsed) == specification
+
+    def test_prepare_inspection(self) -> None:
+        """Test the specification scheduled is escaped, the raw one is kept as submitted."""
+        prepared, error = api_v1._prepare_inspection(copy.deepcopy(self._SPECIFICATION))
+
+        assert error is None
+        assert prepared is not None
+        assert prepared.raw_specification["script"] == "print('hello')\n"
+        assert prepared.raw_specification["batch_size"] == 2
+        assert prepared.specification["script"] == "print(''hello'')\n"
+        assert prepared.specification["batch_size"] == "2"
+        assert prepared.specification["environment"][0]["value"] == "it''s"
+        assert "print(''hello'')" in prepared.dockerfile
+
+
+class _FakeBody:
+    """Body of an artifact being downloaded from Ceph."""
+
+    def __init__(self, content: bytes) -> None:
+        """Initialize body serving the given content."""
+        self._content = content
+        self.closed = False
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """Read the body in chunks."""
+        for offset in range(0, len(self._content), chunk_size):
+            yield self._content[offset : offset + chunk_size]  # Ignore PycodestyleBear (E203)
+
+    def close(self) -> None:
+        """Close the body."""
+        self.closed = True
+
+
+class TestRawArtifacts:
+    """Test streaming artifacts as stored, with range and content encoding support."""
+
+    _CONTENT = "".join(f"line {idx}\n" for idx in range(20000)).encode()
+
+    @pytest.fixture
+    def bodies(self, monkeypatch: pytest.MonkeyPatch) -> List[_FakeBody]:
+        """Serve a log of batch item 0 as S3 would, report bodies opened."""
+        opened: List[_FakeBody] = []
+
+        def open_inspection_artifact(
+            inspection_id: str, key: str, byte_range: Optional[str] = None
+        ) -> Optional[StoredArtifact]:
+            if key != "results/0/log":
+                return None
+
+            content = self._CONTENT
+            content_range = None
+            if byte_range is not None:
+                requested_range = parse_range_header(byte_range).range_for_length(len(self._CONTENT))
+                if requested_range is None:
+                    raise ValueError(f"Range {byte_range!r} cannot be satisfied for {key!r}")
+                start, stop = requested_range
+                content = content[start:stop]
+                content_range = f"bytes {start}-{stop - 1}/{len(self._CONTENT)}"
+
+            opened.append(_FakeBody(content))
+            return StoredArtifact(
+                body=opened[-1], content_length=len(content), content_range=content_range, etag='"abc"'
+            )
+
+        monkeypatch.setattr(api_v1, "open_inspection_artifact", open_inspection_artifact)
+        return opened
+
+    def test_artifact(self, bodies: List[_FakeBody]) -> None:
+        """Test an artifact is streamed as stored if no encoding is accepted."""
+        response = _call(api_v1.get_inspection_job_log_raw, "inspection-a", 0)
+
+        assert response.status_code == 200
+        assert response.get_data() == self._CONTENT
+        assert response.headers["Content-Length"] == str(len(self._CONTENT))
+        assert response.headers["ETag"] == '"abc"'
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert "Content-Encoding" not in response.headers
+        assert bodies[0].closed
+
+    def test_artifact_gzip(self, bodies: List[_FakeBody]) -> None:
+        """Test an artifact is compressed on the fly, the encoded representation has its own entity tag."""
+        response = _call(api_v1.get_inspection_job_log_raw, "inspection-a", 0, headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["ETag"] == '"abc-gzip"'
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(response.get_data()) == self._CONTENT
+        assert len(response.get_data()) < len(self._CONTENT)
+
+        headers = {"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'}
+        response = _call(api_v1.get_inspection_job_log_raw, "inspection-a", 0, headers=headers)
+
+        assert response.status_code == 304
+        assert bodies[1].closed
+
+    @pytest.mark.parametrize(
+        "range_header,start,stop",
+        [
+            ("bytes=10-19", 10, 20),
+            ("bytes=-5", len(_CONTENT) - 5, len(_CONTENT)),
+            ("bytes=100000-", 100000, len(_CONTENT)),
+        ],
+    )
+    def test_artifact_range(self, bodies: List[_FakeBody], range_header: str, start: int, stop: int) -> None:
+        """Test a single byte range is served as stored even if an encoding is accepted."""
+        headers = {"Range": range_header, "Accept-Encoding": "gzip"}
+        response = _call(api_v1.get_inspection_job_log_raw, "inspection-a", 0, headers=headers)
+
+        assert response.status_code == 206
+        assert response.get_data() == self._CONTENT[start:stop]
+        assert response.headers["Content-Range"] == f"bytes {start}-{stop - 1}/{len(self._CONTENT)}"
+        assert response.headers["Content-Length"] == str(stop - start)
+        assert "Content-Encoding" not in response.headers
+
+    @pytest.mark.parametrize("range_header", ["bytes=0-1,5-6", "items=0-1", "bytes=x-y", "bytes=1000000-"])
+    def test_artifact_range_invalid(self, bodies: List[_FakeBody], range_header: str) -> None:
+        """Test multiple ranges, other units and ranges not satisfiable are rejected."""
+        response, status_code = _call(
+            api_v1.get_inspection_job_log_raw, "inspection-a", 0, headers={"Range": range_header}
+        )
+
+        assert status_code == 416
+        assert response["parameters"] == {"inspection_id": "inspection-a", "artifact": "results/0/log"}
+
+    def test_artifact_not_found(self, bodies: List[_FakeBody]) -> None:
+        """Test artifacts not stored are reported."""
+        response, status_code = _call(api_v1.get_inspection_job_result_raw, "inspection-a", 0)
+
+        assert status_code == 404
+        assert response["error"] == "No results/0/result found for inspection 'inspection-a'"
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the cache of immutable inspection artifacts."""
+
+from pathlib import Path
+from typing import List
+
+from amun.cache import ArtifactCache
+
+
+def _spilled(tmp_path: Path) -> List[str]:
+    """List bodies of artifacts spilled to the directory private to the cache."""
+    (spill_dir,) = tmp_path.iterdir()
+    return sorted(path.read_text() for path in spill_dir.iterdir())
+
+
+class TestArtifactCache:
+    """Test artifacts evicted from memory are spilled to disk."""
+
+    def test_spill(self, tmp_path: Path) -> None:
+        """Test an evicted artifact is spilled and promoted back to memory with its entity tag."""
+        cache = ArtifactCache(16, str(tmp_path), 16)
+        artifact = cache.put("a", b"artifact")
+        cache.put("b", b"bbbbbbbb")
+        cache.put("c", b"cccccccc")
+
+        assert _spilled(tmp_path) == ["artifact"]
+
+        assert cache.get("a") == artifact
+        assert artifact.etag == ArtifactCache.compute_etag(b"artifact")
+        # Promoting the artifact evicted the least recently used one.
+        assert _spilled(tmp_path) == ["bbbbbbbb"]
+        assert cache.get("b") is not None
+        assert cache.get("c") is not None
+
+    def test_spill_size(self, tmp_path: Path) -> None:
+        """Test artifacts spilled are removed from disk to respect the size bound."""
+        cache = ArtifactCache(8, str(tmp_path), 8)
+        cache.put("a", b"aaaaaaaa")
+        cache.put("b", b"bbbbbbbb")
+        cache.put("c", b"cccccccc")
+
+        assert _spilled(tmp_path) == ["bbbbbbbb"]
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+
+    def test_no_spill(self) -> None:
+        """Test evicted artifacts are dropped if spilling is turned off."""
+        cache = ArtifactCache(8)
+        cache.put("a", b"aaaaaaaa")
+        cache.put("b", b"bbbbbbbb")
+
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of content encoding of streamed responses."""
+
+import gzip
+import os
+from typing import List
+from typing import Optional
+
+import pytest
+
+from amun import compression
+from amun.compression import compress_chunks
+from amun.compression import negotiate_encoding
+
+# Compressible and incompressible data split into chunks of various sizes.
+_CHUNKS = [b"", b"log line\n" * 10000, os.urandom(100000), b"x", b"tail\n" * 3]
+
+
+class TestCompression:
+    """Test compressing streamed responses."""
+
+    @pytest.mark.parametrize(
+        "accept_encoding,expected",
+        [
+            (None, None),
+            ("", None),
+            ("gzip", "gzip"),
+            ("br, gzip;q=0.5", "gzip"),
+            ("*", compression.SUPPORTED_ENCODINGS[0]),
+            ("gzip;q=0", None),
+            ("identity", None),
+            ("deflate, br", None),
+        ],
+    )
+    def test_negotiate_encoding(self, accept_encoding: Optional[str], expected: Optional[str]) -> None:
+        """Test content encoding is chosen out of the ones accepted by the client."""
+        assert negotiate_encoding(accept_encoding) == expected
+
+    def test_compress_chunks_gzip(self) -> None:
+        """Test chunks compressed on the fly decompress to the original content."""
+        compressed: List[bytes] = list(compress_chunks(iter(_CHUNKS), "gzip"))
+
+        assert all(compressed[:-1])
+        assert gzip.decompress(b"".join(compressed)) == b"".join(_CHUNKS)
+
+    def test_compress_chunks_zstd(self) -> None:
+        """Test chunks compressed using zstandard decompress to the original content, if it is installed."""
+        zstandard = pytest.importorskip("zstandard")
+
+        compressed = b"".join(compress_chunks(iter(_CHUNKS), "zstd"))
+
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(compressed) == b"".join(_CHUNKS)
+
+    def test_compress_chunks_identity(self) -> None:
+        """Test chunks are passed through if no encoding is given."""
+        assert list(compress_chunks(iter(_CHUNKS), None)) == _CHUNKS
+
+    def test_compress_chunks_unsupported(self) -> None:
+        """Test unsupported encodings are rejected."""
+        with pytest.raises(ValueError):
+            list(compress_chunks(iter(_CHUNKS), "br"))
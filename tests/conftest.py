@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Configuration shared by tests."""
+
+import os
+from unittest import mock
+
+import thoth.common
+
+# Configuration of the API service is read on import.
+os.environ.setdefault("AMUN_API_APP_SECRET_KEY", "test")
+os.environ.setdefault("THOTH_AMUN_INSPECTION_NAMESPACE", "amun-inspection")
+os.environ.setdefault("THOTH_AMUN_INFRA_NAMESPACE", "amun-infra")
+# The aiohttp application is tested, the Flask one would register metrics of the same names once imported.
+os.environ.setdefault("AMUN_API_ASYNC", "1")
+
+# API handlers connect to the cluster on import, tests are served by a mock instead.
+setattr(thoth.common, "OpenShift", mock.MagicMock)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of rendering Dockerfiles of inspections."""
+
+import copy
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+
+from amun import dockerfile
+from amun.dockerfile import create_dockerfile
+from amun.dockerfile import create_environment_dockerfile
+
+_SPECIFICATION = os.path.join(
+    os.path.dirname(__file__), "..", "example", "inspection-rhtf-conv2d-0f845f38", "build", "specification"
+)
+
+
+def _split_instructions(content: str) -> List[str]:
+    """Split Dockerfile into instructions, each of them is one step of the build cache."""
+    instructions: List[str] = []
+    for chunk in content.split("\n\n"):
+        if instructions and instructions[-1].endswith("\\"):
+            # A continuation line.
+            instructions[-1] += "\n\n" + chunk
+        else:
+            instructions.append(chunk)
+
+    return instructions
+
+
+@pytest.fixture
+def specification() -> Dict[str, Any]:
+    """Load the example specification with layers optimized, the script is given inline not to download it."""
+    with open(_SPECIFICATION) as specification_file:
+        specification: Dict[str, Any] = json.load(specification_file)
+
+    specification["optimize_layers"] = True
+    specification["script"] = "#!/usr/bin/env python3\nprint('hello')\n"
+    specification["environment"] = [{"name": "OMP_NUM_THREADS", "value": "1"}]
+    specification["files"] = [{"path": "/home/amun/data.txt", "content": "some data\n"}]
+    return specification
+
+
+class TestDockerfileLayers:
+    """Test layers installing dependencies are shared by specifications differing in script or environment."""
+
+    @pytest.mark.parametrize("file_embedding", ["printf", "gzip-base64"])
+    @pytest.mark.parametrize(
+        "variant",
+        [
+            {"script": "#!/usr/bin/env python3\nprint('a different script')\n"},
+            {"environment": [{"name": "OMP_NUM_THREADS", "value": "4"}]},
+        ],
+    )
+    def test_dependency_layers_shared(
+        self, specification: Dict[str, Any], file_embedding: str, variant: Dict[str, Any]
+    ) -> None:
+        """Test every dependency layer of a script or environment variant is byte-identical."""
+        specification["file_embedding"] = file_embedding
+        variant_specification = dict(copy.deepcopy(specification), **variant)
+
+        original = _split_instructions(create_dockerfile(specification)[0])
+        changed = _split_instructions(create_dockerfile(variant_specification)[0])
+        dependencies = _split_instructions(create_environment_dockerfile(specification).rstrip("\n"))
+
+        assert any("Pipfile.lock" in instruction for instruction in dependencies)
+        assert original[: len(dependencies)] == dependencies
+        assert changed[: len(dependencies)] == dependencies
+        assert original != changed
+
+    def test_dependency_layers_lock_changed(self, specification: Dict[str, Any]) -> None:
+        """Test layers installing dependencies are not shared if the lock file changes."""
+        variant_specification = copy.deepcopy(specification)
+        variant_specification["python"]["requirements_locked"]["_meta"]["hash"]["sha256"] = "0" * 64
+
+        original = _split_instructions(create_dockerfile(specification)[0])
+        changed = _split_instructions(create_dockerfile(variant_specification)[0])
+
+        installed = next(idx for idx, instruction in enumerate(original) if "Pipfile.lock" in instruction)
+        assert original[:installed] == changed[:installed]
+        assert original[installed] != changed[installed]
+
+
+class TestRunCommands:
+    """Test merging commands into RUN instructions."""
+
+    def test_run_commands_merged(self) -> None:
+        """Test commands are run in one instruction."""
+        assert dockerfile._run_commands(["true", "false"]) == "RUN true && false\n\n"
+
+    def test_run_commands_split(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test commands are split into more instructions on the size limit, an oversized command is run alone."""
+        monkeypatch.setattr(dockerfile, "_RUN_COMMAND_MAX_SIZE", 12)
+
+        assert dockerfile._run_commands(["echo", "true", "echo 1234567890", "true"]) == (
+            "RUN echo && true\n\nRUN echo 1234567890\n\nRUN true\n\n"
+        )
+
+
+class TestFileEmbedding:
+    """Test files embedded in base64 and quotes escaped on submit."""
+
+    @pytest.mark.parametrize("file_embedding", ["base64", "gzip-base64"])
+    def test_file_command(self, tmp_path: Path, file_embedding: str) -> None:
+        """Test content embedded is written down unchanged."""
+        content = "#!/bin/sh\necho 'it''s' \"$HOME\" 100% \\n \u017elu\u0165ou\u010dk\u00fd k\u016f\u0148\n"
+        path = tmp_path / "file"
+
+        subprocess.run(["sh", "-c", dockerfile._file_command(content, str(path), file_embedding)], check=True)
+
+        assert path.read_text() == content
+
+    @pytest.mark.parametrize(
+        "adjustment,expected",
+        [
+            ({"file_embedding": "printf"}, True),
+            ({}, False),
+            ({"packages": ["which"]}, True),
+            ({"environment": [{"name": "GREETING", "value": "it's"}]}, True),
+            ({"files": [{"path": "/home/amun/it's.txt", "content": "data"}]}, True),
+        ],
+    )
+    def test_may_contain_quotes(
+        self, specification: Dict[str, Any], adjustment: Dict[str, Any], expected: bool
+    ) -> None:
+        """Test Dockerfiles with files embedded in base64 contain quotes only if rendered verbatim."""
+        specification["file_embedding"] = "base64"
+        specification.pop("packages")
+        specification.update(adjustment)
+
+        assert dockerfile.may_contain_quotes(specification) is expected
+        if not expected:
+            assert "'" in specification["script"]
+            assert "'" not in create_dockerfile(specification)[0]
+            assert "'" not in create_environment_dockerfile(specification)
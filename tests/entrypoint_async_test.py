@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of responses adjusted by the aiohttp application serving Amun API."""
+
+import asyncio
+import json
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+import pytest
+from aiohttp.test_utils import TestClient
+from aiohttp.test_utils import TestServer
+from multidict import CIMultiDict
+from prometheus_client import REGISTRY
+
+from amun import api_v1
+from amun import entrypoint_async
+
+
+def _request(method: str, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, "CIMultiDict[str]", bytes]:
+    """Issue a request to a newly created application, report back status, headers and body of the response."""
+
+    async def request() -> Tuple[int, "CIMultiDict[str]", bytes]:
+        async with TestClient(TestServer(entrypoint_async.create_application("1.0.0"))) as client:
+            async with client.request(method, path, headers=headers) as response:
+                return response.status, CIMultiDict(response.headers), await response.read()
+
+    return asyncio.run(request())
+
+
+def _sample_value(name: str, **labels: str) -> float:
+    """Get value of a metric sample, zero if not reported yet."""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestEntrypointAsync:
+    """Test middleware shared with the Flask application."""
+
+    def test_headers(self) -> None:
+        """Test version and CORS headers are added to responses."""
+        status, headers, body = _request("GET", "/readiness")
+
+        assert status == 200
+        assert json.loads(body) == {"status": "ready", "version": "1.0.0"}
+        assert headers["X-Amun-Version"] == "1.0.0"
+        assert headers["Access-Control-Allow-Origin"] == "*"
+
+    def test_preflight(self) -> None:
+        """Test CORS preflight requests are answered."""
+        status, headers, _ = _request(
+            "OPTIONS",
+            "/api/v1/version",
+            headers={
+                "Origin": "https://example.com",
+                "Access-Control-Request-Method": "GET",
+                "Access-Control-Request-Headers": "Content-Type",
+            },
+        )
+
+        assert status == 200
+        assert headers["Access-Control-Allow-Origin"] == "*"
+        assert headers["Access-Control-Allow-Methods"] == "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+        assert headers["Access-Control-Allow-Headers"] == "Content-Type"
+
+    def test_not_found(self) -> None:
+        """Test 404 pages are reported as JSON and tracked in metrics."""
+        requests_total = _sample_value("flask_http_request_total", method="GET", status="404")
+
+        status, headers, body = _request("GET", "/api/v2/version")
+
+        assert status == 404
+        assert json.loads(body)["error"].startswith("404 Not Found: ")
+        assert headers["Access-Control-Allow-Origin"] == "*"
+        assert _sample_value("flask_http_request_total", method="GET", status="404") == requests_total + 1
+
+    def test_internal_server_error(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test exceptions raised in handlers are reported as JSON and tracked in metrics."""
+
+        def get_version() -> Dict[str, Any]:
+            raise RuntimeError("Version not available")
+
+        monkeypatch.setattr(api_v1, "get_version", get_version)
+        labels = {"method": "GET", "status": "500"}
+        requests_total = _sample_value("flask_http_request_total", **labels)
+        exceptions_total = _sample_value("flask_http_request_exceptions_total", **labels)
+        durations = _sample_value("flask_http_request_duration_seconds_count", path="/api/v1/version", **labels)
+
+        status, headers, body = _request("GET", "/api/v1/version")
+
+        assert status == 500
+        error = json.loads(body)
+        assert error["error"] == "Internal server error occurred, please contact administrator with provided details."
+        assert error["details"]["type"] == "RuntimeError"
+        assert headers["X-Amun-Version"] == "1.0.0"
+        assert _sample_value("flask_http_request_total", **labels) == requests_total + 1
+        assert _sample_value("flask_http_request_exceptions_total", **labels) == exceptions_total + 1
+        assert (
+            _sample_value("flask_http_request_duration_seconds_count", path="/api/v1/version", **labels)
+            == durations + 1
+        )
+
+    def test_untracked(self) -> None:
+        """Test probes are not tracked in metrics."""
+        _request("GET", "/liveness")
+
+        assert (
+            REGISTRY.get_sample_value(
+                "flask_http_request_duration_seconds_count", {"method": "GET", "path": "/liveness", "status": "200"}
+            )
+            is None
+        )
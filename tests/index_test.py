@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the local index of inspections."""
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import pytest
+from thoth.storages.exceptions import NotFoundError as StorageNotFoundError
+
+from amun import index
+from amun.index import InspectionIndex
+
+# Inspection ids mapped to base, creation datetime and batch size.
+_INSPECTIONS = {
+    "inspection-a": ("fedora:32", "2026-10-01T10:00:00.000000", 1),
+    "inspection-b": ("ubi:8", "2026-10-02T10:00:00.000000", 2),
+    "inspection-c": ("fedora:32", None, 2),
+    "inspection-d": ("ubi:8", "2026-10-02T10:00:00.000000", 1),
+    "inspection-e": (None, "2026-10-03T10:00:00.000000", 3),
+}
+
+
+def _specification(base: Optional[str], created: Optional[str], batch_size: int) -> Dict[str, Any]:
+    """Construct an inspection specification with the indexed fields."""
+    specification: Dict[str, Any] = {"batch_size": batch_size, "identifier": "test"}
+    if base is not None:
+        specification["base"] = base
+    if created is not None:
+        specification["@created"] = created
+    return specification
+
+
+class _FakeStorage:
+    """Inspections stored on Ceph, listed in pages."""
+
+    def __init__(self) -> None:
+        """Initialize storage with no inspections."""
+        self.specifications: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, int] = {}
+        self.retrieved: List[str] = []
+
+    def list_inspections(self, limit: int, continuation_token: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """List one page of inspection ids, the continuation token is the offset."""
+        offset = int(continuation_token or 0)
+        inspection_ids = sorted(self.results)[offset : offset + limit]  # Ignore PycodestyleBear (E203)
+        next_offset = offset + limit
+        return inspection_ids, str(next_offset) if next_offset < len(self.results) else None
+
+    def get_inspection_store(self, inspection_id: str) -> Any:
+        """Get adapter of an inspection stored."""
+        return SimpleNamespace(
+            retrieve_specification=lambda: self._retrieve_specification(inspection_id),
+            results=SimpleNamespace(get_results_count=lambda: self.results[inspection_id]),
+        )
+
+    def _retrieve_specification(self, inspection_id: str) -> Dict[str, Any]:
+        """Retrieve specification of an inspection, fail if not stored yet."""
+        self.retrieved.append(inspection_id)
+        if inspection_id not in self.specifications:
+            raise StorageNotFoundError(inspection_id)
+        return self.specifications[inspection_id]
+
+
+@pytest.fixture
+def storage(monkeypatch: pytest.MonkeyPatch) -> _FakeStorage:
+    """Serve inspections from a fake storage, listed two per page."""
+    fake_storage = _FakeStorage()
+    monkeypatch.setattr(index, "_INDEX_LIST_LIMIT", 2)
+    monkeypatch.setattr(index, "list_inspections", fake_storage.list_inspections)
+    monkeypatch.setattr(index, "get_inspection_store", fake_storage.get_inspection_store)
+    return fake_storage
+
+
+@pytest.fixture
+def inspection_index(tmp_path: Path) -> InspectionIndex:
+    """Create an index with the test inspections."""
+    inspection_index = InspectionIndex(str(tmp_path / "index.sqlite3"))
+    for inspection_id, (base, created, batch_size) in _INSPECTIONS.items():
+        inspection_index.add(inspection_id, _specification(base, created, batch_size))
+    return inspection_index
+
+
+def _query_pages(inspection_index: InspectionIndex, limit: int, **query: Any) -> List[str]:
+    """Query all the pages of a listing, continue after the last inspection of the previous page."""
+    result: List[str] = []
+    after = None
+    while True:
+        page = inspection_index.query(limit=limit, after=after, **query)
+        result.extend(inspection_id for inspection_id, _ in page)
+        if len(page) < limit:
+            return result
+        after = page[-1]
+
+
+class TestInspectionIndexQuery:
+    """Test querying inspections indexed."""
+
+    @pytest.mark.parametrize(
+        "query,expected",
+        [
+            ({}, ["inspection-a", "inspection-b", "inspection-c", "inspection-d", "inspection-e"]),
+            ({"base": "ubi:8"}, ["inspection-b", "inspection-d"]),
+            ({"created_after": "2026-10-02T10:00:00.000000"}, ["inspection-b", "inspection-d", "inspection-e"]),
+            ({"created_before": "2026-10-02T10:00:00.000000"}, ["inspection-a"]),
+            ({"batch_size": 2}, ["inspection-b", "inspection-c"]),
+            ({"base": "fedora:32", "batch_size": 1}, ["inspection-a"]),
+            ({"status": index.STATUS_COMPLETED}, []),
+        ],
+    )
+    def test_query_filters(self, inspection_index: InspectionIndex, query: Dict[str, Any], expected: List[str]) -> None:
+        """Test inspections are filtered."""
+        assert [inspection_id for inspection_id, _ in inspection_index.query(limit=10, **query)] == expected
+
+    @pytest.mark.parametrize("sort_by", index.SORT_COLUMNS)
+    @pytest.mark.parametrize("sort_order", ["asc", "desc"])
+    @pytest.mark.parametrize("limit", [1, 2, 3])
+    def test_query_pages(self, inspection_index: InspectionIndex, sort_by: str, sort_order: str, limit: int) -> None:
+        """Test pages continuing after the last inspection listed, values sorted by can be NULL and repeated."""
+        expected = [
+            inspection_id
+            for inspection_id, _ in inspection_index.query(limit=10, sort_by=sort_by, sort_order=sort_order)
+        ]
+        assert sorted(expected) == sorted(_INSPECTIONS)
+        assert _query_pages(inspection_index, limit, sort_by=sort_by, sort_order=sort_order) == expected
+
+    @pytest.mark.parametrize("sort_order", ["asc", "desc"])
+    def test_query_sort_nulls(self, inspection_index: InspectionIndex, sort_order: str) -> None:
+        """Test NULL values are sorted first in ascending order and last in descending order."""
+        result = inspection_index.query(limit=10, sort_by="created", sort_order=sort_order)
+
+        expected = [
+            ("inspection-c", None),
+            ("inspection-a", "2026-10-01T10:00:00.000000"),
+            ("inspection-b", "2026-10-02T10:00:00.000000"),
+            ("inspection-d", "2026-10-02T10:00:00.000000"),
+            ("inspection-e", "2026-10-03T10:00:00.000000"),
+        ]
+        assert result == (expected if sort_order == "asc" else expected[::-1])
+
+    def test_query_pages_added(self, inspection_index: InspectionIndex) -> None:
+        """Test inspections added in the meantime do not shift pages already listed."""
+        page = inspection_index.query(limit=2, sort_by="created")
+        assert [inspection_id for inspection_id, _ in page] == ["inspection-c", "inspection-a"]
+
+        inspection_index.add("inspection-0", _specification(None, "2026-09-01T10:00:00.000000", 1))
+        inspection_index.add("inspection-f", _specification(None, "2026-10-04T10:00:00.000000", 1))
+
+        page = inspection_index.query(limit=10, after=page[-1], sort_by="created")
+        assert [inspection_id for inspection_id, _ in page] == [
+            "inspection-b",
+            "inspection-d",
+            "inspection-e",
+            "inspection-f",
+        ]
+
+    @pytest.mark.parametrize("query", [{"sort_by": "identifier"}, {"sort_order": "up"}])
+    def test_query_invalid(self, inspection_index: InspectionIndex, query: Dict[str, Any]) -> None:
+        """Test unknown sort columns and orders are rejected."""
+        with pytest.raises(ValueError):
+            inspection_index.query(limit=10, **query)
+
+
+class TestInspectionIndexRefresh:
+    """Test refreshing the index from the object store."""
+
+    def test_refresh(self, tmp_path: Path, storage: _FakeStorage) -> None:
+        """Test inspections stored are indexed, each specification is retrieved once."""
+        for inspection_id, (base, created, batch_size) in _INSPECTIONS.items():
+            storage.specifications[inspection_id] = _specification(base, created, batch_size)
+            storage.results[inspection_id] = 0
+
+        inspection_index = InspectionIndex(str(tmp_path / "index.sqlite3"))
+        assert not inspection_index.is_populated()
+
+        inspection_index.refresh()
+
+        assert inspection_index.is_populated()
+        assert [inspection_id for inspection_id, _ in inspection_index.query(limit=10)] == sorted(_INSPECTIONS)
+        assert inspection_index.query(limit=10, base="ubi:8") == [
+            ("inspection-b", "inspection-b"),
+            ("inspection-d", "inspection-d"),
+        ]
+
+        inspection_index.refresh()
+        assert sorted(storage.retrieved) == sorted(_INSPECTIONS)
+
+    def test_refresh_new_sorted_before(self, tmp_path: Path, storage: _FakeStorage) -> None:
+        """Test inspections stored later are indexed even if their ids sort before the ones indexed."""
+        storage.specifications["inspection-m"] = _specification("ubi:8", None, 1)
+        storage.results["inspection-m"] = 0
+        inspection_index = InspectionIndex(str(tmp_path / "index.sqlite3"))
+        inspection_index.refresh()
+
+        for inspection_id in ("inspection-a", "inspection-z"):
+            storage.specifications[inspection_id] = _specification("ubi:8", None, 1)
+            storage.results[inspection_id] = 0
+        inspection_index.refresh()
+
+        assert [inspection_id for inspection_id, _ in inspection_index.query(limit=10)] == [
+            "inspection-a",
+            "inspection-m",
+            "inspection-z",
+        ]
+
+    def test_refresh_retry(self, tmp_path: Path, storage: _FakeStorage) -> None:
+        """Test inspections with no specification stored yet are indexed on the next refresh."""
+        storage.results["inspection-a"] = 0
+        inspection_index = InspectionIndex(str(tmp_path / "index.sqlite3"))
+        inspection_index.refresh()
+
+        assert inspection_index.query(limit=10) == []
+
+        storage.specifications["inspection-a"] = _specification("ubi:8", None, 1)
+        inspection_index.refresh()
+
+        assert inspection_index.query(limit=10) == [("inspection-a", "inspection-a")]
+        assert storage.retrieved == ["inspection-a", "inspection-a"]
+
+    def test_refresh_status(self, tmp_path: Path, storage: _FakeStorage, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test inspections with all the results stored are completed, the ones pending for too long are stale."""
+        monkeypatch.setattr(index, "_INDEX_STALE_AFTER", 3600)
+        inspections = {
+            "inspection-completed": ("2000-01-01T00:00:00.000000", 2, 2),
+            "inspection-pending": ("2100-01-01T00:00:00.000000", 2, 1),
+            "inspection-stale": ("2000-01-01T00:00:00.000000", 2, 1),
+            "inspection-unknown-created": (None, 1, 0),
+        }
+        for inspection_id, (created, batch_size, results) in inspections.items():
+            storage.specifications[inspection_id] = _specification(None, created, batch_size)
+            storage.results[inspection_id] = results
+
+        inspection_index = InspectionIndex(str(tmp_path / "index.sqlite3"))
+        inspection_index.refresh()
+
+        statuses = {
+            status: [inspection_id for inspection_id, _ in inspection_index.query(limit=10, status=status)]
+            for status in (index.STATUS_SUBMITTED, index.STATUS_COMPLETED, index.STATUS_STALE)
+        }
+        assert statuses == {
+            index.STATUS_SUBMITTED: ["inspection-pending"],
+            index.STATUS_COMPLETED: ["inspection-completed"],
+            index.STATUS_STALE: ["inspection-stale", "inspection-unknown-created"],
+        }
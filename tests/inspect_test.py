@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the inspection entrypoint run in inspection pods."""
+
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import pytest
+
+_ENTRYPOINT = os.path.join(os.path.dirname(__file__), "..", "amun", "inspect.py")
+
+_SCRIPT = """\
+import json
+print(json.dumps({"@result": {"elapsed": 1.5}}))
+"""
+
+# Counts its runs and reports whether it was profiled, exits with the code given.
+_PROFILED_SCRIPT = """\
+import json, os, sys
+def work():
+    return sum(i * i for i in range(100000))
+work()
+with open(os.environ["SCRIPT_RUNS"], "a") as runs_file:
+    runs_file.write("x")
+print(json.dumps({"profiled": "cProfile" in sys.modules}))
+sys.exit(int(os.environ.get("SCRIPT_EXIT_CODE", 0)))
+"""
+
+# Writes the same output larger than one chunk copied to the report to stdout and stderr, it is not a JSON.
+_OUTPUT_SCRIPT = """\
+import sys
+output = "a" + "\u017e" * 100000
+sys.stdout.buffer.write(output.encode())
+sys.stderr.buffer.write(output.encode())
+"""
+_OUTPUT = ("a" + "\u017e" * 100000).encode()
+
+# Keeps 64 MiB resident and burns CPU in a second thread for a while.
+_SAMPLED_SCRIPT = """\
+import threading, time
+data = b"x" * (64 * 1024 * 1024)
+def work():
+    end = time.monotonic() + 0.8
+    while time.monotonic() < end:
+        pass
+thread = threading.Thread(target=work)
+thread.start()
+thread.join()
+"""
+
+# Writes counters only on invocations listed in STUB_PERF_WRITES, the probe run by the entrypoint being the first one.
+_STUB_PERF = """\
+#!{python}
+import os, subprocess, sys
+args = sys.argv[1:]
+assert args[0] == "stat"
+output = args[args.index("--output") + 1]
+events = args[args.index("--event") + 1].split(",")
+with open(os.environ["STUB_PERF_CALLS"], "a+") as calls_file:
+    calls_file.write("x")
+    calls_file.seek(0)
+    call = len(calls_file.read())
+exit_code = subprocess.call(args[args.index("--") + 1:])
+values = {{"cycles": "1000", "instructions": "2500", "cache-references": "<not supported>", "branches": "40"}}
+if str(call) in os.environ["STUB_PERF_WRITES"].split(","):
+    with open(output, "w") as output_file:
+        output_file.write("# started on Sun Oct 18 20:00:00 2026\\n\\n")
+        for event in events:
+            output_file.write("{{}},,{{}}:u,1000,100.00,,\\n".format(values.get(event, "<not counted>"), event))
+sys.exit(exit_code)
+"""
+
+
+def _run_inspection(tmp_path: Path, env: Dict[str, str], script: str = _SCRIPT) -> Dict[str, Any]:
+    """Run the entrypoint as in an inspection pod, return the report produced."""
+    exec_dir = tmp_path / "exec"
+    (exec_dir / "venv" / "bin").mkdir(parents=True)
+    (exec_dir / "venv" / "bin" / "python3").symlink_to(sys.executable)
+    (exec_dir / "script").write_text(script)
+    (tmp_path / "hwinfo.json").write_text(json.dumps({"cpu_info": {"family": 6, "model": 85}}))
+
+    # Named differently so that the entrypoint does not shadow the inspect module of the standard library.
+    entrypoint = tmp_path / "entrypoint"
+    entrypoint.write_text(Path(_ENTRYPOINT).read_text())
+
+    env = {
+        "THOTH_AMUN_HWINFO_PATH": str(tmp_path / "hwinfo.json"),
+        "THOTH_AMUN_STDOUT_PATH": str(tmp_path / "script.stdout"),
+        "THOTH_AMUN_STDERR_PATH": str(tmp_path / "script.stderr"),
+        "THOTH_AMUN_EXEC_DIR": str(exec_dir),
+        "THOTH_AMUN_PERF_PATH": str(tmp_path / "script.perf"),
+        "THOTH_OUTPUT_PATH": str(tmp_path / "output" / "result"),
+        **env,
+    }
+    subprocess.run([sys.executable, str(entrypoint)], env=env, timeout=60)
+
+    with open(tmp_path / "output" / "result") as result_file:
+        report: Dict[str, Any] = json.load(result_file)
+
+    return report
+
+
+def _load_entrypoint() -> ModuleType:
+    """Load the entrypoint as a module, it is named differently so that it does not shadow the inspect module."""
+    spec = importlib.util.spec_from_file_location("amun_entrypoint", _ENTRYPOINT)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _install_stub_perf(tmp_path: Path, writes: str) -> Dict[str, str]:
+    """Install a stub perf writing counters on the given invocations, return environment to use it."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    perf = bin_dir / "perf"
+    perf.write_text(_STUB_PERF.format(python=sys.executable))
+    perf.chmod(0o755)
+    return {
+        "PATH": f"{bin_dir}:/usr/bin:/bin",
+        "STUB_PERF_CALLS": str(tmp_path / "perf.calls"),
+        "STUB_PERF_WRITES": writes,
+        "THOTH_AMUN_PERF_STAT": "1",
+    }
+
+
+class TestInspectPerf:
+    """Test reporting hardware performance counters collected by perf."""
+
+    def test_perf_available(self, tmp_path: Path) -> None:
+        """Test counters are parsed, counters not supported or not counted are reported as None."""
+        report = _run_inspection(tmp_path, _install_stub_perf(tmp_path, "1,2"))
+
+        assert report["exit_code"] == 0
+        assert report["stdout"] == {"@result": {"elapsed": 1.5}}
+        assert report["perf"] == {
+            "available": True,
+            "error": None,
+            "counters": {
+                "cycles": 1000,
+                "instructions": 2500,
+                "cache_references": None,
+                "cache_misses": None,
+                "branches": 40,
+                "branch_misses": None,
+                "ipc": 2.5,
+            },
+        }
+
+    def test_perf_missing(self, tmp_path: Path) -> None:
+        """Test the script is run without perf if perf is not installed."""
+        (tmp_path / "bin").mkdir()
+        report = _run_inspection(tmp_path, {"PATH": str(tmp_path / "bin"), "THOTH_AMUN_PERF_STAT": "1"})
+
+        assert report["exit_code"] == 0
+        assert report["stdout"] == {"@result": {"elapsed": 1.5}}
+        assert report["perf"] == {"available": False, "error": "perf not found", "counters": None}
+
+    def test_perf_not_requested(self, tmp_path: Path) -> None:
+        """Test perf is not used if not requested."""
+        env = _install_stub_perf(tmp_path, "1,2")
+        env["THOTH_AMUN_PERF_STAT"] = "0"
+        report = _run_inspection(tmp_path, env)
+
+        assert report["perf"] is None
+        assert not (tmp_path / "perf.calls").exists()
+
+    @pytest.mark.parametrize("writes,expected", [("1", [None, None]), ("1,2", [2.5, None]), ("1,3", [None, 2.5])])
+    def test_perf_output_missing(self, tmp_path: Path, writes: str, expected: List[Optional[float]]) -> None:
+        """Test counters of the probe or a previous run are not reported for a run perf did not write counters for."""
+        env = _install_stub_perf(tmp_path, writes)
+        env["THOTH_AMUN_REPETITIONS"] = "2"
+        report = _run_inspection(tmp_path, env)
+
+        runs = report["repetitions"]["runs"]
+        assert [run["perf"] and run["perf"]["ipc"] for run in runs] == expected
+        assert report["perf"]["counters"] == runs[-1]["perf"]
+
+
+class TestInspectProfile:
+    """Test profiling the script in an extra run."""
+
+    def test_profile(self, tmp_path: Path) -> None:
+        """Test the script is profiled in an extra run which is not reported."""
+        env = {
+            "SCRIPT_RUNS": str(tmp_path / "script.runs"),
+            "THOTH_AMUN_PROFILER": "cprofile",
+            "THOTH_AMUN_PROFILE_TOP": "1000",
+            "THOTH_AMUN_REPETITIONS": "2",
+            "THOTH_AMUN_WARMUP_RUNS": "1",
+        }
+        report = _run_inspection(tmp_path, env, _PROFILED_SCRIPT)
+
+        assert (tmp_path / "script.runs").read_text() == "xxxx"
+        assert report["exit_code"] == 0
+        assert report["stdout"] == {"profiled": False}
+        assert len(report["repetitions"]["runs"]) == 2
+        assert report["repetitions"]["summary"]["wall_time"]["count"] == 2
+        assert report["usage"] == report["repetitions"]["runs"][-1]["usage"]
+        assert report["wall_time"] == report["repetitions"]["runs"][-1]["wall_time"]
+        assert report["profile"]["profiler"] == "cprofile"
+        assert report["profile"]["error"] is None
+        assert "work" in {function["function"] for function in report["profile"]["top"]}
+        assert (tmp_path / "output" / "profile").stat().st_size > 0
+
+    def test_profile_script_failed(self, tmp_path: Path) -> None:
+        """Test the script is not profiled if it fails in a run measured."""
+        env = {
+            "SCRIPT_EXIT_CODE": "3",
+            "SCRIPT_RUNS": str(tmp_path / "script.runs"),
+            "THOTH_AMUN_PROFILER": "cprofile",
+        }
+        report = _run_inspection(tmp_path, env, _PROFILED_SCRIPT)
+
+        assert (tmp_path / "script.runs").read_text() == "x"
+        assert report["exit_code"] == 3
+        assert report["profile"] == {
+            "profiler": "cprofile",
+            "error": "The script failed in a run measured, it was not profiled",
+            "top": None,
+        }
+        assert not (tmp_path / "output" / "profile").exists()
+
+    def test_profile_not_requested(self, tmp_path: Path) -> None:
+        """Test the script is run only once if profiling is not requested."""
+        report = _run_inspection(tmp_path, {"SCRIPT_RUNS": str(tmp_path / "script.runs")}, _PROFILED_SCRIPT)
+
+        assert (tmp_path / "script.runs").read_text() == "x"
+        assert report["profile"] is None
+
+
+class TestInspectReport:
+    """Test writing the report with outputs of the script streamed."""
+
+    def test_write_report(self) -> None:
+        """Test the report is written as json.dumps(report, sort_keys=True, indent=2) would write it."""
+        report = {
+            "exit_code": 0,
+            "hwinfo": {"cpu_info": {"model": 85, "flags": ["avx", "sse"]}, "empty": {}},
+            "perf": None,
+            "repetitions": {"runs": [], "summary": {"wall_time": {"mean": 1.5}}},
+            "usage": {"ru_utime": 0.25, "ru_maxrss": 1024},
+        }
+        chunks = ['first "quoted"\n', "\u017elu\u0165ou\u010dk\u00fd\t\x00", "", "\\last"]
+        output_file = io.StringIO()
+
+        _load_entrypoint()._write_report(output_file, report, {"stderr": iter(chunks), "stdout": iter([])})
+
+        expected = dict(report, stderr="".join(chunks), stdout="")
+        assert output_file.getvalue() == json.dumps(expected, sort_keys=True, indent=2)
+
+    @pytest.mark.parametrize(
+        "head_size,tail_size",
+        [
+            (0, 0),
+            (70002, 70001),
+            (0, 70001),
+            (70002, 0),
+        ],
+    )
+    def test_output_head_tail(self, tmp_path: Path, head_size: int, tail_size: int) -> None:
+        """Test only head and tail of outputs are kept, multi-byte characters split on their boundaries are replaced."""
+        env = {"THOTH_AMUN_OUTPUT_HEAD_SIZE": str(head_size), "THOTH_AMUN_OUTPUT_TAIL_SIZE": str(tail_size)}
+        report = _run_inspection(tmp_path, env, _OUTPUT_SCRIPT)
+
+        if head_size or tail_size:
+            omitted = len(_OUTPUT) - head_size - tail_size
+            expected = (
+                _OUTPUT[:head_size].decode(errors="replace")
+                + f"\n... {omitted} bytes omitted ...\n"
+                + _OUTPUT[len(_OUTPUT) - tail_size :].decode(errors="replace")  # Ignore PycodestyleBear (E203)
+            )
+            # Both the head and the tail split a character.
+            assert expected.count("\ufffd") == bool(head_size) + bool(tail_size)
+        else:
+            omitted = 0
+            expected = _OUTPUT.decode()
+
+        assert report["omitted_output"] == {"stdout": omitted, "stderr": omitted}
+        assert report["stdout"] == expected
+        assert report["stderr"] == expected
+
+
+class TestInspectSampling:
+    """Test sampling resources used by the script over time."""
+
+    def test_sampling(self, tmp_path: Path) -> None:
+        """Test resources of the script are sampled from procfs, the timeline is compacted once full."""
+        env = {"THOTH_AMUN_SAMPLING_INTERVAL": "0.02", "THOTH_AMUN_SAMPLING_MAX_SAMPLES": "8"}
+        report = _run_inspection(tmp_path, env, _SAMPLED_SCRIPT)
+
+        timeline = report["timeline"]
+        assert report["exit_code"] == 0
+        assert set(timeline) == {"interval", *_load_entrypoint()._TIMELINE_METRICS}
+        samples = len(timeline["time"])
+        assert 2 <= samples < 8
+        assert all(len(values) == samples for metric, values in timeline.items() if metric != "interval")
+        # Every other sample is dropped and the interval doubled each time the timeline is full.
+        assert timeline["interval"] in (0.04, 0.08, 0.16, 0.32, 0.64)
+        assert timeline["time"] == sorted(timeline["time"])
+        assert timeline["cpu_time"] == sorted(timeline["cpu_time"])
+        assert max(timeline["cpu_time"]) >= 0.3
+        # Resident memory sampled cannot exceed the maximum reported on exit, in KiB.
+        assert 64 * 1024 * 1024 <= max(timeline["rss"]) <= report["usage"]["ru_maxrss"] * 1024
+        assert max(timeline["threads"]) == 2
+        assert max(timeline["processes"]) == 1
+        assert max(timeline["voluntary_ctxt_switches"]) > 0
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of fetching inspection scripts specified by an URL."""
+
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+import pytest
+
+from amun import scripts
+from amun.exceptions import ScriptObtainingError
+from amun.scripts import ScriptFetcher
+
+
+class _Script(NamedTuple):
+    """A script served by the test server."""
+
+    body: bytes
+    status: int = 200
+    etag: Optional[str] = None
+    # Send Content-Length header, the body is delimited by closing the connection otherwise.
+    content_length: bool = True
+
+
+class _Request(NamedTuple):
+    """A request received by the test server."""
+
+    path: str
+    if_none_match: Optional[str]
+
+
+class _ScriptServer:
+    """A local HTTP server serving scripts and recording requests received."""
+
+    def __init__(self) -> None:
+        """Start the server on a free port."""
+        self.scripts: Dict[str, _Script] = {}
+        self.requests: List[_Request] = []
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                server.requests.append(_Request(self.path, self.headers.get("If-None-Match")))
+                script = server.scripts.get(self.path, _Script(b"Not found", status=404))
+
+                if script.etag is not None and self.headers.get("If-None-Match") == script.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                self.send_response(script.status)
+                if script.etag is not None:
+                    self.send_header("ETag", script.etag)
+                if script.content_length:
+                    self.send_header("Content-Length", str(len(script.body)))
+                self.end_headers()
+                self.wfile.write(script.body)
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+
+    def url(self, path: str) -> str:
+        """Get URL of a script served on the given path."""
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}{path}"
+
+    def stop(self) -> None:
+        """Stop the server."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def server() -> Iterator[_ScriptServer]:
+    """Serve scripts on localhost."""
+    script_server = _ScriptServer()
+    yield script_server
+    script_server.stop()
+
+
+class TestScriptFetcher:
+    """Test downloading, caching and revalidating scripts."""
+
+    def test_fetch_cached(self, server: _ScriptServer) -> None:
+        """Test a script is downloaded only once while it is fresh."""
+        server.scripts["/script.py"] = _Script(b"print('hello')\n")
+        fetcher = ScriptFetcher(ttl=300)
+
+        assert fetcher.fetch(server.url("/script.py")) == "print('hello')\n"
+        assert fetcher.fetch(server.url("/script.py")) == "print('hello')\n"
+        assert len(server.requests) == 1
+
+    def test_fetch_revalidated(self, server: _ScriptServer) -> None:
+        """Test an expired script is revalidated using its entity tag."""
+        server.scripts["/script.py"] = _Script(b"print('hello')\n", etag='"v1"')
+        fetcher = ScriptFetcher(ttl=0)
+
+        assert fetcher.fetch(server.url("/script.py")) == "print('hello')\n"
+        assert fetcher.fetch(server.url("/script.py")) == "print('hello')\n"
+        assert server.requests == [_Request("/script.py", None), _Request("/script.py", '"v1"')]
+
+        # A changed script is downloaded again.
+        server.scripts["/script.py"] = _Script(b"print('bye')\n", etag='"v2"')
+        assert fetcher.fetch(server.url("/script.py")) == "print('bye')\n"
+        assert server.requests[-1] == _Request("/script.py", '"v1"')
+
+    @pytest.mark.parametrize("content_length", [True, False])
+    def test_fetch_too_large(self, server: _ScriptServer, content_length: bool) -> None:
+        """Test scripts larger than allowed are rejected, regardless of the size announced."""
+        server.scripts["/large.py"] = _Script(b"#" * 100_000, content_length=content_length)
+        fetcher = ScriptFetcher(max_size=10_000)
+
+        with pytest.raises(ScriptObtainingError, match="too large"):
+            fetcher.fetch(server.url("/large.py"))
+
+    def test_fetch_error_cached(self, server: _ScriptServer, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test a failure is reported for a while without trying to download the script again."""
+        fetcher = ScriptFetcher()
+        url = server.url("/script.py")
+
+        with pytest.raises(ScriptObtainingError, match="HTTP status: 404"):
+            fetcher.fetch(url)
+
+        server.scripts["/script.py"] = _Script(b"print('hello')\n")
+        with pytest.raises(ScriptObtainingError, match="HTTP status: 404"):
+            fetcher.fetch(url)
+
+        assert len(server.requests) == 1
+
+        monkeypatch.setattr(scripts, "_SCRIPT_ERROR_TTL", 0)
+        assert fetcher.fetch(url) == "print('hello')\n"
+        assert len(server.requests) == 2
+
+    def test_fetch_many(self, server: _ScriptServer) -> None:
+        """Test scripts are downloaded once per URL and errors are reported per URL."""
+        server.scripts["/a.py"] = _Script(b"a = 1\n")
+        server.scripts["/b.py"] = _Script(b"b = 2\n")
+        fetcher = ScriptFetcher()
+
+        result = fetcher.fetch_many(
+            [server.url("/a.py"), server.url("/b.py"), server.url("/a.py"), server.url("/missing.py")]
+        )
+
+        assert list(result) == [server.url("/a.py"), server.url("/b.py"), server.url("/missing.py")]
+        assert result[server.url("/a.py")] == "a = 1\n"
+        assert result[server.url("/b.py")] == "b = 2\n"
+        assert isinstance(result[server.url("/missing.py")], ScriptObtainingError)
+        assert sorted(request.path for request in server.requests) == ["/a.py", "/b.py", "/missing.py"]
+        assert fetcher.fetch_many([]) == {}
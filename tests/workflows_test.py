@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# Amun
+# Copyright(C) 2018, 2019, 2020 Fridolin Pokorny
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the informer watching inspection workflows."""
+
+import queue
+from types import SimpleNamespace
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import pytest
+
+from amun import workflows
+from amun.workflows import WorkflowStatusInformer
+
+_NAMESPACE = "amun-inspection"
+
+
+def _workflow(inspection_id: Optional[str], phase: str, resource_version: str) -> Dict[str, Any]:
+    """Construct a workflow object as sent by the cluster."""
+    labels = {"inspection_id": inspection_id} if inspection_id is not None else {}
+    return {
+        "metadata": {"name": f"workflow-{inspection_id}", "labels": labels, "resourceVersion": resource_version},
+        "status": {"phase": phase},
+    }
+
+
+def _event(event_type: str, workflow: Dict[str, Any]) -> Dict[str, Any]:
+    """Construct an event of the watch stream."""
+    return {"type": event_type, "raw_object": workflow}
+
+
+class _StopInformer(BaseException):
+    """Raised to leave the informer loop, not caught by the informer as it is not an Exception."""
+
+
+class _FakeWorkflowResource:
+    """Dynamic client resource serving prepared listings and watch streams."""
+
+    def __init__(self, listings: List[Dict[str, Any]], streams: List[List[Dict[str, Any]]]) -> None:
+        """Initialize resource, each listing and each stream is served once in the given order."""
+        self.listings = listings
+        self.streams = streams
+        self.watched_resource_versions: List[str] = []
+
+    def get(self, namespace: str, label_selector: str) -> Any:
+        """List workflows."""
+        assert namespace == _NAMESPACE
+        assert label_selector == "inspection_id"
+        listing = self.listings.pop(0)
+        return SimpleNamespace(to_dict=lambda: listing)
+
+    def watch(self, namespace: str, label_selector: str, resource_version: str, timeout: int) -> Iterator[Any]:
+        """Watch workflows, the stream ends once all its events are sent."""
+        assert namespace == _NAMESPACE
+        assert label_selector == "inspection_id"
+        self.watched_resource_versions.append(resource_version)
+        if not self.streams:
+            raise _StopInformer
+
+        yield from self.streams.pop(0)
+
+
+def _listing(resource_version: str, *items: Dict[str, Any]) -> Dict[str, Any]:
+    """Construct a listing of workflows."""
+    return {"metadata": {"resourceVersion": resource_version}, "items": list(items)}
+
+
+def _create_informer(resource: _FakeWorkflowResource, watch_timeout: int = 300) -> WorkflowStatusInformer:
+    """Create an informer using the given resource."""
+    resources = SimpleNamespace(get=lambda api_version, kind, name: resource)
+    openshift: Any = SimpleNamespace(ocp_client=SimpleNamespace(resources=resources))
+    return WorkflowStatusInformer(openshift, _NAMESPACE, watch_timeout=watch_timeout)
+
+
+def _drain(subscription: "queue.Queue[Optional[Dict[str, Any]]]") -> List[Optional[Dict[str, Any]]]:
+    """Get all the statuses sent to a subscription so far."""
+    result = []
+    while not subscription.empty():
+        result.append(subscription.get_nowait())
+
+    return result
+
+
+class TestWorkflowStatusInformer:
+    """Test maintaining workflow statuses based on a watch stream."""
+
+    def test_not_in_sync_before_listed(self) -> None:
+        """Test no status is reported before workflows are listed."""
+        informer = _create_informer(_FakeWorkflowResource([], []))
+        assert not informer.is_in_sync()
+        assert informer.get("inspection-a") is None
+
+    def test_list(self) -> None:
+        """Test listing replaces all the statuses and notifies subscribers."""
+        resource = _FakeWorkflowResource(
+            [
+                _listing("10", _workflow("inspection-a", "Running", "5"), _workflow("inspection-b", "Pending", "7")),
+                _listing("20", _workflow("inspection-a", "Succeeded", "15")),
+            ],
+            [],
+        )
+        informer = _create_informer(resource)
+        subscription = informer.subscribe("inspection-b")
+
+        assert informer._list() == "10"
+        assert informer.is_in_sync()
+        cached = informer.get("inspection-a")
+        assert cached is not None
+        assert cached.status == {"phase": "Running"}
+        assert _drain(subscription) == [{"phase": "Pending"}]
+
+        # Workflows gone while the watch was broken are reported as gone.
+        assert informer._list() == "20"
+        cached = informer.get("inspection-a")
+        assert cached is not None
+        assert cached.status == {"phase": "Succeeded"}
+        assert informer.get("inspection-b") is None
+        assert _drain(subscription) == [None]
+
+    def test_events(self) -> None:
+        """Test added, modified and deleted workflows are reflected and sent to subscribers."""
+        informer = _create_informer(_FakeWorkflowResource([_listing("1")], []))
+        informer._list()
+
+        first = informer.subscribe("inspection-a")
+        second = informer.subscribe("inspection-a")
+        other = informer.subscribe("inspection-b")
+
+        informer.handle_event("ADDED", _workflow("inspection-a", "Pending", "2"))
+        informer.handle_event("MODIFIED", _workflow("inspection-a", "Running", "3"))
+        cached = informer.get("inspection-a")
+        assert cached is not None
+        assert cached.status == {"phase": "Running"}
+
+        informer.handle_event("DELETED", _workflow("inspection-a", "Succeeded", "4"))
+        assert informer.get("inspection-a") is None
+
+        expected = [{"phase": "Pending"}, {"phase": "Running"}, None]
+        assert _drain(first) == expected
+        assert _drain(second) == expected
+        assert _drain(other) == []
+
+    def test_event_without_inspection_id(self) -> None:
+        """Test workflows not labeled with inspection id are ignored."""
+        informer = _create_informer(_FakeWorkflowResource([_listing("1")], []))
+        informer._list()
+
+        informer.handle_event("ADDED", _workflow(None, "Running", "2"))
+        assert informer._statuses == {}
+
+    def test_unsubscribe(self) -> None:
+        """Test no more statuses are sent once unsubscribed."""
+        informer = _create_informer(_FakeWorkflowResource([_listing("1")], []))
+        informer._list()
+
+        subscription = informer.subscribe("inspection-a")
+        informer.handle_event("ADDED", _workflow("inspection-a", "Pending", "2"))
+        informer.unsubscribe("inspection-a", subscription)
+        informer.handle_event("MODIFIED", _workflow("inspection-a", "Running", "3"))
+
+        assert _drain(subscription) == [{"phase": "Pending"}]
+        assert informer._subscribers == {}
+
+    def test_watch_error_event(self) -> None:
+        """Test an error event breaks the watch so that workflows are re-listed."""
+        error = {"type": "ERROR", "raw_object": {"code": 410, "message": "too old resource version"}}
+        resource = _FakeWorkflowResource([], [[_event("ADDED", _workflow("inspection-a", "Pending", "2")), error]])
+        informer = _create_informer(resource)
+
+        with pytest.raises(RuntimeError, match="too old resource version"):
+            informer._watch("1")
+
+        # Events received before the error are kept.
+        assert informer._statuses == {"inspection-a": {"phase": "Pending"}}
+
+    def test_watch_stream_ends(self) -> None:
+        """Test the watch is resumed from the last resource version seen if the stream ends."""
+        resource = _FakeWorkflowResource(
+            [_listing("1")],
+            [
+                [_event("ADDED", _workflow("inspection-a", "Pending", "2"))],
+                [],
+                [_event("MODIFIED", _workflow("inspection-a", "Running", "3"))],
+            ],
+        )
+        informer = _create_informer(resource)
+
+        with pytest.raises(_StopInformer):
+            informer._run()
+
+        assert resource.watched_resource_versions == ["1", "2", "2", "3"]
+        cached = informer.get("inspection-a")
+        assert cached is not None
+        assert cached.status == {"phase": "Running"}
+
+    def test_run_relists(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test workflows are re-listed after a failure and the watch is resumed from the new listing."""
+        error = {"type": "ERROR", "raw_object": {"code": 410, "message": "too old resource version"}}
+        resource = _FakeWorkflowResource(
+            [
+                _listing("1", _workflow("inspection-a", "Pending", "1")),
+                _listing("5", _workflow("inspection-a", "Succeeded", "4")),
+            ],
+            [[error]],
+        )
+        informer = _create_informer(resource)
+        subscription = informer.subscribe("inspection-a")
+        sleeps: List[float] = []
+        monkeypatch.setattr(workflows.time, "sleep", sleeps.append)
+
+        with pytest.raises(_StopInformer):
+            informer._run()
+
+        assert sleeps == [workflows._WORKFLOW_INFORMER_BACKOFF]
+        assert resource.watched_resource_versions == ["1", "5"]
+        assert _drain(subscription) == [{"phase": "Pending"}, {"phase": "Succeeded"}]
+
+    def test_out_of_sync(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Test no status is reported if the watch was broken for too long."""
+        now = 1000.0
+        monkeypatch.setattr(workflows.time, "monotonic", lambda: now)
+        informer = _create_informer(_FakeWorkflowResource([_listing("1", _workflow("a", "Running", "1"))], []), 10)
+        informer._list()
+        assert informer.get("a") is not None
+
+        now += 19
+        assert informer.is_in_sync()
+
+        now += 1
+        assert not informer.is_in_sync()
+        assert informer.get("a") is None